@@ -17,9 +17,22 @@ Scheduler::Scheduler(vector<Task *> * tasks)
   tasksToS = tasks;
   numTasks = tasks->size();
   numPairs = 0;
+  timeLimit = -1.0;
+  verbosity = -1;
+  numVars = 0;
+  numConss = 0;
+  gap = -1.0;
+  solveTime = 0.0;
   setPairs();
 }
 
+void Scheduler::setTimeLimit(double limit) {timeLimit = limit;}
+void Scheduler::setVerbosity(int level) {verbosity = level;}
+int Scheduler::getNumVars() {return numVars;}
+int Scheduler::getNumConss() {return numConss;}
+double Scheduler::getGap() {return gap;}
+double Scheduler::getSolveTime() {return solveTime;}
+
 int Scheduler::getNumPairs()
 {
   return numPairs;
@@ -305,11 +318,25 @@ bool Scheduler::solve()
   ScipUser * solver = new ScipUser();
   err = solver->getEr();
   if (err != SCIP_OKAY)
-    return -1;
+    return false;
+
+  if (verbosity >= 0)
+  {
+    err = solver->setVerbosity(verbosity);
+    if (err != SCIP_OKAY)
+      return false;
+  }
+
+  if (timeLimit >= 0)
+  {
+    err = solver->setTimeLimit(timeLimit);
+    if (err != SCIP_OKAY)
+      return false;
+  }
 
   err = solver->fakeVar();
   if (err != SCIP_OKAY)
-    return -1;
+    return false;
 
   SCIP_VAR * g = solver->getF();
 
@@ -319,22 +346,22 @@ bool Scheduler::solve()
   vector<SCIP_VAR *> * t_var = new vector<SCIP_VAR *>(numTasks,(SCIP_VAR*) NULL); 
   err = solver->tVar(numTasks,t_var);
   if (err != SCIP_OKAY)
-    return -1;
+    return false;
 
 
   int e = setPreVar(solver);
   if (e==-1)
-    return -1;
+    return false;
 
 //create constraints for starting and ending time
   err = solver->setTcons(tasksToS, t_var, g);
   if (err != SCIP_OKAY)
-    return -1; 
+    return false;
 
 //for all pairs we need to set condition
   err = solver->setFinalCons_long(tasksToS, t_var, g, &pairs);
   if (err != SCIP_OKAY)
-    return -1; 
+    return false;
 
 //conversion from vector to "array"
   SCIP_VAR * array_tvar[numTasks];
@@ -345,7 +372,12 @@ bool Scheduler::solve()
 
   err = solver->scipSolve(tasksToS, array_tvar, worked);
    if (err != SCIP_OKAY)
-    return -1; 
+    return false;
+
+  numVars = solver->getNumVars();
+  numConss = solver->getNumConss();
+  gap = solver->getGap();
+  solveTime = solver->getSolveTime();
 
   //call destructor
   delete solver;
@@ -17,6 +17,13 @@ class Scheduler
   int numPairs;
   int numTasks;
   vector< vector<int> > pairs;
+  double timeLimit; //seconds allowed for solving, negative for no limit
+  int verbosity; //SCIP display/verblevel, negative to keep SCIP's setting
+  //statistics of the last call to solve
+  int numVars;
+  int numConss;
+  double gap;
+  double solveTime;
   public:
   Scheduler(vector<Task *>*);
   int getNumPairs();
@@ -27,6 +34,12 @@ class Scheduler
   int findTaskNow();
   vector<int> findConditions();
   bool solve();
+  void setTimeLimit(double);
+  void setVerbosity(int);
+  int getNumVars();
+  int getNumConss();
+  double getGap();
+  double getSolveTime();
   
   
 };
@@ -0,0 +1,237 @@
+#include <iostream>
+#include <fstream>
+#include <sstream>
+#include <string>
+#include <vector>
+#include <map>
+#include <random>
+#include <cstdlib>
+#include <sys/time.h>
+
+#include "task.h"
+#include "scheduler.h"
+
+using namespace std;
+
+/*
+ Measures how Scheduler::solve scales with the number of tasks. Task sets are generated in
+ the styles used by tests/test_scheduler_node.py plus a daily routine, and for each solve the
+ time taken, formulation size and optimality gap are written as a line of csv.
+
+ usage: scheduler_benchmark [output.csv] [time limit per solve in secs] [repeats] [baseline.csv]
+
+ If a baseline csv from an earlier run is given, the exit code is 1 when any formulation has
+ changed size or a solve has become more than twice as slow as in the baseline.
+*/
+
+static const double one_hour_secs = 60 * 60;
+
+double wallTime()
+{
+  timeval tv;
+  gettimeofday(&tv, NULL);
+  return tv.tv_sec + tv.tv_usec / 1000000.0;
+}
+
+string waypoint(int n)
+{
+  stringstream ss;
+  ss << "WayPoint" << n;
+  return ss.str();
+}
+
+/*all tasks share one window, long enough to fit them all in, as create_tasks_in_single_window*/
+void singleWindow(int count, mt19937 & gen, vector<Task*> & tasks)
+{
+  uniform_real_distribution<double> duration(0.0, one_hour_secs);
+  double end = one_hour_secs * (count + 1);
+  for(int i=0; i<count; i++)
+  {
+    tasks.push_back(new Task(i, 0.0, end, duration(gen), waypoint(i), waypoint(i)));
+  }
+}
+
+/*half the tasks in one window and the rest in a later one, as create_tasks_in_two_windows*/
+void twoWindows(int count, mt19937 & gen, vector<Task*> & tasks)
+{
+  uniform_real_distribution<double> duration(0.0, one_hour_secs);
+  int firstCount = (count + 1) / 2;
+  double firstEnd = one_hour_secs * (firstCount + 1);
+  double secondStart = firstEnd + one_hour_secs;
+  double secondEnd = secondStart + one_hour_secs * (count - firstCount + 1);
+  for(int i=0; i<count; i++)
+  {
+    if(i < firstCount)
+      tasks.push_back(new Task(i, 0.0, firstEnd, duration(gen), waypoint(i), waypoint(i)));
+    else
+      tasks.push_back(new Task(i, secondStart, secondEnd, duration(gen), waypoint(i), waypoint(i)));
+  }
+}
+
+/*short tasks at a few waypoints in overlapping two hour windows across an 8:30 to 17:00 day, as produced by a DailyRoutine*/
+void dailyRoutine(int count, mt19937 & gen, vector<Task*> & tasks)
+{
+  double dayStart = 8.5 * one_hour_secs;
+  double dayEnd = 17 * one_hour_secs;
+  uniform_real_distribution<double> duration(60.0, 600.0);
+  uniform_int_distribution<int> slot(0, 3);
+  uniform_int_distribution<int> node(1, 20);
+  for(int i=0; i<count; i++)
+  {
+    double start = dayStart + slot(gen) * 2 * one_hour_secs;
+    double end = start + 2 * one_hour_secs;
+    //every task also gets a whole day window some of the time
+    if(i % 4 == 0)
+    {
+      start = dayStart;
+      end = dayEnd;
+    }
+    string pos = waypoint(node(gen));
+    tasks.push_back(new Task(i, start, end, duration(gen), pos, pos));
+  }
+}
+
+typedef void (*Generator)(int, mt19937 &, vector<Task*> &);
+
+struct Result
+{
+  string style;
+  int size;
+  int repeat;
+  bool solved;
+  double solveTime;
+  double wallTime;
+  int numPairs;
+  int numVars;
+  int numConss;
+  double gap;
+};
+
+void writeHeader(ostream & os)
+{
+  os << "style,size,repeat,solved,solve_time,wall_time,num_pairs,num_vars,num_conss,gap" << "\n";
+}
+
+void writeResult(ostream & os, const Result & r)
+{
+  os << r.style << "," << r.size << "," << r.repeat << "," << r.solved << "," << r.solveTime << "," << r.wallTime
+     << "," << r.numPairs << "," << r.numVars << "," << r.numConss << "," << r.gap << "\n";
+}
+
+/*reads results written by writeResult, keyed by style, size and repeat*/
+map<string, Result> readResults(const char * filename)
+{
+  map<string, Result> results;
+  ifstream in(filename);
+  string line;
+  getline(in, line); //header
+  while(getline(in, line))
+  {
+    stringstream ss(line);
+    string field;
+    vector<string> fields;
+    while(getline(ss, field, ','))
+      fields.push_back(field);
+    if(fields.size() != 10)
+      continue;
+    Result r;
+    r.style = fields[0];
+    r.size = atoi(fields[1].c_str());
+    r.repeat = atoi(fields[2].c_str());
+    r.solved = atoi(fields[3].c_str()) != 0;
+    r.solveTime = atof(fields[4].c_str());
+    r.wallTime = atof(fields[5].c_str());
+    r.numPairs = atoi(fields[6].c_str());
+    r.numVars = atoi(fields[7].c_str());
+    r.numConss = atoi(fields[8].c_str());
+    r.gap = atof(fields[9].c_str());
+    results[fields[0] + "," + fields[1] + "," + fields[2]] = r;
+  }
+  return results;
+}
+
+int main (int argc, char** argv)
+{
+  const char * output = argc > 1 ? argv[1] : "scheduler_benchmark.csv";
+  double timeLimit = argc > 2 ? atof(argv[2]) : 60.0;
+  int repeats = argc > 3 ? atoi(argv[3]) : 3;
+  const char * baseline = argc > 4 ? argv[4] : NULL;
+
+  int sizes[] = {5, 10, 20, 50, 100, 200, 500};
+  int numSizes = sizeof(sizes) / sizeof(int);
+  const char * styles[] = {"single_window", "two_windows", "daily_routine"};
+  Generator generators[] = {singleWindow, twoWindows, dailyRoutine};
+  int numStyles = 3;
+
+  ofstream out(output);
+  writeHeader(out);
+  writeHeader(cout);
+
+  vector<Result> results;
+  for(int s=0; s<numStyles; s++)
+  {
+    for(int i=0; i<numSizes; i++)
+    {
+      for(int repeat=0; repeat<repeats; repeat++)
+      {
+        //the same seed for each configuration so formulation sizes are comparable between runs
+        mt19937 gen(sizes[i] * 1000 + repeat);
+        vector<Task*> tasks;
+        generators[s](sizes[i], gen, tasks);
+
+        double started = wallTime();
+        Scheduler scheduler(&tasks);
+        scheduler.setVerbosity(0);
+        scheduler.setTimeLimit(timeLimit);
+
+        Result r;
+        r.style = styles[s];
+        r.size = sizes[i];
+        r.repeat = repeat;
+        r.numPairs = scheduler.getNumPairs();
+        r.solved = scheduler.solve();
+        r.wallTime = wallTime() - started;
+        r.solveTime = scheduler.getSolveTime();
+        r.numVars = scheduler.getNumVars();
+        r.numConss = scheduler.getNumConss();
+        r.gap = scheduler.getGap();
+
+        writeResult(out, r);
+        writeResult(cout, r);
+        out.flush();
+        results.push_back(r);
+
+        for(auto & tp : tasks)
+          delete tp;
+      }
+    }
+  }
+
+  if(baseline == NULL)
+    return 0;
+
+  int regressions = 0;
+  map<string, Result> before = readResults(baseline);
+  for(auto & r : results)
+  {
+    stringstream key;
+    key << r.style << "," << r.size << "," << r.repeat;
+    if(before.count(key.str()) == 0)
+      continue;
+    Result & b = before[key.str()];
+    if(b.numVars != r.numVars || b.numConss != r.numConss)
+    {
+      cout << "formulation changed for " << key.str() << ": " << b.numVars << " vars, " << b.numConss
+           << " conss before, " << r.numVars << " vars, " << r.numConss << " conss now\n";
+      regressions++;
+    }
+    //ignore noise in very short solves
+    if(r.wallTime > 2 * b.wallTime && r.wallTime > 0.5)
+    {
+      cout << "solve slowed for " << key.str() << ": " << b.wallTime << "s before, " << r.wallTime << "s now\n";
+      regressions++;
+    }
+  }
+  cout << regressions << " regressions against " << baseline << "\n";
+  return regressions > 0 ? 1 : 0;
+}
@@ -29,6 +29,10 @@ ScipUser::ScipUser()
   f= (SCIP_VAR*)NULL;
   pre_var = new vector<SCIP_VAR *>(0,(SCIP_VAR*) NULL); 
   num_preVar = 0;
+  num_vars = 0;
+  num_conss = 0;
+  gap = -1.0;
+  solve_time = 0.0;
 
 }
 
@@ -45,6 +49,24 @@ SCIP_Retcode ScipUser::getEr()
 
 SCIP_VAR * ScipUser::getF() {return f;}
 
+int ScipUser::getNumVars() {return num_vars;}
+int ScipUser::getNumConss() {return num_conss;}
+double ScipUser::getGap() {return gap;}
+double ScipUser::getSolveTime() {return solve_time;}
+
+/*limit on the time spend in SCIPsolve, in seconds. the best solution found so far is used when it is reached*/
+SCIP_Retcode ScipUser::setTimeLimit(double limit)
+{
+  SCIP_CALL( SCIPsetRealParam(scip, "limits/time", limit) );
+  return SCIP_OKAY;
+}
+
+SCIP_Retcode ScipUser::setVerbosity(int level)
+{
+  SCIP_CALL( SCIPsetIntParam(scip, "display/verblevel", level) );
+  return SCIP_OKAY;
+}
+
 vector<SCIP_VAR*> * ScipUser::getPreVar() {return pre_var;}
 
 SCIP_Retcode ScipUser::fakeVar()
@@ -596,6 +618,12 @@ SCIP_Retcode ScipUser::scipSolve(vector<Task*> * tasksToS, SCIP_VAR * vars[], bo
   SCIP_CALL( SCIPsolve(scip) );
   SCIP_CALL( SCIPprintBestSol(scip, NULL, FALSE) );
   SCIP_SOL* sol = SCIPgetBestSol(scip);
+
+  //size of the formulation as created, before presolving
+  num_vars = SCIPgetNOrigVars(scip);
+  num_conss = SCIPgetNOrigConss(scip);
+  gap = SCIPgetGap(scip);
+  solve_time = SCIPgetSolvingTime(scip);
   
   if(sol == NULL)
   {
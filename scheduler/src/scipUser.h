@@ -21,6 +21,11 @@ class ScipUser
   SCIP_VAR * f; //pointer to fake variable, we need to have it global to some error, probably internal SCIP
   vector<SCIP_VAR*> * pre_var;
   int num_preVar;
+  //statistics of the last solve, for benchmarking the formulation
+  int num_vars;
+  int num_conss;
+  double gap;
+  double solve_time;
   public:
   ScipUser();
   ~ScipUser();
@@ -38,6 +43,12 @@ class ScipUser
   SCIP_Retcode setFinalCons(vector<Task*> *, vector<SCIP_VAR *> *, SCIP_VAR *, vector< vector<int> > *);
   SCIP_Retcode setFinalCons_long(vector<Task*> *, vector<SCIP_VAR *> *, SCIP_VAR *, vector< vector<int> > *);
   SCIP_Retcode scipSolve(vector<Task*> *, SCIP_VAR *[],bool*);
+  SCIP_Retcode setTimeLimit(double);
+  SCIP_Retcode setVerbosity(int);
+  int getNumVars();
+  int getNumConss();
+  double getGap();
+  double getSolveTime();
 };
 
 #endif
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Measures how many applicability checks and action applications per second
+Action can do against a state of a given size.
+
+Usage:
+    action_benchmark.py [number of clauses in the state, default 10000] [number of calls, default 20000]
+"""
+import sys
+import time
+
+from strands_action_domain.action import Action
+from strands_action_domain.state import SymbolicState
+
+ACTION = """
+ActionName:    pick_up
+ActionServer:  pick_up_server
+ParameterTypes:
+    x:  string
+    y:  string
+Preconditions: (type ?x ?y) (not (running ?x)) (type robot robot-category)
+Effects: (running ?x) (not (type ?x ?y))
+"""
+
+
+def make_state(count):
+    clauses = ['(type robot robot-category)']
+    for i in xrange(count - 1):
+        if i % 4 == 0:
+            clauses.append('(running object%d)' % i)
+        else:
+            clauses.append('(type object%d category%d)' % (i, i % 50))
+    return SymbolicState.createFromString(' '.join(clauses))
+
+
+def make_bindings(count, state_size):
+    # objects with numbers divisible by four are running, so the action is not applicable to them
+    return [{'?x': 'object%d' % (i % state_size), '?y': 'category%d' % ((i % state_size) % 50)} for i in xrange(count)]
+
+
+if __name__ == '__main__':
+    state_size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    action = Action.load_yaml(ACTION)
+    state = make_state(state_size)
+    bindings = make_bindings(calls, state_size - 1)
+
+    started = time.time()
+    applicable = [b for b in bindings if action.checkApplicable(state, b)]
+    print 'applicability checks per second: %.0f (%d of %d applicable)' % (calls / (time.time() - started), len(applicable), calls)
+
+    # as in search, where the same bindings are tried in many states
+    repeated = bindings[:100] * (calls / 100)
+    started = time.time()
+    for b in repeated:
+        action.checkApplicable(state, b)
+    print 'applicability checks per second over 100 bindings: %.0f' % (len(repeated) / (time.time() - started))
+
+    started = time.time()
+    for b in applicable:
+        action.applyToState(state, b, check_conditions=False)
+    print 'applications per second on a %d clause state: %.0f' % (state_size, len(applicable) / (time.time() - started))
+
+    # each application to the state the last one made, as along a plan
+    chain = applicable[:1000]
+    current = state
+    started = time.time()
+    for b in chain:
+        current = action.applyToState(current, b, check_conditions=False)
+    print 'chained applications per second: %.0f' % (len(chain) / (time.time() - started))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Measures the memory used by Clause objects, how quickly they can be
+compared, how quickly states are parsed and how quickly they are searched.
+
+Clauses are built the way the parser builds them, with a new string for every
+constant, over a pool of object and category names.
+
+Usage:
+    clause_benchmark.py [number of clauses, default 100000]
+"""
+import gc
+import os
+import sys
+import time
+
+from strands_action_domain.state import Clause, SymbolicState
+
+
+def resident_kb():
+    """ Current resident set size of this process in kB. """
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024
+
+
+def make_clauses(count, objects=1000, categories=50):
+    # '%s' % ... gives a fresh string each time, as tokens from the parser are
+    return [Clause('type', ['object%d' % (i % objects), 'category%d' % (i % categories)]) for i in xrange(count)]
+
+
+def time_per_second(operation, items):
+    started = time.time()
+    operation(items)
+    return len(items) / (time.time() - started)
+
+
+def compare_pairs(pairs):
+    for a, b in pairs:
+        a == b
+
+
+def state_string(count):
+    """ A state with a mix of plain, negated and forall clauses. """
+    parts = []
+    for i in xrange(count):
+        if i % 10 == 0:
+            parts.append('(not (running object%d))' % i)
+        elif i % 50 == 1:
+            parts.append('(forall (?o) (type ?o category%d))' % i)
+        else:
+            parts.append('(type object%d category%d)' % (i, i % 50))
+    return ' '.join(parts)
+
+
+def check_members(args):
+    clauses, state = args
+    for c in clauses:
+        c in state
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    gc.collect()
+    before = resident_kb()
+    clauses = make_clauses(count)
+    gc.collect()
+    used = resident_kb() - before
+    print 'memory per %d clauses: %d kB (%.0f bytes per clause)' % (count, used, used * 1024.0 / count)
+
+    # equal clauses built separately, so only the values match
+    equal = zip(clauses, make_clauses(count))
+    unequal = zip(clauses, clauses[1:] + clauses[:1])
+    print 'equal comparisons per second:   %.0f' % time_per_second(compare_pairs, equal)
+    print 'unequal comparisons per second: %.0f' % time_per_second(compare_pairs, unequal)
+
+    state = SymbolicState(clauses[:count / 10])
+    others = [b for a, b in equal]
+    started = time.time()
+    check_members((others, state))
+    print 'state membership tests per second: %.0f' % (len(others) / (time.time() - started))
+
+    text = state_string(count / 10)
+    started = time.time()
+    SymbolicState.createFromString(text)
+    print 'clauses parsed per second: %.0f' % (count / 10 / (time.time() - started))
+
+    state = SymbolicState.createFromString(text)
+    objects = ['object%d' % i for i in xrange(0, count / 10, 7)]
+    started = time.time()
+    for o in objects[:100]:
+        state.findClauses(r'\(type %s .*\)' % o)
+    print 'regex searches per second:   %.0f' % (min(100, len(objects)) / (time.time() - started))
+    started = time.time()
+    for o in objects:
+        state.queryClauses('type', (o, None))
+    print 'indexed queries per second:  %.0f' % (len(objects) / (time.time() - started))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Measures how long finding the exported actions takes on a generated
+workspace, with no cache and with the cache from a previous run.
+
+Usage:
+    discovery_benchmark.py [number of packages, default 300] [number exporting an action, default 30]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import rospkg
+
+from strands_action_domain.action import Action
+from strands_action_domain.discovery import ActionDiscovery
+
+MANIFEST = """<package>
+  <name>%s</name>
+  <version>0.0.0</version>
+  <description>generated package</description>
+  <maintainer email="test@example.com">test</maintainer>
+  <license>BSD</license>
+  <export>%s</export>
+</package>
+"""
+
+ACTION = """
+ActionName:    action%d
+ActionServer:  action%d_server
+ParameterTypes:
+    x:  string
+Preconditions: (running ?x) (type ?x robot-category)
+Effects: (not (running ?x))
+"""
+
+
+def make_workspace(packages, with_actions):
+    workspace = tempfile.mkdtemp()
+    for i in xrange(packages):
+        path = os.path.join(workspace, 'src', 'package%d' % i)
+        os.makedirs(path)
+        export = ''
+        if i < with_actions:
+            export = '<strands_action_domain action="${prefix}/action.yaml"/>'
+            with open(os.path.join(path, 'action.yaml'), 'w') as f:
+                f.write(ACTION % (i, i))
+        with open(os.path.join(path, 'package.xml'), 'w') as f:
+            f.write(MANIFEST % ('package%d' % i, export))
+    return workspace
+
+
+def load(workspace):
+    """ Time finding the actions and building them, in a new process's way. """
+    started = time.time()
+    discovery = ActionDiscovery(rospkg.RosPack(ros_paths=[workspace]),
+                                os.path.join(workspace, 'cache'))
+    actions = [Action.from_data(data) for pkg, action_file, data in discovery.find()]
+    return time.time() - started, len(actions)
+
+
+if __name__ == '__main__':
+    packages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with_actions = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    workspace = make_workspace(packages, with_actions)
+    try:
+        seconds, count = load(workspace)
+        print 'cold start: %.1f ms for %d actions in %d packages' % (seconds * 1000, count, packages)
+        seconds, count = load(workspace)
+        print 'warm start: %.1f ms' % (seconds * 1000)
+    finally:
+        shutil.rmtree(workspace)
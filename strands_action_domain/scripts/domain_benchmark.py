@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compares saving and loading a generated DomainDefinition as a pickle and in
+the binary format of domain_file, read and memory mapped, and writing the
+PDDL of the domain and of a problem with a large initial state.
+
+Usage:
+    domain_benchmark.py [number of actions, default 200] [clauses per action, default 50] [initial state clauses, default 100000]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from strands_action_domain.action import Action
+from strands_action_domain.domain import DomainDefinition, ProblemDefinition
+from strands_action_domain.state import Clause, SymbolicState
+
+
+def make_domain(actions, clauses):
+    domain = DomainDefinition('benchmark', 'generated domain')
+    for i in xrange(actions):
+        preconditions = [Clause('type', ['?x', 'thing%d' % j]) for j in xrange(clauses)]
+        preconditions.append(Clause('running', ['?x'], negated=True))
+        effects = [Clause('running', ['?x']), Clause('type', ['?x', 'thing0'], negated=True)]
+        domain.addExistingAction(Action('action%d' % i, 'action%d_server' % i,
+                                        SymbolicState(preconditions), SymbolicState(effects),
+                                        {'target': '?x', 'attempts': 3}, {'x': 'string'}))
+    return domain
+
+
+def best_of(runs, function):
+    best = None
+    for i in xrange(runs):
+        started = time.time()
+        function()
+        seconds = time.time() - started
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+if __name__ == '__main__':
+    actions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    clauses = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    initial = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+
+    domain = make_domain(actions, clauses)
+    directory = tempfile.mkdtemp()
+    try:
+        pickled = os.path.join(directory, 'domain.pickle')
+        binary = os.path.join(directory, 'domain.bin')
+        print '%d actions of %d clauses' % (actions, clauses + 1)
+        print 'save pickle: %.1f ms' % (best_of(3, lambda: domain.saveToDisk(pickled, use_pickle=True)) * 1000)
+        print 'save binary: %.1f ms' % (best_of(3, lambda: domain.saveToDisk(binary)) * 1000)
+        print 'size pickle: %d bytes, binary: %d bytes' % (os.path.getsize(pickled), os.path.getsize(binary))
+        print 'load pickle: %.1f ms' % (best_of(3, lambda: DomainDefinition.createFromFile(pickled)) * 1000)
+        print 'load binary: %.1f ms' % (best_of(3, lambda: DomainDefinition.createFromFile(binary)) * 1000)
+        print 'load mmap:   %.1f ms' % (best_of(3, lambda: DomainDefinition.createFromFile(binary, use_mmap=True)) * 1000)
+
+        problem = ProblemDefinition('benchmark', domain,
+                                    SymbolicState([Clause('type', ['object%d' % i, 'thing%d' % (i % 50)])
+                                                   for i in xrange(initial)]))
+        problem.setGoal(SymbolicState([Clause('running', ['object0'])]))
+        pddl = os.path.join(directory, 'problem.pddl')
+
+        def write(definition):
+            with open(pddl, 'w') as f:
+                definition.writePDDL(f)
+        print 'write domain PDDL: %.1f ms' % (best_of(3, lambda: write(domain)) * 1000)
+        print 'write problem PDDL, %d clauses: %.1f ms' % (initial, best_of(3, lambda: write(problem)) * 1000)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""
+Measures how long grounding the delivery problems of planner_benchmark.py
+takes with different numbers of worker processes.
+
+Usage:
+    grounding_benchmark.py [grid side, default 16] [objects, default 60] [largest number of processes, default the number of cores]
+"""
+import multiprocessing
+import sys
+import time
+
+from strands_action_domain.action import Action
+from strands_action_domain.planner import Planner
+
+from planner_benchmark import ACTIONS, make_problem, register_predicates
+
+
+if __name__ == '__main__':
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    objects = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    largest = int(sys.argv[3]) if len(sys.argv) > 3 else multiprocessing.cpu_count()
+
+    register_predicates()
+    actions = [Action.load_yaml(a) for a in ACTIONS]
+    initial, goal = make_problem(side, objects)
+    objects = sorted(initial.whatObjects() | goal.whatObjects())
+    print 'processes operators seconds'
+    counts = sorted(set([1] + [n for n in (2, 4, 8, 16) if n <= largest] + [largest]))
+    for processes in counts:
+        # one process grounds in this process, more fork workers
+        planner = Planner(actions, processes=processes)
+        started = time.time()
+        operators = planner.ground(initial, objects)
+        print '%9d %9d %7.2f' % (processes, len(operators), time.time() - started)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Measures how long Planner takes on generated delivery problems of increasing
+size: a robot on a square grid of waypoints has to carry objects, which start
+in one corner, to the opposite corner.
+
+Usage:
+    planner_benchmark.py [largest grid side, default 8] [search, gbfs or astar, default gbfs]
+"""
+import sys
+import time
+
+from strands_action_domain.action import Action
+from strands_action_domain.planner import Planner
+from strands_action_domain.predicates import Predicate, Predicates
+from strands_action_domain.state import SymbolicState
+
+ACTIONS = ["""
+ActionName:    move
+ActionServer:  topological_navigation
+ParameterTypes:
+    from:  string
+    to:  string
+Preconditions: (robot-in ?from) (connected ?from ?to)
+Effects: (robot-in ?to) (not (robot-in ?from))
+""", """
+ActionName:    pick
+ActionServer:  pick_server
+ParameterTypes:
+    o:  string
+    w:  string
+Preconditions: (robot-in ?w) (object-in ?o ?w)
+Effects: (carrying ?o) (not (object-in ?o ?w))
+""", """
+ActionName:    drop
+ActionServer:  drop_server
+ParameterTypes:
+    o:  string
+    w:  string
+Preconditions: (robot-in ?w) (carrying ?o)
+Effects: (object-in ?o ?w) (not (carrying ?o))
+"""]
+
+
+def register_predicates():
+    for name, arity in [('robot-in', 1), ('connected', 2), ('object-in', 2), ('carrying', 1)]:
+        Predicates.register(name, Predicate(arity, evaluatable=False)(lambda geometric_state, *c: True))
+
+
+def make_problem(side, objects):
+    """ The initial and goal states for a side x side grid. """
+    clauses = ['(robot-in w0-0)']
+    for x in xrange(side):
+        for y in xrange(side):
+            for dx, dy in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+                if 0 <= x + dx < side and 0 <= y + dy < side:
+                    clauses.append('(connected w%d-%d w%d-%d)' % (x, y, x + dx, y + dy))
+    goals = []
+    for i in xrange(objects):
+        clauses.append('(object-in object%d w0-0)' % i)
+        goals.append('(object-in object%d w%d-%d)' % (i, side - 1, side - 1))
+    return SymbolicState.createFromString(' '.join(clauses)), SymbolicState.createFromString(' '.join(goals))
+
+
+if __name__ == '__main__':
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    search = sys.argv[2] if len(sys.argv) > 2 else 'gbfs'
+
+    register_predicates()
+    actions = [Action.load_yaml(a) for a in ACTIONS]
+    print 'side objects operators plan-length expanded generated seconds'
+    for side in xrange(2, largest + 1):
+        initial, goal = make_problem(side, side)
+        planner = Planner(actions, search=search)
+        started = time.time()
+        plan = planner.plan(initial, goal)
+        print '%4d %7d %9d %11d %8d %9d %7.2f' % (side, side, len(planner.operators), len(plan),
+                                                 planner.expanded, planner.generated, time.time() - started)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Measures what pruning to the goal's relevant clauses saves the Planner, on
+the delivery problems of planner_benchmark.py with many more objects lying
+around than the goal mentions, and facts no action uses.
+
+Usage:
+    relevance_benchmark.py [grid side, default 6] [objects, default 40] [objects in the goal, default 2] [unused facts, default 20000]
+"""
+import sys
+import time
+
+from strands_action_domain.action import Action
+from strands_action_domain.planner import Planner
+from strands_action_domain.state import Clause, SymbolicState
+
+from planner_benchmark import ACTIONS, make_problem, register_predicates
+
+
+if __name__ == '__main__':
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    objects = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    in_goal = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    unused = int(sys.argv[4]) if len(sys.argv) > 4 else 20000
+
+    register_predicates()
+    actions = [Action.load_yaml(a) for a in ACTIONS]
+    initial, goal = make_problem(side, objects)
+    goal = SymbolicState(list(goal)[:in_goal])
+    initial = SymbolicState(list(initial) + [Clause('type', ['thing%d' % i, 'kind%d' % (i % 10)])
+                                             for i in xrange(unused)])
+    for prune in (False, True):
+        planner = Planner(actions)
+        started = time.time()
+        plan = planner.plan(initial, goal, prune=prune)
+        print '%s: %d operators, plan of %d, %d expanded, %.2f seconds' % (
+            'pruned' if prune else 'full', len(planner.operators), len(plan),
+            planner.expanded, time.time() - started)
+        if prune:
+            print planner.relevance
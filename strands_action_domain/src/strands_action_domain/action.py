@@ -1,6 +1,8 @@
+import copy
 import yaml
 import predicates
 import state
+from collections import OrderedDict
 
 from strands_executive_msgs import task_utils
 from strands_executive_msgs.msg import Task
@@ -11,6 +13,9 @@ class Action(object):
     An action in the domain. Stores the effect on the state, what the
     preconditions of exectution are, action server etc. Loads yaml files.
     """
+    # how many groundings of each action are kept for reuse
+    grounding_cache_size = 1024
+    
     #----------------------------------------------------------------------
     def __init__(self, name, action_server,
                  preconditions, effects, 
@@ -35,7 +40,106 @@ class Action(object):
             self.parameter_types = {}
         else:
             self.parameter_types = parameter_types
+        self.compile()
             
+    #----------------------------------------------------------------------
+    def compile(self):
+        """Works out everything about the action that does not depend on the
+        parameters it is applied with. Call again after changing the
+        preconditions or effects.
+        
+        Sets parameters, the action's parameters in the order they first
+        appear, and add_list and delete_list, the effects split into the
+        clauses added and removed. Delete list clauses are not negated.
+        
+        Clauses with parameters are kept as templates, pairs of the clause
+        and the (argument index, parameter index) slots to fill in, so that
+        grounding does not need to search the clause.
+        """
+        self.parameters = []
+        for c in list(self.preconditions) + list(self.effects):
+            for a in c.args:
+                if state.isParameter(a) and a not in self.parameters:
+                    self.parameters.append(a)
+                    
+        self.add_list = state.SymbolicState([c for c in self.effects if not c.negated])
+        self.delete_list = state.SymbolicState([state.Clause.createCopy(c, negated=False)
+                                                for c in self.effects if c.negated])
+        self._effect_parameters = set(self.add_list.whatParameters())
+        self._effect_parameters.update(self.delete_list.whatParameters())
+        self._effect_foralls = any(c.forall for c in self.effects)
+        
+        # (clause to look for in the state, should it be absent, precondition)
+        # with the parameter independent ones first as they are cheapest
+        self._static_preconditions = []
+        self._precondition_templates = []
+        for c in self.preconditions:
+            check = (self._template(state.Clause.createCopy(c, negated=False)), c.negated, self._template(c))
+            if any(state.isParameter(a) for a in c.args):
+                self._precondition_templates.append(check)
+            else:
+                self._static_preconditions.append((check[0][0], check[1], check[2]))
+        self._precondition_parameters = set(self.preconditions.whatParameters())
+        self._add_templates = [self._template(c) for c in self.add_list]
+        self._delete_templates = [self._template(c) for c in self.delete_list]
+        self._groundings = LRUCache(self.grounding_cache_size)
+    
+    #----------------------------------------------------------------------
+    def _template(self, clause):
+        slots = tuple([(i, self.parameters.index(a)) for i, a in enumerate(clause.args)
+                       if state.isParameter(a)])
+        return (clause, slots)
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _groundTemplate(template, binding):
+        """Fill the slots of a template from the binding tuple, leaving any
+        parameter whose value is None."""
+        clause, slots = template
+        if len(slots) == 0:
+            return clause
+        args = list(clause.args)
+        for i, j in slots:
+            if binding[j] is not None:
+                args[i] = binding[j]
+        return clause.replaceArgs(tuple(args))
+    
+    #----------------------------------------------------------------------
+    def ground(self, parameters):
+        """Returns the GroundedAction for the given parameter values. The
+        most recently used groundings are cached, so grounding the same
+        values again is a lookup.
+        
+        :Parameters:
+            parameters : dict
+                dict of parameter strings, parameters without a value are
+                left in the grounded clauses
+        """
+        binding = tuple([parameters.get(p) for p in self.parameters])
+        grounded = self._groundings.get(binding)
+        if grounded is None:
+            binding = tuple([state.internSymbol(v) for v in binding])
+            grounded = GroundedAction(self, binding)
+            grounded.preconditions = list(self._static_preconditions)
+            for check, absent, precondition in self._precondition_templates:
+                grounded.preconditions.append((self._groundTemplate(check, binding), absent, precondition))
+            self._groundings.put(binding, grounded)
+        return grounded
+    
+    #----------------------------------------------------------------------
+    def _groundEffects(self, grounded):
+        """Fill in the add and delete lists of a GroundedAction, which are
+        left until the action is first applied with that grounding."""
+        if grounded.add_list is None:
+            grounded.add_list = [self._groundTemplate(t, grounded.binding) for t in self._add_templates]
+            grounded.delete_list = [self._groundTemplate(t, grounded.binding) for t in self._delete_templates]
+    
+    #----------------------------------------------------------------------
+    def _checkParameters(self, needed, parameters):
+        """Raise a StateError if any of the needed parameters has no value"""
+        missing = needed.difference(parameters)
+        if len(missing) > 0:
+            raise state.StateError("PARAM", "Don't have value for "+str(missing.pop()))
     
     #----------------------------------------------------------------------
     def createCopy(self):
@@ -43,7 +147,10 @@ class Action(object):
         
     #----------------------------------------------------------------------
     def checkApplicable(self, symbolicstate, parameters, return_diff=False):
-        """Test the preconditions hold with given parameters
+        """Test the preconditions hold with given parameters. A clause is
+        also present when a forall clause in the state stands for it, and a
+        negated forall precondition fails if the state has any clause the
+        forall stands for. Foralls are looked up, not expanded.
         
         :Parameters:
             symbolicstate : SymbolicState
@@ -54,57 +161,85 @@ class Action(object):
                 should return the preconditons diff? default no, if true returns
                 a tuple (False|True,diff)
         """
-        ground_precond = copy.deepcopy(self.preconditions)
-        ground_precond.groundParameters(parameters)
-        diff =  state.SymbolicState()
-        for c in ground_precond.state:
-            if c.negated:
-                cc = copy.deepcopy(c)
-                cc.negated = False
-                if symbolicstate.hasClause(cc):
-                    cc.negated = True
-                    diff.addClause(cc)
-            else:
-                if not symbolicstate.hasClause(c):
-                    diff.addClause(copy.deepcopy(c))
-        #diff = ground_precond - symbolicstate
-        if len(diff.state) != 0: #len(ground_precond.state):
-            if return_diff:
-                return (False, diff)
-            else:
-                return False
+        self._checkParameters(self._precondition_parameters, parameters)
+        grounded = self.ground(parameters)
+        diff = []
+        for check, absent, precondition in grounded.preconditions:
+            present = check in symbolicstate
+            if not present:
+                if not check.forall:
+                    present = symbolicstate.isCoveredByForAll(check)
+                elif absent:
+                    present = next(symbolicstate.forAllMatches(check), None) is not None
+            if present == absent:
+                if not return_diff:
+                    return False
+                diff.append(self._groundTemplate(precondition, grounded.binding))
+        if return_diff:
+            return (len(diff) == 0, state.SymbolicState(diff))
         else:
-            if return_diff:
-                return (True, diff)
-            else:
-                return True
+            return len(diff) == 0
     
     #----------------------------------------------------------------------
     def applyToState(self, symbolicstate, parameters, check_conditions=True, object_list=None):
         """Applies the action to a symbolic state. Return new state
         
+        Without an object_list forall effects are not expanded: a forall
+        delete removes the clauses of the state it stands for, found from the
+        state's indexes, and a forall add is added as it is.
+        
         :Parameters:
             symbolicstate : SymbolicState, not altered
                 state to apply against
             parameters : dict
                 dict of parameter strings
+            object_list : list
+                the objects to expand forall effects over
         """
         if check_conditions and not self.checkApplicable(symbolicstate, parameters):
             raise ActionError("NOTAPLIC", "%s not applicable"%self.name)
-        ground_add = copy.deepcopy(self.add_list)
-        ground_del = copy.deepcopy(self.delete_list)
-        ground_add.groundParameters(parameters)
-        ground_add.expandForAlls(object_list)
-        ground_del.groundParameters(parameters)
-        ground_del.expandForAlls(object_list)
-        symbolicstate = symbolicstate - ground_del
-        #print "GROUND DELETEE:"
-        #print ground_del
-        symbolicstate = symbolicstate & ground_add
-        #print "apply to state:"
-        #print "Add:", ground_add
-        #print "Del:", ground_del
-        return symbolicstate
+        ground_add, ground_del = self.groundEffects(parameters, object_list)
+        if self._effect_foralls and object_list is None:
+            deletes = []
+            for c in ground_del:
+                if c.forall:
+                    deletes.extend(symbolicstate.forAllMatches(c))
+                deletes.append(c)
+            ground_del = deletes
+        return symbolicstate.successor(ground_add, ground_del)
+        
+    #----------------------------------------------------------------------
+    def groundEffects(self, parameters, object_list=None):
+        """Returns the (add, delete) lists of clauses the action has with
+        given parameters. Delete list clauses are not negated.
+        
+        :Parameters:
+            parameters : dict
+                dict of parameter strings
+            object_list : list
+                the objects forall effects are expanded over, by default they
+                are left as forall clauses
+        """
+        self._checkParameters(self._effect_parameters, parameters)
+        grounded = self.ground(parameters)
+        self._groundEffects(grounded)
+        ground_add = grounded.add_list
+        ground_del = grounded.delete_list
+        if self._effect_foralls and object_list is not None:
+            ground_add = self._expandForAlls(ground_add, object_list)
+            ground_del = self._expandForAlls(ground_del, object_list)
+        return ground_add, ground_del
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _expandForAlls(clauses, object_list):
+        expanded = []
+        for c in clauses:
+            if c.forall:
+                expanded.extend(c.expandForAll(object_list))
+            else:
+                expanded.append(c)
+        return expanded
         
     #----------------------------------------------------------------------
     def __str__(self):
@@ -127,7 +262,12 @@ class Action(object):
         
     @classmethod
     def load_yaml(cls, yml):
-        data = yaml.load(yml)
+        return cls.from_data(yaml.safe_load(yml))
+    
+    #----------------------------------------------------------------------
+    @classmethod
+    def from_data(cls, data):
+        """Create an action from the dict an action yaml file loads as."""
         name = data['ActionName']
         act_server = data['ActionServer']
         if data.has_key("Preconditions"):
@@ -152,15 +292,98 @@ class Action(object):
                   param_types)
         return act
         
-    def create_executive_task(self,  parameters):
-        task = Task(node_id='', action=self.action_server)
-        for arg, value in self.action_parameters.items():
-            if parameters.has_key(value): # fill in parameter
+    #----------------------------------------------------------------------
+    def create_executive_task(self, parameters, start_node_id=''):
+        """Returns a Task calling this action's action server with the
+        ActionServerParameters as arguments, in the order of their names.
+        Arguments given as a parameter take its value from parameters.
+        
+        :Parameters:
+            parameters : dict
+                dict of parameter strings
+            start_node_id : str
+                the topological node the task should start at
+        """
+        task = Task(start_node_id=start_node_id, action=self.action_server)
+        for arg in sorted(self.action_parameters.keys()):
+            value = self.action_parameters[arg]
+            if isinstance(value, str) and parameters.has_key(value): # fill in parameter
                 value = parameters[value]
-            task_utils.add_argument(arg, value) # this requires the change discussed on gitter
+            if isinstance(value, bool):
+                task_utils.add_string_argument(task, str(value))
+            elif isinstance(value, int):
+                task_utils.add_int_argument(task, value)
+            elif isinstance(value, float):
+                task_utils.add_float_argument(task, value)
+            else:
+                task_utils.add_string_argument(task, str(value))
         return task
         
         
+########################################################################
+class GroundedAction(object):
+    """
+    An action with values given for its parameters. preconditions holds
+    (clause, should it be absent, precondition template) for each
+    precondition, and add_list and delete_list the grounded effects, as lists
+    of clauses, or None until the action is applied. Foralls are not
+    expanded.
+    """
+    __slots__ = ('action', 'binding', 'preconditions', 'add_list', 'delete_list')
+    
+    #----------------------------------------------------------------------
+    def __init__(self, action, binding):
+        """
+        :Parameters:
+            action : Action
+                the action grounded
+            binding : tuple
+                the parameter values, in the order of action.parameters
+        """
+        self.action = action
+        self.binding = binding
+        self.preconditions = []
+        self.add_list = None
+        self.delete_list = None
+        
+        
+########################################################################
+class LRUCache(object):
+    """
+    A mapping which holds at most capacity entries, dropping the least
+    recently used when full.
+    """
+    #----------------------------------------------------------------------
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        
+    #----------------------------------------------------------------------
+    def get(self, key):
+        """Returns the value for key, or None."""
+        value = self.entries.get(key)
+        if value is not None:
+            # move to the most recently used end
+            del self.entries[key]
+            self.entries[key] = value
+        return value
+    
+    #----------------------------------------------------------------------
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            
+    #----------------------------------------------------------------------
+    def clear(self):
+        self.entries.clear()
+        
+    #----------------------------------------------------------------------
+    def __len__(self):
+        return len(self.entries)
+        
+        
 ########################################################################
 class ActionError(Exception):
     '''
@@ -0,0 +1,189 @@
+'''
+discovery.py
+------------
+
+Finds the actions ROS packages export with a tag like::
+
+  <export>
+    <strands_action_domain action="${prefix}/actions/my_action.yaml"/>
+  </export>
+
+What is found is kept in a cache file under ROS_HOME, with the modification
+times of the manifests and action files, so that later starts only need to
+check those times and parse what changed.
+'''
+import cPickle as pickle
+import os
+
+import rospkg
+import rospy
+import yaml
+
+# bump when the layout of the cache changes, older caches are ignored
+CACHE_VERSION = 1
+
+
+########################################################################
+class ActionDiscovery(object):
+    """
+    Discovers exported action files, keeping a cache of the packages seen.
+
+    The cache holds, for each package, its path, the modification time of
+    its manifest and the action files it exports, each with its modification
+    time and the data it loads as. It is only trusted for the ROS package
+    path it was made with. The packages themselves are not searched for
+    again unless asked, so new packages are found by find(rescan=True).
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, rospack=None, cache_file=None):
+        """
+        :Parameters:
+            rospack : rospkg.RosPack
+                used to search for packages, by default a new one
+            cache_file : str
+                by default strands_action_domain_cache in ROS_HOME
+        """
+        if rospack is None:
+            rospack = rospkg.RosPack()
+        if cache_file is None:
+            cache_file = os.path.join(rospkg.get_ros_home(), 'strands_action_domain_cache')
+        self.rospack = rospack
+        self.cache_file = cache_file
+        # the number of manifests and action files parsed by the last find
+        self.manifests_parsed = 0
+        self.actions_parsed = 0
+
+    #----------------------------------------------------------------------
+    def find(self, rescan=False):
+        """Returns a list of (package, action file, action data) for every
+        exported action, in package name order. The data is the dict the
+        action file loads as, for Action.from_data.
+
+        :Parameters:
+            rescan : bool
+                search the ROS package path for packages, rather than using
+                those in the cache. This happens anyway without a cache.
+        """
+        self.manifests_parsed = 0
+        self.actions_parsed = 0
+        ros_paths = self.rospack.get_ros_paths()
+        cache = self._loadCache()
+        if cache is not None and cache['ros_paths'] != ros_paths:
+            cache = None
+        if cache is None:
+            cached = {}
+            rescan = True
+        else:
+            cached = cache['packages']
+
+        if rescan:
+            paths = [(pkg, self.rospack.get_path(pkg)) for pkg in self.rospack.list()]
+        else:
+            paths = [(pkg, entry[0]) for pkg, entry in cached.iteritems()]
+
+        packages = {}
+        for pkg, path in paths:
+            entry = self._refreshPackage(pkg, path, cached.get(pkg))
+            if entry is not None:
+                packages[pkg] = entry
+
+        if rescan or packages != cached:
+            self._saveCache({'version': CACHE_VERSION,
+                             'ros_paths': ros_paths,
+                             'packages': packages})
+
+        found = []
+        for pkg in sorted(packages.keys()):
+            for action_file, mtime, data in packages[pkg][2]:
+                found.append((pkg, action_file, data))
+        return found
+
+    #----------------------------------------------------------------------
+    def _refreshPackage(self, pkg, path, entry):
+        """Returns the cache entry (path, manifest mtime, [(action file,
+        mtime, data)]) for a package, reusing what is still valid in the old
+        entry. Returns None if the package has gone."""
+        manifest_mtime = self._manifestTime(path)
+        if manifest_mtime is None:
+            return None
+        if entry is not None and entry[0] == path and entry[1] == manifest_mtime:
+            action_files = [a[0] for a in entry[2]]
+            old_actions = dict([(a[0], a) for a in entry[2]])
+        else:
+            action_files = self._exportedActions(pkg, path)
+            old_actions = {}
+            self.manifests_parsed += 1
+
+        actions = []
+        for action_file in action_files:
+            try:
+                mtime = os.stat(action_file).st_mtime
+            except OSError:
+                rospy.logerr("Package '%s' exports action file '%s' which "
+                             "does not exist." % (pkg, action_file))
+                continue
+            old = old_actions.get(action_file)
+            if old is not None and old[1] == mtime:
+                actions.append(old)
+            else:
+                with open(action_file, "r") as f:
+                    actions.append((action_file, mtime, yaml.safe_load(f.read())))
+                self.actions_parsed += 1
+        return (path, manifest_mtime, actions)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _manifestTime(path):
+        """Returns the modification time of the package's manifest, the
+        later of package.xml and manifest.xml, or None if it has neither."""
+        mtime = None
+        for name in ('package.xml', rospkg.MANIFEST_FILE):
+            try:
+                mtime = max(mtime, os.stat(os.path.join(path, name)).st_mtime)
+            except OSError:
+                pass
+        return mtime
+
+    #----------------------------------------------------------------------
+    def _exportedActions(self, pkg, path):
+        """Parse the package's manifest for the action files it exports."""
+        actions = []
+        manifest = rospkg.manifest.parse_manifest_file(path, rospkg.MANIFEST_FILE,
+                                                       rospack=self.rospack)
+        for export in manifest.exports:
+            if export.tag == "strands_action_domain":
+                if export.attrs.has_key('action'):
+                    actions.append(export.attrs['action'].replace("${prefix}", path))
+                else:
+                    rospy.logerr("Package '%s' has <strands_action_domain>"
+                                 " tag in export but it misses 'action' "
+                                 "attribute." % pkg)
+        return actions
+
+    #----------------------------------------------------------------------
+    def _loadCache(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                cache = pickle.load(f)
+        except Exception:
+            # a missing or unreadable cache is rebuilt
+            return None
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+            return None
+        return cache
+
+    #----------------------------------------------------------------------
+    def _saveCache(self, cache):
+        """Write the cache, through a temporary file so that a reader never
+        sees it half written."""
+        directory = os.path.dirname(self.cache_file)
+        temporary = "%s.%d" % (self.cache_file, os.getpid())
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(temporary, "wb") as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temporary, self.cache_file)
+        except (IOError, OSError) as e:
+            rospy.logwarn("Could not write the action cache %s: %s" % (self.cache_file, e))
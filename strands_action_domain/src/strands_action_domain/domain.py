@@ -2,7 +2,8 @@
 PythonDomainDef.py
 ------------------
 Provides classes for storing domain definitions and problem definitions. The
-"native" format of these definitions is as python pickled objects, not PDDL.
+"native" format of these definitions is the binary format of domain_file (or
+python pickled objects), not PDDL.
 However, each provide methods for generating a PDDL representation.
 """
 import copy
@@ -97,17 +98,35 @@ class DomainDefinition(object):
         self.predicates = predicates.Predicates
                
     #----------------------------------------------------------------------
-    def saveToDisk(self, filename):
-        """Save the domain to a file"""
-        import pickle
-        out = open(filename, "w")
-        pickle.dump(self, out)
-        out.close()
+    def saveToDisk(self, filename, use_pickle=False):
+        """Save the domain to a file, in the binary format of domain_file
+        unless use_pickle is True"""
+        if use_pickle:
+            import pickle
+            out = open(filename, "w")
+            pickle.dump(self, out)
+            out.close()
+            return
+        import domain_file
+        out = open(filename, "wb")
+        try:
+            domain_file.writeDomain(self, out)
+        finally:
+            out.close()
 
     #----------------------------------------------------------------------
     @staticmethod
-    def createFromFile(filename):
-        """Create an instance of this class from a pickled copy"""
+    def createFromFile(filename, use_mmap=False):
+        """Create an instance of this class from a file written by
+        saveToDisk, in either format.
+
+        :Parameters:
+            use_mmap : bool
+                memory map a binary file rather than reading it
+        """
+        import domain_file
+        if domain_file.isDomainFile(filename):
+            return domain_file.loadDomain(filename, use_mmap)
         import pickle
         file_in = open(filename, "r")
         load = pickle.load(file_in)
@@ -136,78 +155,93 @@ class DomainDefinition(object):
             retstr += "        EFFECTS:%s\n"%repr(self.getAction(act).effects)
         return retstr
     
+    #----------------------------------------------------------------------
+    def iterPDDL(self):
+        """Generate the PDDL of the domain a piece at a time."""
+        ident = '    '
+        ident2 = ident * 2
+        ident3 = ident * 3
+        yield '; %s\n' % self.commment
+        yield '(define (domain %s)\n' % self.domain_name
+        yield ident + '(:requirements :strips :equality)\n'
+        yield ident + '(:predicates\n'
+        preds = self.predicates.getPredicates()
+        for pred, consts in preds.iteritems():
+            yield '%s(%s%s)\n' % (ident2, pred, ''.join([' ?%s' % c for c in consts]))
+        yield ident + ')\n'
+        for name in self.actions:
+            action = self.getAction(name)
+            parameters = action.parameters
+            yield '%s(:action %s :parameters ( %s)\n' % (ident, name,
+                                                        ''.join(['%s ' % p for p in parameters]))
+            yield ident2 + ':precondition (and\n'
+            for c in action.preconditions:
+                yield '%s%s\n' % (ident3, c)
+            if len(parameters) > 1:
+                yield '%s(not (= %s %s))\n' % (ident3, parameters[0], parameters[1])
+            yield ident2 + ')\n'
+            yield ident2 + ':effect (and\n'
+            for c in action.add_list:
+                yield '%s%s\n' % (ident3, c)
+            # the negated effects, which the delete list holds un-negated
+            for c in action.effects:
+                if c.negated:
+                    yield '%s%s\n' % (ident3, c)
+            yield ident2 + ')\n'
+            yield ident + ')\n'
+        yield ')'
+
+    #----------------------------------------------------------------------
+    def writePDDL(self, stream):
+        """Write the PDDL of the domain to a file like object."""
+        for piece in self.iterPDDL():
+            stream.write(piece)
+
     #----------------------------------------------------------------------
     def generatePDDL(self):
         """Returns a PDDL string of the domain."""
+        return ''.join(self.iterPDDL())
+
+    #----------------------------------------------------------------------
+    def iterSHOP(self):
+        """Generate the shop domain data a piece at a time."""
         ident = '    '
-        retstr = '; ' + self.commment + '\n'
-        retstr += '(define (domain %s)\n' % self.domain_name
-        retstr += ident + '(:requirements :strips :equality)\n'
-        retstr += ident + '(:predicates\n'
-        preds = self.predicates.getPredicates()
-        for pred in preds:
-            retstr += ident + ident + '(%s' % pred
-            for c in preds[pred]:
-                retstr += ' ?%s' % c
-            retstr += ')\n'
-        retstr += ident + ')\n'
-        for act in self.actions:
-            retstr +=  ident + '(:action %s :parameters ( ' % act
-            for c in self.getAction(act).parameters:
-                retstr += '%s ' % c
-            retstr += ')\n'
-            retstr += ident + ident + ':precondition (and\n'
-            for c in self.getAction(act).preconditions.state:
-                retstr += ident + ident + ident + str(c) + '\n'
-            if len(self.getAction(act).parameters) > 1:
-                retstr += ident + ident + ident + "(not (= %s %s))\n" % (self.getAction(act).parameters[0], self.getAction(act).parameters[1])
-            retstr += ident + ident + ')\n'
-           
-            retstr += ident + ident + ':effect (and\n'
-            for c in self.getAction(act).add_list.state:
-                retstr += ident + ident + ident + str(c) + '\n'
-            for c in self.getAction(act).delete_list.state:
-                c.negated = not c.negated  #delete list is not default negated...
-                retstr += ident + ident + ident +  str(c) + '\n'
-                c.negated = not c.negated
-                    
-            retstr += ident + ident + ')\n'              
-            
-            retstr += ident + ')\n'
-        retstr += ')'
-        return retstr
-    
+        ident2 = ident * 2
+        ident3 = ident * 3
+        yield '; %s\n' % self.commment
+        yield '(defdomain %s\n' % self.domain_name
+        for name in self.actions:
+            action = self.getAction(name)
+            parameters = action.parameters
+            yield '%s(:operator ( !%s   %s)\n' % (ident, name,
+                                                  ''.join(['%s ' % p for p in parameters]))
+            yield ident2 + '(and\n'  # precond
+            for c in action.preconditions:
+                yield '%s%s\n' % (ident3, c.shop_string())
+            if len(parameters) > 1:
+                yield '%s(not (= %s %s))\n' % (ident3, parameters[0], parameters[1])
+            yield ident2 + ')\n'
+            yield ident2 + '( \n'  # delete list
+            for c in action.delete_list:
+                yield '%s%s\n' % (ident3, c.shop_string())
+            yield ident2 + ') \n'
+            yield ident2 + '( \n'  # add list
+            for c in action.add_list:
+                yield '%s%s\n' % (ident3, c.shop_string())
+            yield ident2 + ')\n'
+            yield ident + ')\n'
+        yield ')'
+
+    #----------------------------------------------------------------------
+    def writeSHOP(self, stream):
+        """Write the shop domain data to a file like object."""
+        for piece in self.iterSHOP():
+            stream.write(piece)
+
     #----------------------------------------------------------------------
     def generateSHOP(self):
         """Generate the shop domain data."""
-        ident = '    '
-        retstr = '; ' + self.commment + '\n'
-        retstr += '(defdomain %s\n' % self.domain_name
-        for act in self.actions:
-            retstr +=  ident + '(:operator ( !%s   ' % act
-            for c in self.getAction(act).parameters:
-                retstr += '%s ' % c
-            retstr += ')\n'
-            retstr += ident + ident + '(and\n'  # precond
-            for c in self.getAction(act).preconditions.state:
-                retstr += ident + ident + ident + c.shop_string() + '\n'
-            if len(self.getAction(act).parameters) > 1:
-                retstr += ident + ident + ident + "(not (= %s %s))\n" % (self.getAction(act).parameters[0], self.getAction(act).parameters[1])
-            retstr += ident + ident + ')\n'
-           
-            retstr += ident + ident + '( \n'  # delete list
-            for c in self.getAction(act).delete_list.state:
-                retstr += ident + ident + ident +  c.shop_string() + '\n'
-            retstr += ident + ident + ') \n'
-            retstr += ident + ident + '( \n'  # add list
-            for c in self.getAction(act).add_list.state:
-                retstr += ident + ident + ident + c.shop_string() + '\n'
-                    
-            retstr += ident + ident + ')\n'              
-            
-            retstr += ident + ')\n'
-        retstr += ')'
-        return retstr
+        return ''.join(self.iterSHOP())
     
         
 ########################################################################
@@ -250,7 +284,7 @@ class ProblemDefinition(object):
         """
         self.problem_name = problem_name
         self.domain = domain
-        if initial_state:
+        if initial_state is not None:
             self.setInitialState(initial_state)
         
         self.exclude_goals = []
@@ -285,28 +319,41 @@ class ProblemDefinition(object):
         isinstance(exclude, state.SymbolicState)
         self.exclude_goals.append(exclude)
     
+    #----------------------------------------------------------------------
+    def iterPDDL(self):
+        """Generate the PDDL of the problem a piece at a time, a clause of
+        the initial state and goal to each line."""
+        yield '(define (problem %s) (:domain %s)\n' % (self.problem_name, self.domain.domain_name)
+        yield '  (:objects'
+        for objectname in sorted(self.initial_state.whatObjects()):
+            yield ' ' + objectname
+        yield '  )\n'
+        yield '  (:init\n'
+        for c in self.initial_state:
+            yield '    %s\n' % c
+        yield '  )\n'
+        yield '  (:goal (and\n'
+        for c in self.goal_state:
+            yield '    %s\n' % c
+        for exclude in self.exclude_goals:
+            yield '    (not (and\n'
+            for c in exclude:
+                yield '      %s\n' % c
+            yield '    ))\n'
+        yield '    )\n'
+        yield '  )\n'
+        yield ')'
+
+    #----------------------------------------------------------------------
+    def writePDDL(self, stream):
+        """Write the PDDL of the problem to a file like object."""
+        for piece in self.iterPDDL():
+            stream.write(piece)
+
     #----------------------------------------------------------------------
     def generatePDDL(self):
         """Generate PDDL of problem. Return as string."""
-        retstr = '(define (problem %s) (:domain %s)\n' % (self.problem_name, self.domain.domain_name)
-        obs = self.initial_state.whatObjects()
-        retstr += '  (:objects'
-        for objectname in obs:
-            retstr += ' ' + objectname
-        retstr += '  )\n'
-        retstr += '  (:init\n'
-        retstr += repr(self.initial_state)
-        retstr += '  )\n'
-        retstr += '  (:goal (and\n'
-        retstr += repr(self.goal_state)
-        for i in self.exclude_goals:
-            retstr += '    (not (and\n'
-            retstr += repr(i)
-            retstr += '    ))\n'
-        retstr += '    )\n'
-        retstr += '  )\n'
-        retstr += ')'
-        return retstr
+        return ''.join(self.iterPDDL())
         
 
 ########################################################################
@@ -0,0 +1,330 @@
+'''
+domain_file.py
+--------------
+
+A compact binary file format for DomainDefinitions, so that loading a domain
+does not parse any states. Every string is stored once in a symbol table and
+clauses are stored as tuples of symbol numbers. All numbers are little
+endian.
+
+  header        magic "SADOMAIN", uint16 version, uint32 symbol count
+  symbols       uint8 kind (0 str, 1 unicode as utf-8), uint32 length, bytes
+  domain        symbol name, symbol comment, symbol source header,
+                uint32 action count, actions
+  action        symbol name, symbol action server, state preconditions,
+                state effects, dict action parameters, dict parameter types
+  state         uint32 clause count, clauses
+  clause        uint32 name symbol, uint8 flags (1 negated, 2 forall,
+                4 parameterised), uint8 arity, arity uint32 symbols
+  dict          uint32 count, count (value key, value value)
+  value         uint8 tag then 'n' nothing, 'b' uint8, 'i' int64, 'f' double,
+                's' uint32 symbol, or 'p' uint32 length and a pickle
+'''
+import cPickle as pickle
+import mmap
+import struct
+
+import state
+from action import Action
+from predicates import Predicates
+
+MAGIC = 'SADOMAIN'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHI')
+_SYMBOL = struct.Struct('<BI')
+_COUNT = struct.Struct('<I')
+_CLAUSE = struct.Struct('<IBB')
+_TAG = struct.Struct('<c')
+_BOOL = struct.Struct('<B')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+
+_NEGATED = 1
+_FORALL = 2
+_PARAMETERISED = 4
+
+
+########################################################################
+class _Writer(object):
+    """
+    Encodes a domain, numbering the symbols as it meets them.
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.symbols = {}
+        self.symbol_list = []
+        self.body = []
+        # struct for the symbols of clauses with each arity
+        self.args_structs = {}
+
+    #----------------------------------------------------------------------
+    def symbol(self, s):
+        number = self.symbols.get(s)
+        if number is None:
+            number = self.symbols[s] = len(self.symbol_list)
+            self.symbol_list.append(s)
+        return number
+
+    #----------------------------------------------------------------------
+    def writeSymbol(self, s):
+        self.body.append(_COUNT.pack(self.symbol(s)))
+
+    #----------------------------------------------------------------------
+    def writeState(self, symbolicstate):
+        body = self.body
+        body.append(_COUNT.pack(len(symbolicstate)))
+        for c in symbolicstate:
+            flags = ((_NEGATED if c.negated else 0) | (_FORALL if c.forall else 0) |
+                     (_PARAMETERISED if c.parameterised else 0))
+            arity = len(c.args)
+            body.append(_CLAUSE.pack(self.symbol(c.name), flags, arity))
+            args_struct = self.args_structs.get(arity)
+            if args_struct is None:
+                args_struct = self.args_structs[arity] = struct.Struct('<%dI' % arity)
+            body.append(args_struct.pack(*[self.symbol(a) for a in c.args]))
+
+    #----------------------------------------------------------------------
+    def writeValue(self, value):
+        body = self.body
+        if value is None:
+            body.append(_TAG.pack('n'))
+        elif isinstance(value, bool):
+            body.append(_TAG.pack('b') + _BOOL.pack(value))
+        elif isinstance(value, (int, long)) and -2**63 <= value < 2**63:
+            body.append(_TAG.pack('i') + _INT.pack(value))
+        elif isinstance(value, float):
+            body.append(_TAG.pack('f') + _FLOAT.pack(value))
+        elif isinstance(value, basestring):
+            body.append(_TAG.pack('s') + _COUNT.pack(self.symbol(value)))
+        else:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            body.append(_TAG.pack('p') + _COUNT.pack(len(data)) + data)
+
+    #----------------------------------------------------------------------
+    def writeDict(self, d):
+        self.body.append(_COUNT.pack(len(d)))
+        for key, value in d.iteritems():
+            self.writeValue(key)
+            self.writeValue(value)
+
+    #----------------------------------------------------------------------
+    def writeDomain(self, domain):
+        self.writeSymbol(domain.domain_name)
+        self.writeSymbol(domain.commment)
+        self.writeSymbol(domain.source_header)
+        self.body.append(_COUNT.pack(len(domain.actions)))
+        for name in domain.actions:
+            action = domain.getAction(name)
+            self.writeSymbol(action.name)
+            self.writeSymbol(action.action_server)
+            self.writeState(action.preconditions)
+            self.writeState(action.effects)
+            self.writeDict(action.action_parameters)
+            self.writeDict(action.parameter_types)
+
+    #----------------------------------------------------------------------
+    def chunks(self):
+        """Generate the file contents, the header and symbols then the body."""
+        yield _HEADER.pack(MAGIC, VERSION, len(self.symbol_list))
+        for s in self.symbol_list:
+            if isinstance(s, unicode):
+                data = s.encode('utf-8')
+                yield _SYMBOL.pack(1, len(data)) + data
+            else:
+                yield _SYMBOL.pack(0, len(s)) + s
+        for chunk in self.body:
+            yield chunk
+
+
+########################################################################
+class _Reader(object):
+    """
+    Decodes a domain from a string or memory map, with a read position.
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.args_structs = {}
+        # predicate name -> arity, for those checked against Predicates
+        self.arities = {}
+
+    #----------------------------------------------------------------------
+    def unpack(self, s):
+        try:
+            values = s.unpack_from(self.data, self.position)
+        except struct.error:
+            raise DomainFileError("TRUNCATED")
+        self.position += s.size
+        return values
+
+    #----------------------------------------------------------------------
+    def readBytes(self, length):
+        if self.position + length > len(self.data):
+            raise DomainFileError("TRUNCATED")
+        data = self.data[self.position:self.position + length]
+        self.position += length
+        return data
+
+    #----------------------------------------------------------------------
+    def readSymbols(self):
+        magic, version, count = self.unpack(_HEADER)
+        if magic != MAGIC:
+            raise DomainFileError("MAGIC")
+        if version != VERSION:
+            raise DomainFileError("VERSION", "file version %d, can read %d" % (version, VERSION))
+        symbols = []
+        for i in xrange(count):
+            kind, length = self.unpack(_SYMBOL)
+            s = self.readBytes(length)
+            if kind == 1:
+                s = s.decode('utf-8')
+            symbols.append(state.internSymbol(s))
+        self.symbols = symbols
+
+    #----------------------------------------------------------------------
+    def readSymbol(self):
+        try:
+            return self.symbols[self.unpack(_COUNT)[0]]
+        except IndexError:
+            raise DomainFileError("SYMBOL")
+
+    #----------------------------------------------------------------------
+    def readState(self):
+        symbols = self.symbols
+        clauses = []
+        for i in xrange(self.unpack(_COUNT)[0]):
+            name, flags, arity = self.unpack(_CLAUSE)
+            args_struct = self.args_structs.get(arity)
+            if args_struct is None:
+                args_struct = self.args_structs[arity] = struct.Struct('<%dI' % arity)
+            try:
+                name = symbols[name]
+                args = tuple([symbols[a] for a in self.unpack(args_struct)])
+            except IndexError:
+                raise DomainFileError("SYMBOL")
+            self.checkPredicate(name, arity)
+            clauses.append(state.Clause.createFromTuple(name, args, bool(flags & _NEGATED),
+                                                        bool(flags & _FORALL),
+                                                        bool(flags & _PARAMETERISED)))
+        return state.SymbolicState(clauses)
+
+    #----------------------------------------------------------------------
+    def checkPredicate(self, name, arity):
+        """Check the predicate exists with this arity, once for each name."""
+        known = self.arities.get(name)
+        if known is None:
+            if not Predicates.doesPredicateExist(name):
+                raise state.ClauseError('CREATE_UNKNOWN', "unknown:%s" % name)
+            known = self.arities[name] = Predicates.getArity(name)
+        if known != arity:
+            raise state.ClauseError("MISSING_CONST", name)
+
+    #----------------------------------------------------------------------
+    def readValue(self):
+        tag = self.unpack(_TAG)[0]
+        if tag == 'n':
+            return None
+        elif tag == 'b':
+            return bool(self.unpack(_BOOL)[0])
+        elif tag == 'i':
+            return self.unpack(_INT)[0]
+        elif tag == 'f':
+            return self.unpack(_FLOAT)[0]
+        elif tag == 's':
+            return self.readSymbol()
+        elif tag == 'p':
+            return pickle.loads(self.readBytes(self.unpack(_COUNT)[0]))
+        raise DomainFileError("VALUE", repr(tag))
+
+    #----------------------------------------------------------------------
+    def readDict(self):
+        d = {}
+        for i in xrange(self.unpack(_COUNT)[0]):
+            key = self.readValue()
+            d[key] = self.readValue()
+        return d
+
+    #----------------------------------------------------------------------
+    def readDomain(self):
+        from domain import DomainDefinition
+        self.readSymbols()
+        domain = DomainDefinition(self.readSymbol(), self.readSymbol())
+        domain.setDomainSourceHeader(self.readSymbol())
+        for i in xrange(self.unpack(_COUNT)[0]):
+            name = self.readSymbol()
+            action_server = self.readSymbol()
+            preconditions = self.readState()
+            effects = self.readState()
+            action_parameters = self.readDict()
+            parameter_types = self.readDict()
+            domain.addExistingAction(Action(name, action_server, preconditions, effects,
+                                            action_parameters, parameter_types))
+        return domain
+
+
+#----------------------------------------------------------------------
+def writeDomain(domain, stream):
+    """Write the DomainDefinition to a file like object opened for binary
+    writing."""
+    writer = _Writer()
+    writer.writeDomain(domain)
+    for chunk in writer.chunks():
+        stream.write(chunk)
+
+
+#----------------------------------------------------------------------
+def readDomain(data):
+    """Returns the DomainDefinition stored in the string or buffer data."""
+    return _Reader(data).readDomain()
+
+
+#----------------------------------------------------------------------
+def isDomainFile(filename):
+    """Returns True if the named file starts as a file of this format."""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+#----------------------------------------------------------------------
+def loadDomain(filename, use_mmap=False):
+    """Returns the DomainDefinition stored in the named file.
+
+    :Parameters:
+        use_mmap : bool
+            map the file into memory rather than reading it, so only the
+            pages needed are read
+    """
+    with open(filename, "rb") as f:
+        if not use_mmap:
+            return readDomain(f.read())
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return readDomain(data)
+        finally:
+            data.close()
+
+
+########################################################################
+class DomainFileError(Exception):
+    '''
+    Class for domain file exceptions
+    '''
+    def __init__(self, type, additional_info=None):
+        self.types={}
+        self.types["MAGIC"]="Not a domain file."
+        self.types["VERSION"]="Domain file is of a version that can not be read."
+        self.types["TRUNCATED"]="Domain file ends unexpectedly."
+        self.types["SYMBOL"]="Domain file refers to a symbol it does not have."
+        self.types["VALUE"]="Domain file has a value of unknown type."
+
+        self.type = type
+        self.additional_info=additional_info
+    def __str__(self):
+        if self.additional_info:
+            return '\n\n' + str(self.types[self.type] + '\n'+str(self.additional_info))
+        else:
+            return '\n\n' +repr(self.types[self.type] )
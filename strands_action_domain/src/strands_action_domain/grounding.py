@@ -0,0 +1,251 @@
+'''
+grounding.py
+------------
+
+Grounds a Planner's actions over a pool of worker processes. Grounding is
+done in rounds, as in Planner.ground: in each round every action is matched
+against the clauses reached so far and the new operators add their effects
+to them. The matches of each action's first precondition are split into
+shards, one task each, so a round spreads over all the workers.
+
+The workers are forked once, starting with the clauses of the initial state,
+and are sent the clauses reached and the operators found in each round.
+Clauses and operators pass between the processes as arrays of integers,
+numbering every predicate name and constant in one symbol table, and the
+parent turns them back into shared clause objects.
+'''
+from array import array
+import multiprocessing
+
+import state
+
+# number of shards to split the work of each action into, per worker, so
+# that unevenly sized shards still keep every worker busy
+SHARDS_PER_PROCESS = 4
+
+
+########################################################################
+class ClauseCodec(object):
+    """
+    Turns clauses into lists of integers and back. A clause is its name,
+    flags (1 negated, 2 forall, 4 parameterised), arity then arguments, each
+    symbol by its number in the table.
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.numbers = dict([(s, i) for i, s in enumerate(self.symbols)])
+        # decoded clauses by their encoding, so each is decoded once
+        self.clauses = {}
+
+    #----------------------------------------------------------------------
+    def encode(self, clauses, out):
+        """Append the count of clauses, then each clause, to the array out."""
+        numbers = self.numbers
+        out.append(len(clauses))
+        for c in clauses:
+            out.append(numbers[c.name])
+            out.append(c.negated | (c.forall << 1) | (c.parameterised << 2))
+            out.append(len(c.args))
+            out.extend([numbers[a] for a in c.args])
+
+    #----------------------------------------------------------------------
+    def decode(self, data, i):
+        """Returns (clauses, position after them) for the clauses encoded at
+        position i of data."""
+        symbols = self.symbols
+        clauses = []
+        count = data[i]
+        i += 1
+        for n in xrange(count):
+            arity = data[i + 2]
+            end = i + 3 + arity
+            key = tuple(data[i:end])
+            c = self.clauses.get(key)
+            if c is None:
+                flags = key[1]
+                c = state.Clause.createFromTuple(symbols[key[0]],
+                                                 tuple([symbols[a] for a in key[3:]]),
+                                                 bool(flags & 1), bool(flags & 2), bool(flags & 4))
+                self.clauses[key] = c
+            clauses.append(c)
+            i = end
+        return clauses, i
+
+
+#----------------------------------------------------------------------
+def _symbols(actions, reached, objects):
+    """Every symbol a grounded clause can hold."""
+    symbols = set(objects)
+    for c in reached:
+        symbols.add(c.name)
+        symbols.update(c.args)
+    for action in actions:
+        for c in list(action.preconditions) + list(action.effects):
+            symbols.add(c.name)
+            symbols.update(c.args)
+    return sorted(symbols)
+
+
+#----------------------------------------------------------------------
+def _groundShard(planner, actions, reached, objects, seen, codec, task):
+    """Ground an action over one shard of the matches of its first
+    precondition. Returns (action number, encoded operators), each operator
+    as its parameter values then its pre, absent, add and delete clauses."""
+    action_number, first = task
+    action = actions[action_number]
+    if first is not None:
+        first, i = codec.decode(array('I', first), 0)
+    out = array('I')
+    for parameters in planner._bindings(action, reached, objects, first):
+        values = tuple([parameters[p] for p in action.parameters])
+        if (action_number, values) in seen:
+            continue
+        grounded = action.ground(parameters)
+        pre = set([c for c, absent, precondition in grounded.preconditions if not absent])
+        if not all(c in reached for c in pre):
+            continue
+        absent = [c for c, absent, precondition in grounded.preconditions if absent]
+        add, delete = action.groundEffects(parameters, objects)
+        out.append(len(values))
+        out.extend([codec.numbers[v] for v in values])
+        for clauses in (list(pre), absent, add, delete):
+            codec.encode(clauses, out)
+    return action_number, out.tostring()
+
+
+#----------------------------------------------------------------------
+def _serve(connection, planner, actions, reached, objects, codec):
+    """Worker process: for each round receive the clauses reached and the
+    operators grounded since the last, as encoded arrays, and a list of
+    tasks, and send back their results. None ends the worker."""
+    seen = set()
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        clauses, keys, tasks = message
+        for c in codec.decode(array('I', clauses), 0)[0]:
+            if c not in reached:
+                reached._insert(c)
+        keys = array('I', keys)
+        i = 0
+        while i < len(keys):
+            number = keys[i]
+            arity = len(actions[number].parameters)
+            seen.add((number, tuple([codec.symbols[v] for v in keys[i + 1:i + 1 + arity]])))
+            i += 1 + arity
+        connection.send([_groundShard(planner, actions, reached, objects, seen, codec, task)
+                         for task in tasks])
+
+
+#----------------------------------------------------------------------
+def groundInParallel(planner, actions, reached, objects, processes=None):
+    """Returns the operators reachable from the clauses of reached, as
+    Planner.ground finds them, as a list of (action, parameters, pre,
+    absent, add, delete). reached is added to as clauses are reached.
+
+    :Parameters:
+        planner : Planner
+            the planner, for its precondition join orders
+        actions : list of Action
+            the actions to ground
+        reached : SymbolicState
+            the clauses of the initial state, with no negated clauses
+        objects : list
+            the objects parameters can take
+        processes : int
+            the number of worker processes, by default one for each core
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    codec = ClauseCodec(_symbols(actions, reached, objects))
+    # the workers are forked now, so start with reached as it is
+    workers = []
+    try:
+        for n in xrange(processes):
+            connection, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve, args=(child, planner, actions, reached,
+                                                                  objects, codec))
+            worker.daemon = True
+            worker.start()
+            workers.append((worker, connection))
+        return _groundRounds(workers, planner, actions, reached, codec)
+    finally:
+        for worker, connection in workers:
+            try:
+                connection.send(None)
+            except (IOError, OSError):
+                pass
+        for worker, connection in workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+
+
+#----------------------------------------------------------------------
+def _groundRounds(workers, planner, actions, reached, codec):
+    shards = len(workers) * SHARDS_PER_PROCESS
+    operators = []
+    seen = set()
+    new_clauses = []
+    new_keys = array('I')
+    changed = True
+    while changed:
+        changed = False
+        tasks = []
+        for number, action in enumerate(actions):
+            order = planner._join_orders[action.name]
+            if len(order) == 0:
+                tasks.append((number, None))
+                continue
+            c = order[0]
+            pattern = tuple([None if state.isParameter(a) else a for a in c.args])
+            matches = list(reached.queryClauses(c.name, pattern, negated=False))
+            size = max(1, (len(matches) + shards - 1) // shards)
+            for start in xrange(0, len(matches), size):
+                out = array('I')
+                codec.encode(matches[start:start + size], out)
+                tasks.append((number, out.tostring()))
+
+        # the tasks are dealt out in turn, so each worker gets some of each
+        # action's shards
+        out = array('I')
+        codec.encode(new_clauses, out)
+        message = (out.tostring(), new_keys.tostring())
+        for n, (worker, connection) in enumerate(workers):
+            connection.send(message + (tasks[n::len(workers)],))
+        results = []
+        for worker, connection in workers:
+            results.extend(connection.recv())
+        new_clauses = []
+        new_keys = array('I')
+
+        for number, data in results:
+            action = actions[number]
+            data = array('I', data)
+            i = 0
+            while i < len(data):
+                arity = data[i]
+                value_numbers = data[i + 1:i + 1 + arity]
+                values = tuple([codec.symbols[v] for v in value_numbers])
+                i += 1 + arity
+                pre, i = codec.decode(data, i)
+                absent, i = codec.decode(data, i)
+                add, i = codec.decode(data, i)
+                delete, i = codec.decode(data, i)
+                key = (number, values)
+                if key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(number)
+                new_keys.extend(value_numbers)
+                operators.append((action, dict(zip(action.parameters, values)),
+                                  pre, absent, add, delete))
+                for c in add:
+                    if c not in reached:
+                        reached._insert(c)
+                        new_clauses.append(c)
+                        changed = True
+    return operators
@@ -0,0 +1,440 @@
+'''
+planner.py
+----------
+
+A forward state space planner over SymbolicStates, so that plans for the
+actions in a domain can be found in process and turned into executive Tasks.
+
+The actions are first grounded over the objects of the problem, keeping only
+the groundings reachable when delete effects are ignored. Search is then
+greedy best first or A* over the grounded operators, guided by the length of
+a relaxed plan (the FF heuristic), with duplicate states found by their
+state hash. Optionally the actions, operators and initial state are first
+cut down to those relevant to the goal, see relevance.py.
+'''
+import heapq
+import itertools
+
+import grounding
+import relevance
+import state
+from domain import DomainDefinition
+
+
+########################################################################
+class Operator(object):
+    """
+    An action grounded with values for all its parameters, as the planner
+    uses it. pre are the clauses which must be in the state, absent those
+    which must not be, and add and delete the effects. Delete clauses are not
+    negated.
+    """
+    __slots__ = ('action', 'parameters', 'pre', 'absent', 'add', 'delete', 'index')
+
+    #----------------------------------------------------------------------
+    def __init__(self, action, parameters, pre, absent, add, delete, index):
+        self.action = action
+        self.parameters = parameters
+        self.pre = pre
+        self.absent = absent
+        self.add = add
+        self.delete = delete
+        self.index = index
+
+    #----------------------------------------------------------------------
+    def isApplicable(self, symbolicstate):
+        for c in self.pre:
+            if c not in symbolicstate:
+                return False
+        for c in self.absent:
+            if c in symbolicstate:
+                return False
+        return True
+
+    #----------------------------------------------------------------------
+    def __str__(self):
+        return '(%s %s)' % (self.action.name,
+                            ' '.join([self.parameters[p] for p in self.action.parameters]))
+
+
+########################################################################
+class Planner(object):
+    """
+    Finds plans from an initial state to a goal over a set of actions.
+    """
+    SEARCHES = ('gbfs', 'astar')
+
+    #----------------------------------------------------------------------
+    def __init__(self, actions, search='gbfs', processes=1):
+        """
+        :Parameters:
+            actions : DomainDefinition or list of Action
+                the actions to plan with
+            search : str
+                'gbfs' for greedy best first search, which finds plans
+                quickly, or 'astar' for A*, which finds shorter plans. The
+                heuristic is not admissible so A* plans are not always the
+                shortest.
+            processes : int
+                the number of processes to ground the actions with, see
+                grounding.py. None for one for each core.
+        """
+        if isinstance(actions, DomainDefinition):
+            actions = [actions.getAction(name) for name in actions.actions]
+        if search not in Planner.SEARCHES:
+            raise PlannerError("SEARCH", search)
+        self.actions = list(actions)
+        self.search = search
+        self.processes = processes
+        self.operators = []
+        self.expanded = 0
+        self.generated = 0
+        # the RelevanceReport of the last plan made with prune
+        self.relevance = None
+        # the positive, parameterised preconditions of each action in the
+        # order they are matched against the state
+        self._join_orders = dict([(a.name, self._joinOrder(a)) for a in self.actions])
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _joinOrder(action):
+        """Order the preconditions so each binds as many already bound
+        parameters as possible, which keeps the partial matches few."""
+        remaining = [c for c in action.preconditions
+                     if not c.negated and not c.forall and
+                     any(state.isParameter(a) for a in c.args)]
+        order = []
+        bound = set()
+        while len(remaining) > 0:
+            best = max(remaining, key=lambda c: (len(bound.intersection(c.args)), -len(c.args)))
+            remaining.remove(best)
+            order.append(best)
+            bound.update([a for a in best.args if state.isParameter(a)])
+        return order
+
+    #----------------------------------------------------------------------
+    def _bindings(self, action, facts, objects, first=None):
+        """Generate the parameter dicts for which the positive
+        preconditions of action are all in facts. Parameters no positive
+        precondition mentions take every value in objects. If first is
+        given, only its clauses are matched with the first precondition."""
+        order = self._join_orders[action.name]
+        matched = set()
+        for c in order:
+            matched.update([a for a in c.args if state.isParameter(a)])
+        free = [p for p in action.parameters if p not in matched]
+
+        def extend(i, binding):
+            if i == len(order):
+                for values in itertools.product(objects, repeat=len(free)):
+                    parameters = dict(binding)
+                    parameters.update(zip(free, values))
+                    yield parameters
+                return
+            c = order[i]
+            if i == 0 and first is not None:
+                matches = first
+            else:
+                pattern = tuple([binding.get(a) if state.isParameter(a) else a for a in c.args])
+                matches = facts.queryClauses(c.name, pattern, negated=False)
+            for match in matches:
+                extended = dict(binding)
+                for a, value in zip(c.args, match.args):
+                    if state.isParameter(a) and extended.setdefault(a, value) != value:
+                        break
+                else:
+                    for parameters in extend(i + 1, extended):
+                        yield parameters
+        return extend(0, {})
+
+    #----------------------------------------------------------------------
+    def ground(self, initial_state, objects, actions=None):
+        """Build the operators reachable from initial_state when delete
+        effects and absent preconditions are ignored.
+
+        :Parameters:
+            initial_state : SymbolicState
+                state the plan starts from
+            objects : set
+                the objects parameters can take
+            actions : list of Action
+                the actions to ground, by default all the planner's
+        """
+        if actions is None:
+            actions = self.actions
+        reached = state.SymbolicState([c for c in initial_state if not c.negated])
+        # one object for each clause, so that looking clauses up in states
+        # and the tables below mostly finds them by identity
+        canonical = dict([(c, c) for c in reached])
+        canon = lambda clauses: tuple([canonical.setdefault(c, c) for c in clauses])
+        self.operators = []
+        if self.processes != 1:
+            for action, parameters, pre, absent, add, delete in grounding.groundInParallel(
+                    self, actions, reached, objects, self.processes):
+                self.operators.append(Operator(action, parameters, canon(pre), canon(absent),
+                                               canon(add), canon(delete), len(self.operators)))
+            self._canonical = canonical
+            self._index()
+            return self.operators
+        seen = set()
+        changed = True
+        while changed:
+            changed = False
+            for action in actions:
+                for parameters in list(self._bindings(action, reached, objects)):
+                    key = (action.name, tuple([parameters[p] for p in action.parameters]))
+                    if key in seen:
+                        continue
+                    grounded = action.ground(parameters)
+                    pre = canon(set([c for c, absent, precondition in grounded.preconditions if not absent]))
+                    if not all(c in reached for c in pre):
+                        continue
+                    seen.add(key)
+                    absent = canon([c for c, absent, precondition in grounded.preconditions if absent])
+                    add, delete = action.groundEffects(parameters, objects)
+                    add = canon(add)
+                    self.operators.append(Operator(action, parameters, pre, absent,
+                                                   add, canon(delete),
+                                                   len(self.operators)))
+                    for c in add:
+                        if c not in reached:
+                            reached._insert(c)
+                            changed = True
+        self._canonical = canonical
+        self._index()
+        return self.operators
+
+    #----------------------------------------------------------------------
+    def _index(self):
+        """Number the operators and build the tables the heuristic uses."""
+        for i, op in enumerate(self.operators):
+            op.index = i
+        # the operators needing each clause, and how many clauses each needs
+        self._consumers = {}
+        for op in self.operators:
+            for c in op.pre:
+                self._consumers.setdefault(c, []).append(op.index)
+        self._pre_counts = [len(op.pre) for op in self.operators]
+        self._no_pre = [op.index for op in self.operators if len(op.pre) == 0]
+
+    #----------------------------------------------------------------------
+    def _setGoal(self, goal_state):
+        goals = []
+        absent_goals = []
+        for c in goal_state:
+            if c.forall or c.parameterised:
+                raise PlannerError("GOAL", str(c))
+            if c.negated:
+                absent_goals.append(state.Clause.createCopy(c, negated=False))
+            else:
+                goals.append(c)
+        self._goals = goals
+        self._goal_set = frozenset(goals)
+        self._absent_goals = absent_goals
+
+    #----------------------------------------------------------------------
+    def isGoal(self, symbolicstate):
+        for c in self._goals:
+            if c not in symbolicstate:
+                return False
+        for c in self._absent_goals:
+            if c in symbolicstate:
+                return False
+        return True
+
+    #----------------------------------------------------------------------
+    def heuristic(self, symbolicstate):
+        """Returns the number of operators in a plan for the goal that
+        ignores delete effects, plus one for each goal clause that must be
+        removed, or None if the goal can not be reached from the state."""
+        # a set, as the relaxed layers test membership many times
+        facts = set(symbolicstate)
+        h = 0
+        for c in self._absent_goals:
+            if c in facts:
+                h += 1
+        missing = [c for c in self._goals if c not in facts]
+        if len(missing) == 0:
+            return h
+
+        # expand layers of the relaxed problem until the goals are reached,
+        # recording the operator which first achieves each clause
+        counts = list(self._pre_counts)
+        consumers = self._consumers
+        achievers = {}
+        ready = list(self._no_pre)
+        for c in facts:
+            for i in consumers.get(c, ()):
+                counts[i] -= 1
+                if counts[i] == 0:
+                    ready.append(i)
+        remaining = len(missing)
+        while remaining > 0:
+            if len(ready) == 0:
+                return None
+            new = []
+            for i in ready:
+                op = self.operators[i]
+                for c in op.add:
+                    if c not in facts and c not in achievers:
+                        achievers[c] = op
+                        new.append(c)
+                        if c in self._goal_set:
+                            remaining -= 1
+            ready = []
+            for c in new:
+                for i in consumers.get(c, ()):
+                    counts[i] -= 1
+                    if counts[i] == 0:
+                        ready.append(i)
+
+        # the relaxed plan works back from the goals through the achievers
+        relaxed = set()
+        open_clauses = missing
+        while len(open_clauses) > 0:
+            op = achievers[open_clauses.pop()]
+            if op.index in relaxed:
+                continue
+            relaxed.add(op.index)
+            for c in op.pre:
+                if c not in facts:
+                    open_clauses.append(c)
+        return h + len(relaxed)
+
+    #----------------------------------------------------------------------
+    def plan(self, initial_state, goal_state, objects=None, max_expansions=None, prune=False):
+        """Returns a plan from initial_state to a state satisfying
+        goal_state as a list of (Action, parameters dict), or None if there
+        is none.
+
+        :Parameters:
+            initial_state : SymbolicState
+                state the plan starts from, not altered
+            goal_state : SymbolicState
+                clauses which must hold, and negated clauses which must not,
+                at the end of the plan
+            objects : set
+                the objects action parameters can take, by default those of
+                the initial and goal states
+            max_expansions : int
+                give up, returning None, after expanding this many states
+            prune : bool
+                search only the actions, operators and clauses relevant to
+                the goal, leaving a RelevanceReport in self.relevance. The
+                plans found are plans for the whole initial state.
+        """
+        if objects is None:
+            objects = initial_state.whatObjects() | goal_state.whatObjects()
+        objects = sorted(objects)
+        self._setGoal(goal_state)
+        if prune:
+            initial_state = self._prune(initial_state, goal_state, objects)
+        else:
+            self.ground(initial_state, objects)
+        self._goals = [self._canonical.get(c, c) for c in self._goals]
+        self._absent_goals = [self._canonical.get(c, c) for c in self._absent_goals]
+        self._goal_set = frozenset(self._goals)
+        self.expanded = 0
+        self.generated = 1
+
+        h = self.heuristic(initial_state)
+        if h is None:
+            return None
+        astar = self.search == 'astar'
+        counter = itertools.count()
+        # nodes are (state, g, operator, parent node)
+        start = (initial_state, 0, None, None)
+        queue = [(h, next(counter), start)]
+        # state hash -> list of [state, g] for the states generated so far
+        seen = {initial_state.stateHash(): [[initial_state, 0]]}
+        while len(queue) > 0:
+            f, tie, node = heapq.heappop(queue)
+            current, g = node[0], node[1]
+            if self.isGoal(current):
+                return self._extract(node)
+            if max_expansions is not None and self.expanded >= max_expansions:
+                return None
+            self.expanded += 1
+            for op in self.operators:
+                if not op.isApplicable(current):
+                    continue
+                successor = current.successor(op.add, op.delete)
+                self.generated += 1
+                if not self._isNew(seen, successor, g + 1):
+                    continue
+                h = self.heuristic(successor)
+                if h is None:
+                    continue
+                f = g + 1 + h if astar else h
+                heapq.heappush(queue, (f, next(counter), (successor, g + 1, op, node)))
+        return None
+
+    #----------------------------------------------------------------------
+    def _prune(self, initial_state, goal_state, objects):
+        """Ground only the relevant actions, keep only the relevant
+        operators, and return the initial state cut down to the relevant
+        clauses."""
+        report = relevance.RelevanceReport()
+        actions, names = relevance.relevantActions(self.actions, goal_state)
+        report.actions = (len(self.actions), len(actions))
+        self.ground(relevance.pruneState(initial_state, names), objects, actions)
+        grounded = len(self.operators)
+        self.operators, clauses = relevance.relevantOperators(
+            self.operators, [self._canonical.get(c, c) for c in self._goals + self._absent_goals])
+        self._index()
+        report.operators = (grounded, len(self.operators))
+        pruned = relevance.pruneState(initial_state, names, clauses)
+        report.clauses = (len(initial_state), len(pruned))
+        self.relevance = report
+        return pruned
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _isNew(seen, symbolicstate, g):
+        """Record the state as reached at cost g, returning False if it was
+        already reached as cheaply."""
+        bucket = seen.setdefault(symbolicstate.stateHash(), [])
+        for entry in bucket:
+            if entry[0] == symbolicstate:
+                if entry[1] <= g:
+                    return False
+                entry[1] = g
+                return True
+        bucket.append([symbolicstate, g])
+        return True
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _extract(node):
+        steps = []
+        while node[2] is not None:
+            steps.append((node[2].action, node[2].parameters))
+            node = node[3]
+        steps.reverse()
+        return steps
+
+
+#----------------------------------------------------------------------
+def createTasks(plan):
+    """Returns the executive Tasks carrying out a plan from Planner.plan, in
+    order."""
+    return [action.create_executive_task(parameters) for action, parameters in plan]
+
+
+########################################################################
+class PlannerError(Exception):
+    '''
+    Class for planner exceptions
+    '''
+    def __init__(self, type, additional_info=None):
+        self.types={}
+        self.types["SEARCH"]="Unknown search, use one of %s." % (Planner.SEARCHES,)
+        self.types["GOAL"]="Goals can not contain foralls or parameters."
+
+        self.type = type
+        self.additional_info=additional_info
+    def __str__(self):
+        if self.additional_info:
+            return '\n\n' + str(self.types[self.type] + '\n'+str(self.additional_info))
+        else:
+            return '\n\n' +repr(self.types[self.type] )
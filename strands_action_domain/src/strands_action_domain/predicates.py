@@ -11,7 +11,8 @@ by defining a function::
      return True if predicate is true on state
 
 The decorator allows the predicates to be found so that no list needs to be
-maintained.
+maintained. They are collected into a registry when this module is imported;
+predicates made elsewhere are added with Predicates.register.
 
 When the predicates are called, if evaluatable is False then a PredicateError
 will be raised
@@ -62,6 +63,17 @@ class Predicate(object):
 
 ########################################################################
 class Predicates(object):
+    # The registry, filled in by register. Names use '-', as in states.
+    # predicate name -> PredicateType
+    _registry = {}
+    # predicate name and python attribute name -> PredicateType
+    _lookup = {}
+    # predicate name -> list of constants, for all, evaluatable and not
+    # evaluatable predicates
+    _consts = {}
+    _consts_eval = {}
+    _consts_noeval = {}
+    
     #----------------------------------------------------------------------
     def __init__(self):
         '''
@@ -70,6 +82,42 @@ class Predicates(object):
         print "Hello. Don't do it."
         pass
     
+    #----------------------------------------------------------------------
+    @staticmethod
+    def register(name, predicate):
+        '''
+        Adds a predicate to the registry, and as an attribute of this class.
+        The predicates defined below are registered on import. Others can be
+        added with, for example::
+        
+          Predicates.register('left-hand-empty', Predicate(0)(left_hand_empty))
+        
+        name may be given with '-' or '_'. It is used with '-' in states and
+        with '_' as the attribute name.
+        '''
+        if not isinstance(predicate, PredicateType):
+            raise PredicateError("NOT_PREDICATE", name)
+        name = name.replace('_','-')
+        python_name = name.replace('-','_')
+        setattr(Predicates, python_name, predicate)
+        Predicates._registry[name] = predicate
+        Predicates._lookup[name] = predicate
+        Predicates._lookup[python_name] = predicate
+        consts = predicate.predicate.consts
+        Predicates._consts[name] = consts
+        if predicate.predicate.evaluatable:
+            Predicates._consts_eval[name] = consts
+        else:
+            Predicates._consts_noeval[name] = consts
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _registerDefined():
+        '''Registers the predicates defined in this class.'''
+        for method in dir(Predicates):
+            if isinstance(getattr(Predicates,method), PredicateType):
+                Predicates.register(method, getattr(Predicates,method))
+    
     #----------------------------------------------------------------------
     @staticmethod
     def getPredicates(seperate=False):
@@ -78,47 +126,49 @@ class Predicates(object):
         key and the definition is a list of constants. If seperate is True,
         then two dictionaries in a list are returned, the first being the
         predicates that can not be evaluated, and the second being all the
-        others.
+        others. The dictionaries belong to the registry and must not be
+        altered.
         '''
-        predicates={}
-        predicates_noeval={}
-        for method in dir(Predicates):
-            if isinstance(getattr(Predicates,method), PredicateType):
-                pred = getattr(Predicates,method).predicate
-                if pred.evaluatable:
-                    predicates[method.replace('_','-')]=pred.consts
-                else:
-                    predicates_noeval[method.replace('_','-')]=pred.consts
-
-            
-        #print predicates
         if seperate:
-            return [predicates_noeval, predicates]
+            return [Predicates._consts_noeval, Predicates._consts_eval]
         else:
-            return dict(predicates_noeval.items() + predicates.items())
+            return Predicates._consts
 
     #----------------------------------------------------------------------        
     @staticmethod
     def getPredicate(predicateName, use_learned_when_available=True):
         '''
-        Returns the predicate method given the predicate name. The returned
-        predicate will be a functor of type *PredicateType*.
+        Returns the predicate method given the predicate name, with '-' or
+        '_'. The returned predicate will be a functor of type *PredicateType*.
         '''
-        pred = getattr(Predicates,predicateName.replace('-','_'))
-        #if not isinstance(pred, PredicateType):
-            #raise PredicateError
-        return pred
+        try:
+            return Predicates._lookup[predicateName]
+        except KeyError:
+            raise AttributeError(predicateName)
 
     #----------------------------------------------------------------------
     @staticmethod
     def doesPredicateExist(predicateName):
         '''
         Returns True if the predicate exists, otherwise False.
-        Uses getPredicates to get a list of all predicates and then 
-        looks for the argument in that list.
         '''
-        predicates = Predicates.getPredicates()
-        return predicates.has_key(predicateName)
+        return predicateName in Predicates._registry
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def getArity(predicateName):
+        '''
+        Returns the number of constants the predicate takes.
+        '''
+        return Predicates.getPredicate(predicateName).predicate.arg_count
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def isEvaluatable(predicateName):
+        '''
+        Returns True if the predicate can be evaluated on a geometric state.
+        '''
+        return Predicates.getPredicate(predicateName).predicate.evaluatable
 
     #----------------------------------------------------------------------
     #   All predicate below....
@@ -150,6 +200,7 @@ class PredicateError(Exception):
     def __init__(self, type, additional_info=None):
         self.types={}
         self.types["EVAL_NO_EVAL"] = "Error - attempting to evaluate non evaluatable predicate"
+        self.types["NOT_PREDICATE"] = "Error - registering something that is not a predicate"
 
         self.type = type
         self.additional_info=additional_info
@@ -159,6 +210,10 @@ class PredicateError(Exception):
         else:
             return repr(self.types[self.type] )
 
+
+
+Predicates._registerDefined()
+
         
 ########################################################################
 ########################################################################
@@ -0,0 +1,111 @@
+'''
+relevance.py
+------------
+
+Backward relevance analysis, to cut a problem down to what can matter for its
+goal before searching. A clause is relevant if it is a goal, or a
+precondition of an action that adds or deletes a relevant clause. Actions
+which can not change a relevant clause, and clauses of the initial state
+which are not relevant, can be dropped without changing which plans reach
+the goal.
+
+The analysis is done twice: over predicate names for the actions, which is
+cheap and lets grounding ignore most of a large state, then over the
+grounded operators and clauses.
+'''
+import state
+
+
+#----------------------------------------------------------------------
+def relevantActions(actions, goal_state):
+    """Returns (relevant actions, relevant predicate names) for reaching
+    goal_state with actions, comparing clauses by predicate name only."""
+    names = set([c.name for c in goal_state])
+    remaining = list(actions)
+    relevant = []
+    changed = True
+    while changed:
+        changed = False
+        for action in list(remaining):
+            if any(c.name in names for c in action.effects):
+                remaining.remove(action)
+                relevant.append(action)
+                names.update([c.name for c in action.preconditions])
+                changed = True
+    # keep the order the actions were given in
+    relevant = [a for a in actions if a in relevant]
+    return relevant, names
+
+
+#----------------------------------------------------------------------
+def relevantOperators(operators, goals):
+    """Returns (relevant operators, relevant clauses), the operators adding
+    or deleting a clause of goals or of the preconditions of another
+    relevant operator. Operators are as Planner grounds them, and goals are
+    un-negated clauses, both those that must and must not hold."""
+    # the operators changing each clause
+    changing = {}
+    for op in operators:
+        for c in op.add:
+            changing.setdefault(c, []).append(op)
+        for c in op.delete:
+            changing.setdefault(c, []).append(op)
+
+    relevant_clauses = set(goals)
+    relevant = set()
+    open_clauses = list(relevant_clauses)
+    while len(open_clauses) > 0:
+        for op in changing.get(open_clauses.pop(), ()):
+            if op.index in relevant:
+                continue
+            relevant.add(op.index)
+            for c in op.pre + op.absent:
+                if c not in relevant_clauses:
+                    relevant_clauses.add(c)
+                    open_clauses.append(c)
+    return [op for op in operators if op.index in relevant], relevant_clauses
+
+
+#----------------------------------------------------------------------
+def pruneState(symbolicstate, names, clauses=None):
+    """Returns a new state of the clauses of symbolicstate with a relevant
+    predicate name, and that are in the set clauses if it is given. Foralls
+    are kept by name alone."""
+    if clauses is None:
+        kept = [c for c in symbolicstate if c.name in names]
+    else:
+        kept = [c for c in symbolicstate
+                if c in clauses or (c.forall and c.name in names)]
+    if len(kept) == len(symbolicstate):
+        return symbolicstate
+    return state.SymbolicState(kept)
+
+
+########################################################################
+class RelevanceReport(object):
+    """
+    How much a problem was cut down by, as (before, after) pairs for the
+    actions, operators and initial state clauses.
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.actions = (0, 0)
+        self.operators = (0, 0)
+        self.clauses = (0, 0)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def _reduction(pair):
+        before, after = pair
+        if before == 0:
+            return 0.0
+        return 100.0 * (before - after) / before
+
+    #----------------------------------------------------------------------
+    def __str__(self):
+        return '\n'.join(['%s: %d -> %d (%.1f%% pruned)' % (name, pair[0], pair[1],
+                                                          self._reduction(pair))
+                          for name, pair in [('actions', self.actions),
+                                             ('operators', self.operators),
+                                             ('clauses', self.clauses)]])
@@ -6,46 +6,47 @@ Classes for storing comparing and parsing symbolic states.
 Provides underlying funtionality to PythonDomainDef etc.
 
 It parses states in the form (forall (?o) (above ?o mug)) (not (above mug tray))
-supporting forall and negations. However, don't rely on it heavily as its grown
-a little ugly.
+supporting forall and negations.
 '''
-
-#TODO: This has grown and now needs to fully parse properly, no longer simple 
-#pyparsing.
-
-# 
-
-
-from pyparsing import *
 from predicates import *
+from collections import OrderedDict
 import re
 
+#----------------------------------------------------------------------
+def internSymbol(symbol):
+    '''
+    Return the shared copy of a predicate or constant name, so that equal
+    symbols are the same object and are stored once.
+    '''
+    if type(symbol) is str:
+        return intern(symbol)
+    return symbol
+
+#----------------------------------------------------------------------
+def isParameter(symbol):
+    '''Return True if the constant is a parameter, like ?x'''
+    return symbol[:1] == '?'
+
 ########################################################################
-class Clause:
+class Clause(object):
     '''
     Class for storing symbolic state clauses. They can be created by the
     createFromParse function or initialised by hand.
     
-    self.constants is a list of constant names, like ['c1','c2'], defined in
-    the predicate definition in SymbolicPredicates.py. self.c1 and self.c2 are
-    then the values of those constants.
+    self.args is the tuple of constant values. self.constants is a list of
+    constant names, like ['c1','c2'], defined in the predicate definition in
+    SymbolicPredicates.py, and getMember('c1') gives the value of a constant
+    by name.
     
     self.predicateFunction is the PredicateType functor for the predicate.
     
     self.name is the predicate name.
+    
+    Clauses are immutable and hashable, so they can be shared between states
+    and stored in sets. Use createCopy to make a modified clause. Only the
+    name, interned symbols and flags are stored, in slots.
     '''
-    # Pyparsing syntax of a clause
-    openbracket = Suppress(Literal('('))
-    closebracket = Suppress(Literal(')'))
-    identifier = Word(alphas, alphanums + "_-")
-    parameter = Combine(Literal("?") + NotAny(" ") + identifier)("param")
-    nomatch = NoMatch()
-    syntax = openbracket + OneOrMore((identifier | parameter)) + closebracket
-    negated_syntax =  openbracket + Suppress(Literal("not")) + OneOrMore(Group(syntax)) + closebracket
-    #(forall (?k) (thisistrue ?k))
-    forall_syntax = openbracket + Suppress(Literal("forall")) + \
-        openbracket + parameter + closebracket + \
-        (negated_syntax("negated") | Group(syntax))  + closebracket
+    __slots__ = ('name', 'args', 'negated', 'forall', 'parameterised', '_hash', '_string')
     
     #----------------------------------------------------------------------
     def __init__(self, name, consts, negated=False, forall=False, parameterised=False):
@@ -58,71 +59,168 @@ class Clause:
         if not Predicates.doesPredicateExist(name):
             raise ClauseError('CREATE_UNKNOWN', "unknown:%s (%s)"%(name,repr(consts)))
 
-        self.constants = list()
         # Check if the right number of consts are given for this type of predicate
-        self.predicateFunction = Predicates.getPredicate(name)
-        predConsts = self.predicateFunction.predicate.consts
+        predicateFunction = Predicates.getPredicate(name)
+        predConsts = predicateFunction.predicate.consts
         if not len(predConsts) == len(consts):
             raise ClauseError("MISSING_CONST")
         
-            
-        for constant,value in zip(predConsts,consts):
-            setattr(self,constant,value)
-            self.constants.append(constant)
-                
-        self.number_constants = len(self.constants)
-        self.name = name
-        self.negated = negated
-        self.forall = forall
-        self.parameterised = parameterised
+        self._setSlots(internSymbol(name), tuple([internSymbol(c) for c in consts]),
+                       bool(negated), bool(forall), bool(parameterised))
+
+    #----------------------------------------------------------------------
+    def _setSlots(self, name, args, negated, forall, parameterised):
+        # slots are written through object as __setattr__ refuses changes
+        setter = object.__setattr__
+        setter(self, 'name', name)
+        setter(self, 'args', args)
+        setter(self, 'negated', negated)
+        setter(self, 'forall', forall)
+        setter(self, 'parameterised', parameterised)
+        setter(self, '_hash', hash((name, args, negated, forall)))
+        setter(self, '_string', None)
 
     #----------------------------------------------------------------------
-    def addMember(self,member,value):
-        #self.__dict__[member] = value
-        setattr(self,member,value)
+    def __setattr__(self, member, value):
+        raise ClauseError("IMMUTABLE", "%s.%s"%(self.name, member))
         
     #----------------------------------------------------------------------
-    def setMember(self,member,value):
-        setattr(self,member,value)
+    def __delattr__(self, member):
+        raise ClauseError("IMMUTABLE", "%s.%s"%(self.name, member))
+        
+    #----------------------------------------------------------------------
+    @property
+    def constants(self):
+        return list(Predicates.getPredicate(self.name).predicate.consts)
+        
+    #----------------------------------------------------------------------
+    @property
+    def number_constants(self):
+        return len(self.args)
+        
+    #----------------------------------------------------------------------
+    @property
+    def predicateFunction(self):
+        return Predicates.getPredicate(self.name)
         
     #----------------------------------------------------------------------
     def getMember(self, member):
-        #return self.__dict__[member]
-        return getattr(self,member)
+        '''Return the value of a constant by its name in the predicate
+        definition, c1, c2..'''
+        try:
+            index = int(member[1:]) - 1
+        except ValueError:
+            raise AttributeError(member)
+        if not 0 <= index < len(self.args):
+            raise AttributeError(member)
+        return self.args[index]
         
     #----------------------------------------------------------------------
-    @staticmethod
-    def createParseSyntax(name='null', consts=[]):
+    def substitute(self, params):
+        '''
+        Return this clause with each constant that is a key of the params
+        dict replaced by its value, as a clause that is not parameterised.
+        Returns this clause if nothing is replaced. The predicate is not
+        looked up again, as the name and number of constants are unchanged.
+        '''
+        args = tuple([internSymbol(params[a]) if a in params else a for a in self.args])
+        if args == self.args:
+            return self
+        return self.replaceArgs(args)
+        
+    #----------------------------------------------------------------------
+    def replaceArgs(self, args):
+        '''
+        Return a clause like this one, but not parameterised, with the tuple
+        of constants args, which should already be interned. The predicate is
+        not looked up again, so args must have the same length.
+        '''
+        clause = object.__new__(Clause)
+        clause._setSlots(self.name, args, self.negated, self.forall, False)
+        return clause
+        
+    #----------------------------------------------------------------------
+    def expandForAll(self, symbols):
+        '''
+        Generate the clauses a forall clause stands for, one for each of the
+        symbols in place of _ALL_. The predicate is not looked up again.
+        '''
+        positions = [i for i, a in enumerate(self.args) if a == '_ALL_']
+        args = list(self.args)
+        for symbol in symbols:
+            symbol = internSymbol(symbol)
+            for i in positions:
+                args[i] = symbol
+            clause = object.__new__(Clause)
+            clause._setSlots(self.name, tuple(args), self.negated, False, True)
+            yield clause
+            
+    #----------------------------------------------------------------------
+    def coversClause(self, other):
         '''
-        create a pyparsing syntax for the clause specified.
-        depricated.
+        Return True if this is a forall clause standing for other, the same
+        clause with an object in place of each _ALL_.
         '''
-        syntax = Clause.openbracket + (Literal(name))("name")
-        for i in consts:
-            syntax = syntax + Clause.identifier(i)
-        syntax = syntax + Clause.closebracket
-        return syntax
+        if (other.name != self.name or other.negated != self.negated or
+            other.forall or len(other.args) != len(self.args)):
+            return False
+        for a, b in zip(self.args, other.args):
+            if a != b and a != '_ALL_':
+                return False
+        return True
+        
+    #----------------------------------------------------------------------
+    def __copy__(self):
+        return self
+    
+    #----------------------------------------------------------------------
+    def __deepcopy__(self, memo):
+        """Clauses never change, so a copy can be the same object."""
+        return self
+    
+    #----------------------------------------------------------------------
+    def __reduce__(self):
+        return (Clause, (self.name, self.args, self.negated, self.forall, self.parameterised))
     
     #----------------------------------------------------------------------
     @staticmethod
-    def createFromParse(item, start, stop):
+    def createFromParse(item, start, stop, negated=False, forall=False, parameterised=False):
         '''
-        Create a Clause from a pyparsing parse, as aquired from Clause.syntax.
-        item is a list of the form [name const const const..]. start is the
-        start point in the parsed string, stop is the end in the parsed
-        string.
+        Create a Clause from a parse, as aquired from StateParser. item is a
+        list of the form [name const const const..]. start is the start point
+        in the parsed string, stop is the end in the parsed string.
         '''
-        p = Clause(item[0],item[1:])
-        p.start = start
-        p.stop = stop
-        return p
+        return Clause(item[0], item[1:], negated, forall, parameterised)
     
+    #----------------------------------------------------------------------
     @staticmethod
-    def createCopy(other):
-        consts = [getattr(other, v) for v in other.constants]
-        p = Clause(other.name, consts, other.negated, other.forall, other.parameterised)
-        return p
-    
+    def createCopy(other, consts=None, negated=None, forall=None, parameterised=None):
+        '''
+        Create a new Clause like other, replacing any of the constants,
+        negated, forall or parameterised that are given.
+        '''
+        if consts is None:
+            consts = other.args
+        if negated is None:
+            negated = other.negated
+        if forall is None:
+            forall = other.forall
+        if parameterised is None:
+            parameterised = other.parameterised
+        return Clause(other.name, consts, negated, forall, parameterised)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def createFromTuple(name, args, negated, forall, parameterised):
+        '''
+        Create a Clause without checking it against the predicates, for
+        loaders which have already done so. name and the tuple args must
+        already be interned.
+        '''
+        clause = object.__new__(Clause)
+        clause._setSlots(name, args, negated, forall, parameterised)
+        return clause
+
     #----------------------------------------------------------------------    
     def __str__(self):
         ## Short version
@@ -147,7 +245,10 @@ class Clause:
     
     #----------------------------------------------------------------------
     def __string__(self):
-        """internal method to output as a sting that can be reparsed later."""
+        """internal method to output as a sting that can be reparsed later.
+        The string is built once and kept."""
+        if self._string is not None:
+            return self._string
         s = ''
         if self.forall:
             s += '( forall (?ALL)'
@@ -155,12 +256,12 @@ class Clause:
             s += "( not "
 
         s += '('
-        s += self.name #self.__dict__.keys().__str__()
-        for c in self.constants:
-            if self.__dict__[c].__str__() == '_ALL_':
+        s += self.name
+        for c in self.args:
+            if str(c) == '_ALL_':
                 s  = s  +' ?ALL'
             else:
-                s  = s  +' '+ self.__dict__[c].__str__()
+                s  = s  +' '+ str(c)
         s=s+')'        
         
             
@@ -169,6 +270,7 @@ class Clause:
         if self.forall:
             s += ")"            
             
+        object.__setattr__(self, '_string', s)
         return s
     
     #----------------------------------------------------------------------
@@ -182,12 +284,12 @@ class Clause:
             s += "( not "
 
         s += '('
-        s += self.name #self.__dict__.keys().__str__()
-        for c in self.constants:
-            if self.__dict__[c].__str__() == '_ALL_':
+        s += self.name
+        for c in self.args:
+            if str(c) == '_ALL_':
                 s  = s  +' ?ALL'
             else:
-                s  = s  +' '+ self.__dict__[c].__str__()
+                s  = s  +' '+ str(c)
         s=s+')'        
         
             
@@ -206,16 +308,27 @@ class Clause:
         Tests if this clause is equal to another using the == operator. It is
         equal if it has the same constants and the same name.
         '''
-        if not self.name == other.name:
-            return False
-        for i in self.constants:
-            if not self.getMember(i) == other.getMember(i):
+        if self is other:
+            return True
+        try:
+            # hashes differ for almost all unequal clauses, and symbols are
+            # interned so the remaining comparisons are mostly identity checks
+            if self._hash != other._hash:
                 return False
-        if not self.negated == other.negated:
-            return False
-        if not self.forall == other.forall:
+            return (self.args == other.args and
+                    self.name == other.name and
+                    self.negated == other.negated and
+                    self.forall == other.forall)
+        except AttributeError:
             return False
-        return True
+
+    #----------------------------------------------------------------------
+    def __ne__(self, other):
+        return not self == other
+
+    #----------------------------------------------------------------------
+    def __hash__(self):
+        return self._hash
 
 ########################################################################    
 class ClauseError(Exception):
@@ -227,6 +340,7 @@ class ClauseError(Exception):
         self.types={}
         self.types["CREATE_UNKNOWN"]="Error creating a symbolic state clause, unknown predicate."
         self.types["MISSING_CONST"]="Error creating a symbolic state clause, wrong number of constants supplied."
+        self.types["IMMUTABLE"]="Error changing a symbolic state clause, clauses can not be altered once created."
 
         self.type = type
         self.additional_info=additional_info
@@ -239,20 +353,314 @@ class ClauseError(Exception):
             return '\n\n' + repr(self.types[self.type] )#+ str(additional_info))
 
         
+########################################################################
+class StateParser(object):
+    '''
+    Single pass parser for the symbolic state syntax. Text is split into
+    tokens by one regular expression and the clauses are read by recursive
+    descent, so each character is only looked at once.
+    
+    Text can be given in pieces with feed, for instance a line at a time from
+    a file. Each complete top level expression is parsed as soon as its
+    brackets balance, and close returns the SymbolicState. As before, forall
+    clauses come first in the state, then negated clauses, then the rest.
+    '''
+    # brackets, identifiers and parameters, and anything else as one token
+    token = re.compile(r"[()]|\??[A-Za-z][\w-]*|[^\s()]+")
+    atom = re.compile(r"\??[A-Za-z][\w-]*$")
+    
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.foralls = []
+        self.negateds = []
+        self.clauses = []
+        self.pending = []
+        self.depth = 0
+        
+    #----------------------------------------------------------------------
+    def feed(self, text):
+        '''Parse the complete expressions in text, keeping any partial one
+        until its closing bracket is fed.'''
+        self.pending.append(text)
+        self.depth += text.count('(') - text.count(')')
+        if self.depth <= 0:
+            text = ''.join(self.pending)
+            self.pending = []
+            self.depth = 0
+            self._parse(text)
+    
+    #----------------------------------------------------------------------
+    def close(self):
+        '''Finish parsing and return the SymbolicState.'''
+        if len(self.pending) > 0:
+            text = ''.join(self.pending)
+            self.pending = []
+            self._parse(text)
+        state = SymbolicState()
+        try:
+            for c in self.foralls + self.negateds + self.clauses:
+                state.addClause(c)
+        except StateError:
+            raise StateError("PARSE_DUP")
+        return state
+    
+    #----------------------------------------------------------------------
+    def _parse(self, text):
+        tokens = self.token.findall(text)
+        count = len(tokens)
+        i = 0
+        while i < count:
+            if tokens[i] != '(' or i + 1 == count:
+                self._unknown(text, tokens, i)
+            start = i
+            head = tokens[i + 1]
+            if head == 'forall' and i + 2 < count and tokens[i + 2] == '(':
+                i = self._parseForall(tokens, i + 3)
+            elif head == 'not' and i + 2 < count and tokens[i + 2] == '(':
+                negated, i = self._parseNegated(tokens, i + 2)
+                if negated is not None:
+                    for atoms in negated:
+                        self.negateds.append(self._createClause(atoms, True))
+            else:
+                atoms, i = self._parseClause(tokens, i)
+                if atoms is not None:
+                    self.clauses.append(self._createClause(atoms))
+            if i is None:
+                self._unknown(text, tokens, start)
+    
+    #----------------------------------------------------------------------
+    def _parseClause(self, tokens, i):
+        '''Reads (atom atom..) from tokens[i], returning the atoms and the
+        index after the clause, or (None, None) if it is not a clause.'''
+        if i >= len(tokens) or tokens[i] != '(':
+            return None, None
+        end = i + 1
+        count = len(tokens)
+        while end < count and tokens[end] != ')':
+            if not self.atom.match(tokens[end]):
+                return None, None
+            end += 1
+        if end == count or end == i + 1:
+            return None, None
+        return tokens[i + 1:end], end + 1
+    
+    #----------------------------------------------------------------------
+    def _parseNegated(self, tokens, i):
+        '''Reads the clauses of (not (..) (..)) from tokens[i], which is the
+        first clause. Returns the negated clauses and the index after the
+        closing bracket, or (None, None).'''
+        negated = []
+        while True:
+            atoms, i = self._parseClause(tokens, i)
+            if atoms is None:
+                return None, None
+            negated.append(atoms)
+            if i < len(tokens) and tokens[i] == ')':
+                return negated, i + 1
+            
+    #----------------------------------------------------------------------
+    def _parseForall(self, tokens, i):
+        '''Reads (forall (?p) clause) where tokens[i] is the parameter.
+        Returns the index after the closing bracket, or None.'''
+        count = len(tokens)
+        if i + 2 >= count or tokens[i][0] != '?' or not self.atom.match(tokens[i]) or tokens[i + 1] != ')':
+            return None
+        param = tokens[i]
+        i += 2
+        if i + 2 < count and tokens[i] == '(' and tokens[i + 1] == 'not' and tokens[i + 2] == '(':
+            # only the first clause of a negated group is used
+            clauses, i = self._parseNegated(tokens, i + 2)
+            negated = True
+        else:
+            atoms, i = self._parseClause(tokens, i)
+            clauses = [atoms]
+            negated = False
+        if i is None or i >= count or tokens[i] != ')':
+            return None
+        atoms = ["_ALL_" if a == param else a for a in clauses[0]]
+        self.foralls.append(Clause(atoms[0], atoms[1:], negated, forall=True))
+        return i + 1
+    
+    #----------------------------------------------------------------------
+    def _createClause(self, atoms, negated=False):
+        parameterised = False
+        for a in atoms:
+            if a[0] == '?':
+                parameterised = True
+                break
+        return Clause(atoms[0], atoms[1:], negated, parameterised=parameterised)
+    
+    #----------------------------------------------------------------------
+    def _unknown(self, text, tokens, i):
+        '''Raise a PARSE_UNKNOWN error for the top level expression starting
+        at tokens[i].'''
+        positions = [m.start() for m in self.token.finditer(text)]
+        depth = 0
+        end = len(text)
+        for j in range(i, len(tokens)):
+            if tokens[j] == '(':
+                depth += 1
+            elif tokens[j] == ')':
+                depth -= 1
+            if depth <= 0:
+                end = positions[j] + len(tokens[j])
+                break
+        raise StateError("PARSE_UNKNOWN", "Unknown: %s"%text[positions[i]:end])
+        
+        
 ########################################################################
 class SymbolicState:
     '''
-    Class for storing the symbolic state. The state is stored as a list of
-    *Clause* objects in self.state. It can be created manually, or from a
-    string description that is parsed.
+    Class for storing the symbolic state. The state is stored as an ordered
+    set of *Clause* objects in self.state (an OrderedDict with the clauses as
+    keys), so membership tests do not depend on the size of the state, and
+    self.predicate_index holds the set of clauses for each predicate name.
+    queryClauses also keeps an index per predicate argument position. It
+    can be created manually, or from a string description that is parsed.
+    
+    successor returns a *DeltaState*, which shares this state's clauses and
+    records only what changed. The shared containers are kept in
+    self.snapshot; if this state is altered afterwards it first takes copies
+    of them, so the successors are not affected.
     '''
     #----------------------------------------------------------------------
     def __init__(self, state=None):
         ''' Create a SymbolicState from the list of Clause objects '''
-        if state is None:
-            self.state=[]
-        else:
-            self.state = state
+        self.state = OrderedDict()
+        self.predicate_index = {}
+        # (predicate name, argument position) -> {constant: set of clauses},
+        # built for a position the first time a query binds it
+        self.argument_index = {}
+        # predicate name -> set of the forall clauses for it
+        self.forall_index = {}
+        # xor of the clause hashes, kept as clauses are added and removed
+        self.state_hash = 0
+        # a SymbolicState sharing the containers above with DeltaStates
+        self.snapshot = None
+        if state is not None:
+            for c in state:
+                self._insert(c)
+            
+    #----------------------------------------------------------------------
+    def _insert(self, p):
+        ''' Add the clause p to the state and index, if not already there '''
+        if p not in self.state:
+            if self.snapshot is not None:
+                self._unshare()
+            self.state[p] = None
+            self.state_hash ^= p._hash
+            self.predicate_index.setdefault(p.name, set()).add(p)
+            if p.forall:
+                self.forall_index.setdefault(p.name, set()).add(p)
+            if self.argument_index:
+                for position, value in enumerate(p.args):
+                    index = self.argument_index.get((p.name, position))
+                    if index is not None:
+                        index.setdefault(value, set()).add(p)
+    
+    #----------------------------------------------------------------------
+    def _discard(self, p):
+        ''' Remove the clause p from the state and index '''
+        if self.snapshot is not None:
+            self._unshare()
+        del self.state[p]
+        self.state_hash ^= p._hash
+        clauses = self.predicate_index[p.name]
+        clauses.discard(p)
+        if len(clauses) == 0:
+            del self.predicate_index[p.name]
+        if p.forall:
+            clauses = self.forall_index[p.name]
+            clauses.discard(p)
+            if len(clauses) == 0:
+                del self.forall_index[p.name]
+        if self.argument_index:
+            for position, value in enumerate(p.args):
+                index = self.argument_index.get((p.name, position))
+                if index is not None:
+                    clauses = index[value]
+                    clauses.discard(p)
+                    if len(clauses) == 0:
+                        del index[value]
+    
+    #----------------------------------------------------------------------
+    def _replaceClauses(self, clauses):
+        ''' Replace the contents of this state with the list of clauses '''
+        self.state = OrderedDict()
+        self.predicate_index = {}
+        self.argument_index = {}
+        self.forall_index = {}
+        self.state_hash = 0
+        self.snapshot = None
+        for c in clauses:
+            self._insert(c)
+        
+    #----------------------------------------------------------------------
+    def _share(self):
+        ''' Return a SymbolicState holding the containers of this one, for
+        DeltaStates to build on. It is never altered. '''
+        if self.snapshot is None:
+            snapshot = SymbolicState()
+            snapshot.state = self.state
+            snapshot.predicate_index = self.predicate_index
+            snapshot.argument_index = self.argument_index
+            snapshot.forall_index = self.forall_index
+            snapshot.state_hash = self.state_hash
+            self.snapshot = snapshot
+        return self.snapshot
+    
+    #----------------------------------------------------------------------
+    def _unshare(self):
+        ''' Take copies of the containers shared with DeltaStates before
+        this state is altered. '''
+        self.state = OrderedDict(self.state)
+        self.predicate_index = dict([(name, set(clauses))
+                                     for name, clauses in self.predicate_index.iteritems()])
+        self.argument_index = {}
+        self.forall_index = dict([(name, set(clauses))
+                                  for name, clauses in self.forall_index.iteritems()])
+        self.snapshot = None
+        
+    #----------------------------------------------------------------------
+    def copy(self):
+        ''' Return a new state holding the same clauses. The clauses are
+        shared, which is safe as they can not be altered. The argument
+        indexes are not copied, the new state builds its own when queried. '''
+        newstate = SymbolicState()
+        newstate.state = OrderedDict(self.state)
+        newstate.state_hash = self.state_hash
+        for name, clauses in self.predicate_index.iteritems():
+            newstate.predicate_index[name] = set(clauses)
+        for name, clauses in self.forall_index.iteritems():
+            newstate.forall_index[name] = set(clauses)
+        return newstate
+    
+    #----------------------------------------------------------------------
+    def successor(self, add, delete):
+        '''
+        Return a new state which is this one with the clauses in delete
+        removed and those in add added. Clauses to delete which are not in
+        the state, and clauses to add which already are, are ignored.
+        
+        The new state is a DeltaState sharing this one's clauses, so this
+        costs time in the size of add and delete, not of the state.
+        '''
+        return DeltaState(self, add, delete)
+    
+    #----------------------------------------------------------------------
+    def stateHash(self):
+        ''' Return a hash of the clauses in the state, which is the same for
+        equal states whatever the clause order. States are mutable, so this
+        is not __hash__; it is for finding duplicate states in search. '''
+        return self.state_hash
+    
+    #----------------------------------------------------------------------
+    def __len__(self):
+        return len(self.state)
+    
+    #----------------------------------------------------------------------
+    def __contains__(self, p):
+        return p in self.state
             
     #----------------------------------------------------------------------
     def __str__(self):
@@ -285,97 +693,89 @@ class SymbolicState:
         If a predicate is parsed that is not specified in
         SymbolicPredicates.py then an exception is raised.
         '''
-        newstate = SymbolicState()
-        #syntax = Clause.nomatch
-        #predicates = Predicates.getPredicates()
-        
-        #for predicate in predicates:
-        #    syntax = syntax ^ Clause.createParseSyntax(predicate,predicates[predicate])
-                
-        #for item,s,e in Clause.syntax.scanString(input):
-        #    print item[0], "(",")"
-        #exit(0)
-        # "forall" clauses
-        input_remain = ""
-        prevStop = 0
-        for item,start,stop in Clause.forall_syntax.scanString(input):
-            param = item.asList()[0]
-            c = item.asList()[1]
-            c = ["_ALL_" if const == param else const for const in c]
-            predicate = Clause.createFromParse(c, start, stop)
-            predicate.forall = True
-            if item.asDict().has_key("negated"):
-                predicate.negated = True
-            try:
-                newstate.addClause(predicate)
-            except StateError:
-                raise StateError("PARSE_DUP")
-            
-            input_remain += input[prevStop:start]
-            prevStop = stop
-        input_remain += input[prevStop:]
-        input =  input_remain        
-
-        # negated clauses
-        prevStop = 0
-        input_remain = ""
-        for item,start,stop in Clause.negated_syntax.scanString(input):
-            for c in item:
-                predicate = Clause.createFromParse(c, start, stop)
-                predicate.negated = True
-                if c.asDict().has_key("param"):
-                    predicate.parameterised = True                
-                try:
-                    newstate.addClause(predicate)
-                except StateError:
-                    raise StateError("PARSE_DUP")
-            input_remain += input[prevStop:start]
-            prevStop = stop
-        input_remain += input[prevStop:]
-        input =  input_remain
-        # standard clauses
-        begin = 0
-        for item,start,stop in Clause.syntax.scanString(input):
-            if start > begin:
-                if len(input[begin:start].strip()):
-                    raise StateError("PARSE_UNKNOWN", "Unknown: %s"%input[begin:start])
-            begin = stop
-            predicate = Clause.createFromParse(item, start, stop)
-            if item.asDict().has_key("param"):
-                predicate.parameterised = True                            
-                
-            try:
-                newstate.addClause(predicate)
-            except StateError:
-                raise StateError("PARSE_DUP")
-              
-        if len(input) > begin:
-                if len(input[begin:len(input)].strip()):
-                    raise StateError("PARSE_UNKNOWN", "Unknown: %s"%input[begin:])
-        
-        return newstate
+        parser = StateParser()
+        parser.feed(input)
+        return parser.close()
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def createFromStream(stream):
+        '''
+        Returns a SymbolicState parsed from a file like object, read a line
+        at a time so that large states need not be held as one string.
+        '''
+        parser = StateParser()
+        for line in stream:
+            parser.feed(line)
+        return parser.close()
+    
+    #----------------------------------------------------------------------
+    @staticmethod
+    def createFromFile(filename):
+        '''Returns a SymbolicState parsed from the named file.'''
+        with open(filename, "r") as f:
+            return SymbolicState.createFromStream(f)
         
     #----------------------------------------------------------------------
     def hasClause(self, p):
         ''' Check if this state contains the clause p '''
-        for i in self.state:
-            if p==i:
-                return True
-        return False
+        return p in self.state
 
     #----------------------------------------------------------------------
     def addClause(self, p):
         ''' Add the Clause p to this state, checking for duplicatation '''
         if self.hasClause(p):
             raise StateError("ADD")
-        self.state.append(p)
+        self._insert(p)
     
     #----------------------------------------------------------------------
     def removeClause(self, p):
         ''' Remove the clause, exception if not found. '''
         if not self.hasClause(p):
             raise StateError("DEL")
-        self.state.remove(p)
+        self._discard(p)
+        
+    #----------------------------------------------------------------------
+    def getPredicateClauses(self, name):
+        ''' Return the set of clauses in this state for the predicate name.
+        The set must not be altered. '''
+        return self.predicate_index.get(name, frozenset())
+        
+    #----------------------------------------------------------------------
+    def getForAllClauses(self, name):
+        ''' Return the set of forall clauses in this state for the predicate
+        name. The set must not be altered. '''
+        return self.forall_index.get(name, frozenset())
+    
+    #----------------------------------------------------------------------
+    def holds(self, p):
+        '''
+        Check if the clause p is true in this state: it is in the state, or
+        a forall clause in the state stands for it. Foralls are not
+        expanded, they are looked up by the predicate name.
+        '''
+        return p in self or self.isCoveredByForAll(p)
+    
+    #----------------------------------------------------------------------
+    def isCoveredByForAll(self, p):
+        ''' Check if a forall clause in this state stands for the clause p '''
+        if p.forall:
+            return False
+        for f in self.getForAllClauses(p.name):
+            if f.coversClause(p):
+                return True
+        return False
+    
+    #----------------------------------------------------------------------
+    def forAllMatches(self, forall):
+        '''
+        Generate the clauses in this state that the forall clause stands
+        for, found from the argument indexes rather than by expanding it.
+        '''
+        pattern = tuple([None if a == '_ALL_' else a for a in forall.args])
+        for c in self.queryClauses(forall.name, pattern, negated=forall.negated):
+            if not c.forall:
+                yield c
         
     #----------------------------------------------------------------------
     def findClauses(self, expression):
@@ -385,28 +785,60 @@ class SymbolicState:
                 string representation of clause to look for, incorporated RE
                 eg "(above mug1_* tray)
         """
-        ex = re.compile(expression)
-        clauses = []
-        for c in self.state:
-            match =  ex.search(str(c))
-            #print "Compare to : ["+str(c) + ']'
-            if match:
-                #print "MATCH ", c
-                clauses.append(c)
-        return clauses
+        search = re.compile(expression).search
+        return [c for c in self if search(c.__string__())]
             
+    #----------------------------------------------------------------------
+    def _argumentIndex(self, name, position):
+        ''' Return the index from constant to clauses for the argument position
+        of the predicate name, building it if this is the first use. '''
+        key = (name, position)
+        index = self.argument_index.get(key)
+        if index is None:
+            index = {}
+            for c in self.predicate_index.get(name, ()):
+                index.setdefault(c.args[position], set()).add(c)
+            self.argument_index[key] = index
+        return index
+    
+    #----------------------------------------------------------------------
+    def queryClauses(self, name, args=None, negated=None):
+        """ Find the clauses of a predicate with some of the constants given,
+        in no particular order. 
+        :Parameters:
+            name : str
+                the predicate name
+            args : tuple
+                a constant or None for every argument of the predicate, None
+                matching any constant. eg ('mug1', None) for (type mug1 ?)
+            negated : bool
+                if given only clauses which are / are not negated are returned
+        """
+        clauses = self.predicate_index.get(name)
+        if clauses is None:
+            return []
+        if args is not None:
+            if len(args) != Predicates.getArity(name):
+                raise StateError("QUERY", "%s %s"%(name, args))
+            bound = [self._argumentIndex(name, position).get(value, frozenset())
+                     for position, value in enumerate(args) if value is not None]
+            if len(bound) > 0:
+                bound.sort(key=len)
+                clauses = bound[0].intersection(*bound[1:])
+        if negated is None:
+            return list(clauses)
+        return [c for c in clauses if c.negated == negated]
+        
     #----------------------------------------------------------------------
     def __xor__(self, other):
         ''' 
         The ^ operator for state intersection, return the clause commen to
-        both this and the other
+        both this and the other. The clauses are in the order of the smaller
+        state.
         '''
-        newstate = SymbolicState()
-        for i in self.state:
-            if other.hasClause(i):
-                newstate.addClause(i)
-        
-        return newstate
+        if len(other) < len(self):
+            return SymbolicState([i for i in other if i in self])
+        return SymbolicState([i for i in self if i in other])
     
     #----------------------------------------------------------------------
     def __and__(self, other):
@@ -414,12 +846,9 @@ class SymbolicState:
         The & operator for state combination, returns the combination of this
         state and the other state without the duplicated entries
         '''
-        newstate = SymbolicState()
-        for i in self.state:
-            newstate.addClause(i)
-        for i in other.state:
-            if not newstate.hasClause(i):
-                newstate.addClause(i)
+        newstate = self.copy()
+        for i in other:
+            newstate._insert(i)
         
         return newstate
 
@@ -429,20 +858,22 @@ class SymbolicState:
         Subtract: return a state that is this one minus what ever is in common
         with the other one
         '''
-        common = self ^ other
-        newstate = SymbolicState()
-        for i in self.state:
-            if not common.hasClause(i):
-                newstate.addClause(i)
-        return newstate
+        return SymbolicState([i for i in self if i not in other])
     
     #----------------------------------------------------------------------
     def __eq__(self, other):
         """same set of clauses, if paramed then same params"""
         assert isinstance(other, SymbolicState)
-        if other.state == self.state:
-            return True
-        return False
+        if len(other) != len(self):
+            return False
+        for i in self:
+            if i not in other:
+                return False
+        return True
+        
+    #----------------------------------------------------------------------
+    def __ne__(self, other):
+        return not self.__eq__(other)
         
     #----------------------------------------------------------------------
     def transitionListsTo(self, other):
@@ -463,22 +894,20 @@ class SymbolicState:
         appear in the constant list in this state
         '''
         objects = set([])
-        predicates = Predicates.getPredicates()
         for p in self.state:
-            for const in predicates[p.name]:
-                if p.getMember(const)[0] != '?' and p.getMember(const) != '_ALL_':
-                    objects.add(p.getMember(const))
+            for const in p.args:
+                if not isParameter(const) and const != '_ALL_':
+                    objects.add(const)
         return objects
 
     #----------------------------------------------------------------------
     def whatParameters(self):
         """Return set of parameters involved in state"""
         objects = set([])
-        predicates = Predicates.getPredicates()
         for p in self.state:
-            for const in predicates[p.name]:
-                if p.getMember(const)[0] == '?':
-                    objects.add(p.getMember(const))
+            for const in p.args:
+                if isParameter(const):
+                    objects.add(const)
         return objects        
     
     #----------------------------------------------------------------------
@@ -489,49 +918,45 @@ class SymbolicState:
             params : dictionary
                 the parameters that appear throughought state
         """
-        allobjects = self.whatObjects()
-        grounded = self.whatObjects()
         param = self.whatParameters()
         for i in param:
             if not params.has_key(i):
                 raise StateError("PARAM", "Don't have value for "+str(i))
             
+        grounded_clauses = []
         for c in self.state:
             if c.parameterised:
-                for const in c.constants:
-                    if c.getMember(const).find("?") != -1:
-                        try:
-                            setattr(c, const, params[c.getMember(const)])
-                        except KeyError:
-                            raise StateError("PARAM")
-                c.parameterised = False       
+                try:
+                    c = Clause.createCopy(c, [params[a] if a.find("?") != -1 else a for a in c.args],
+                                          parameterised=False)
+                except KeyError:
+                    raise StateError("PARAM")
+            grounded_clauses.append(c)
+        self._replaceClauses(grounded_clauses)
+    #----------------------------------------------------------------------
+    def iterForAlls(self, expand_as=None):
+        """Generate the clauses the forall statements stand for, over the
+        objects expand_as or by default the objects in the state. Nothing is
+        built until it is asked for."""
+        foralls = [c for c in self if c.forall]
+        if len(foralls) == 0:
+            return
+        if expand_as is None:
+            expand_as = self.whatObjects()
+        else:
+            expand_as = list(expand_as)
+        for c in foralls:
+            for expanded in c.expandForAll(expand_as):
+                yield expanded
+    
     #----------------------------------------------------------------------
     def expandForAlls(self, expand_as=None):
         """Expands all the forall statements"""
-        if expand_as != None:
-            grounded = expand_as
-        else:
-            grounded = self.whatObjects()
-        
-        expanded_foralls = []
-        remove_foralls = []
-        
-        for c in self.state:
-            isinstance(c, Clause)
-            if c.forall:
-                remove_foralls.append(c)
-                # for all the symbols the state considers, create a clause copy replace __ALL__ with a
-                for sym in grounded:
-                    vals = [getattr(c, a) if getattr(c, a) != "_ALL_" else sym for a in c.constants]
-                    cnew = Clause(c.name, vals)
-                    cnew.negated = c.negated
-                    cnew.parameterised = True
-                    expanded_foralls.append(cnew)
-        self.state.extend(expanded_foralls)
-        #print "Expanding forall "
-        #print remove_foralls
-        for c in remove_foralls:
-            self.state.remove(c)        
+        if len(self.forall_index) == 0:
+            return
+        expanded_foralls = list(self.iterForAlls(expand_as))
+        kept = [c for c in self if not c.forall]
+        self._replaceClauses(kept + expanded_foralls)
 
     #----------------------------------------------------------------------
     def parameterise(self, params):
@@ -542,11 +967,12 @@ class SymbolicState:
         """
         assert isinstance(params, dict )
         print params
+        clauses = []
         for c in self.state:
-            for const in c.constants:
-                if c.getMember(const) in params:
-                    c.setMember(const, params[c.getMember(const)])
-                    c.parameterised = True
+            if any(a in params for a in c.args):
+                c = Clause.createCopy(c, [params.get(a, a) for a in c.args], parameterised=True)
+            clauses.append(c)
+        self._replaceClauses(clauses)
         
     #----------------------------------------------------------------------
     def __getstate__(self):
@@ -567,6 +993,245 @@ class SymbolicState:
         return iter(self.state)
         
     
+########################################################################
+class DeltaState(SymbolicState):
+    '''
+    A state stored as the clauses added to and removed from its parent
+    state, so applying an action costs time in the size of its effects and
+    not of the state, and the successors in a search share the clauses of
+    their ancestors.
+    
+    The chain of parents ends at a base, a SymbolicState which is never
+    altered. When the chain gets longer than max_depth the changes are
+    merged into one relative to the base, so membership tests look at a
+    bounded number of states. When the merged changes grow large compared
+    to the base the state is compacted into an ordinary one, which later
+    successors build on. Compacting also happens when a method needing the
+    full containers (self.state, self.predicate_index) is used, such as
+    addClause. After compacting self.base is None and it behaves exactly as
+    a SymbolicState, but keeps its parent and changes, which successors made
+    before it was compacted still look through.
+    
+    Clauses of the base keep their position, so a clause removed and added
+    back is not moved to the end as it is in a SymbolicState.
+    '''
+    max_depth = 2
+    # compact when there are more changes than this, and more than this
+    # fraction of the base
+    compact_size = 32
+    compact_ratio = 0.05
+    
+    #----------------------------------------------------------------------
+    def __init__(self, parent, add, delete):
+        '''
+        :Parameters:
+            parent : SymbolicState
+                the state changed, not altered
+            add, delete : list of Clause
+                as for SymbolicState.successor
+        '''
+        if isinstance(parent, DeltaState) and parent.base is not None:
+            self.base = parent.base
+            self.parent = parent
+            self.depth = parent.depth + 1
+            self.changes = parent.changes
+            self.forall_changes = parent.forall_changes
+        else:
+            self.base = parent._share()
+            self.parent = None
+            self.depth = 1
+            self.changes = 0
+            self.forall_changes = 0
+        self.added = added = OrderedDict()
+        self.removed = removed = set()
+        self.size = len(parent)
+        state_hash = parent.state_hash
+        for c in delete:
+            if c in added:
+                del added[c]
+            elif c in parent and c not in removed:
+                removed.add(c)
+            else:
+                continue
+            state_hash ^= c._hash
+            self.size -= 1
+            self.forall_changes += c.forall
+        for c in add:
+            if c in removed:
+                removed.discard(c)
+            elif c not in added and c not in parent:
+                added[c] = None
+            else:
+                continue
+            state_hash ^= c._hash
+            self.size += 1
+            self.forall_changes += c.forall
+        self.state_hash = state_hash
+        self.changes += len(added) + len(removed)
+        if self.depth > self.max_depth:
+            self._flatten()
+    
+    #----------------------------------------------------------------------
+    def _merged(self):
+        ''' Return the (added, removed) changes from the base to this state
+        along the chain of parents. '''
+        if self.parent is None:
+            return self.added, self.removed
+        chain = []
+        node = self
+        while node is not None:
+            chain.append(node)
+            node = node.parent
+        added = OrderedDict()
+        removed = set()
+        for node in reversed(chain):
+            for c in node.removed:
+                if c in added:
+                    del added[c]
+                else:
+                    removed.add(c)
+            for c in node.added:
+                if c in removed:
+                    removed.discard(c)
+                else:
+                    added[c] = None
+        return added, removed
+    
+    #----------------------------------------------------------------------
+    def _flatten(self):
+        ''' Replace the chain of parents by the changes from the base, or
+        compact the state if they are too many. '''
+        self.added, self.removed = self._merged()
+        self.parent = None
+        self.depth = 1
+        self.changes = len(self.added) + len(self.removed)
+        self.forall_changes = len([c for c in self.added if c.forall])
+        self.forall_changes += len([c for c in self.removed if c.forall])
+        if (self.changes > self.compact_size and
+            self.changes > self.compact_ratio * len(self.base.state)):
+            self.compact()
+    
+    #----------------------------------------------------------------------
+    def __getattr__(self, name):
+        # only called for attributes not set, which the containers of a
+        # state are until it is compacted
+        if name in ('state', 'predicate_index', 'argument_index', 'forall_index', 'snapshot'):
+            self.compact()
+            return self.__dict__[name]
+        raise AttributeError(name)
+    
+    #----------------------------------------------------------------------
+    def compact(self):
+        ''' Store the state in full, no longer sharing the base. The parent
+        and changes are left alone for the successors of this state, which
+        see it as it was when they were made. '''
+        if self.base is None:
+            return
+        clauses = list(self)
+        SymbolicState.__init__(self, clauses)
+        self.base = None
+    
+    #----------------------------------------------------------------------
+    def successor(self, add, delete):
+        if self.base is None:
+            return SymbolicState.successor(self, add, delete)
+        return DeltaState(self, add, delete)
+    
+    #----------------------------------------------------------------------
+    def copy(self):
+        if self.base is None:
+            return SymbolicState.copy(self)
+        return DeltaState(self, (), ())
+    
+    #----------------------------------------------------------------------
+    def __len__(self):
+        if self.base is None:
+            return len(self.state)
+        return self.size
+    
+    #----------------------------------------------------------------------
+    def __contains__(self, p):
+        if self.base is None:
+            return p in self.state
+        node = self
+        while node is not None:
+            if p in node.added:
+                return True
+            if p in node.removed:
+                return False
+            node = node.parent
+        return p in self.base.state
+    
+    #----------------------------------------------------------------------
+    def __iter__(self):
+        if self.base is None:
+            return iter(self.state)
+        return self._iterDelta()
+    
+    #----------------------------------------------------------------------
+    def _iterDelta(self):
+        added, removed = self._merged()
+        for c in self.base.state:
+            if c not in removed:
+                yield c
+        for c in added:
+            yield c
+    
+    #----------------------------------------------------------------------
+    def hasClause(self, p):
+        return p in self
+    
+    #----------------------------------------------------------------------
+    def stateSize(self):
+        return len(self)
+    
+    #----------------------------------------------------------------------
+    def getPredicateClauses(self, name):
+        if self.base is None:
+            return SymbolicState.getPredicateClauses(self, name)
+        added, removed = self._merged()
+        clauses = self.base.getPredicateClauses(name)
+        removed = [c for c in removed if c.name == name]
+        added = [c for c in added if c.name == name]
+        if len(removed) == 0 and len(added) == 0:
+            return clauses
+        return frozenset(clauses.difference(removed).union(added))
+    
+    #----------------------------------------------------------------------
+    def getForAllClauses(self, name):
+        if self.base is None:
+            return SymbolicState.getForAllClauses(self, name)
+        clauses = self.base.getForAllClauses(name)
+        if self.forall_changes == 0:
+            return clauses
+        added, removed = self._merged()
+        removed = [c for c in removed if c.forall and c.name == name]
+        added = [c for c in added if c.forall and c.name == name]
+        return frozenset(clauses.difference(removed).union(added))
+    
+    #----------------------------------------------------------------------
+    def queryClauses(self, name, args=None, negated=None):
+        if self.base is None:
+            return SymbolicState.queryClauses(self, name, args, negated)
+        added, removed = self._merged()
+        clauses = [c for c in self.base.queryClauses(name, args, negated) if c not in removed]
+        for c in added:
+            if c.name != name or (negated is not None and c.negated != negated):
+                continue
+            if args is not None:
+                if len(args) != len(c.args):
+                    raise StateError("QUERY", "%s %s"%(name, args))
+                if any(a is not None and a != b for a, b in zip(args, c.args)):
+                    continue
+            clauses.append(c)
+        return clauses
+    
+    #----------------------------------------------------------------------
+    def __setstate__(self, s):
+        SymbolicState.__setstate__(self, s)
+        self.base = None
+        
+    
 ########################################################################
 class StateError(Exception):
     '''
@@ -579,6 +1244,7 @@ class StateError(Exception):
         self.types["PARSE_DUP"]="Error parsing string into symbolic state, duplicate clause found."
         self.types["PARSE_UNKNOWN"]="Error parsing string into symbolic state, unknown syntax found."
         self.types["PARAM"]="No instantiation for parameter given, but trying to ground state!"
+        self.types["QUERY"]="Query does not give one constant or None for each argument of the predicate."
 
         self.type = type
         self.additional_info=additional_info
@@ -8,6 +8,8 @@ from rospkg import rospack
 
 import domain
 import state
+from action import Action
+from discovery import ActionDiscovery
 
 ########################################################################
 class STRANDSDomain(object):
@@ -31,24 +33,20 @@ class STRANDSDomain(object):
         pass
 
     #----------------------------------------------------------------------
-    def __find_actions(self, **kwargs):
-        """Scans the ros packages for exported strands actions. Stores
-        them here in a domain."""
-        packages=[]
-        for pkg in STRANDSDomain.__rospack.list():
-            manifest = STRANDSDomain.__rospack.get_manifest(pkg)
-            for export in manifest.exports:
-                if export.tag == "strands_action_domain":
-                    if export.attrs.has_key('action'):
-                        pth = STRANDSDomain.__rospack.get_path(pkg)
-                        packages.append([pkg, export.attrs['action'].replace("${prefix}",pth)])
-                    else:
-                        rospy.logerr("Package '%s' has <strands_action_domain>"
-                                     " tag in export but it misses 'action' "
-                                     "attribute." % pkg)
-                        
+    def __find_actions(self, cache_file=None, **kwargs):
+        """Finds the actions exported by the ros packages and stores them
+        here in a domain. What was found is cached, see ActionDiscovery."""
+        self.__discovery = ActionDiscovery(STRANDSDomain.__rospack, cache_file)
+        self.__load(self.__discovery.find())
+        
+    #----------------------------------------------------------------------
+    def refresh(self, rescan=True):
+        """Reload the domain, parsing only the manifests and action files
+        which changed. With rescan, packages added since are found too."""
+        self.__load(self.__discovery.find(rescan))
+        
+    #----------------------------------------------------------------------
+    def __load(self, found):
         self.domain = domain.DomainDefinition("STRANDS")
-        for pkg, action_yaml in packages:
-            with open(action_yaml, "r") as f:
-                action = domain.Action.load_yaml(f.read())
-                self.domain.addExistingAction(action)
+        for pkg, action_file, data in found:
+            self.domain.addExistingAction(Action.from_data(data))
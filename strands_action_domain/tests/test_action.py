@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import unittest
+
+from strands_action_domain.action import Action, ActionError, LRUCache
+from strands_action_domain.state import Clause, SymbolicState, StateError
+
+ACTION = """
+ActionName:    start
+ActionServer:  start_server
+ParameterTypes:
+    x:  string
+    y:  string
+Preconditions: (type ?x ?y) (not (running ?x)) (type robot robot-category)
+Effects: (running ?x) (not (type ?x ?y))
+"""
+
+STOP = """
+ActionName:    stop
+ActionServer:  stop_server
+ParameterTypes:
+    y:  string
+Preconditions: (forall (?o) (type ?o ?y))
+Effects: (forall (?o) (not (running ?o)))
+"""
+
+START = """
+ActionName:    start_all
+ActionServer:  start_server
+Preconditions: (forall (?o) (not (running ?o)))
+Effects: (forall (?o) (running ?o))
+"""
+
+
+class TestAction(unittest.TestCase):
+
+    def setUp(self):
+        self.action = Action.load_yaml(ACTION)
+        self.state = SymbolicState.createFromString('(type robot robot-category) (type a b) (type c d) (running c)')
+
+    def test_compile(self):
+        self.assertEquals(['?x', '?y'], self.action.parameters)
+        self.assertEquals(SymbolicState.createFromString('(running ?x)'), self.action.add_list)
+        self.assertEquals(SymbolicState.createFromString('(type ?x ?y)'), self.action.delete_list)
+
+    def test_check_applicable(self):
+        self.assertTrue(self.action.checkApplicable(self.state, {'?x': 'a', '?y': 'b'}))
+        self.assertFalse(self.action.checkApplicable(self.state, {'?x': 'c', '?y': 'd'}))
+        self.assertFalse(self.action.checkApplicable(self.state, {'?x': 'a', '?y': 'd'}))
+
+        applicable, diff = self.action.checkApplicable(self.state, {'?x': 'c', '?y': 'b'}, return_diff=True)
+        self.assertFalse(applicable)
+        self.assertEquals(SymbolicState.createFromString('(type c b) (not (running c))'), diff)
+
+        applicable, diff = self.action.checkApplicable(self.state, {'?x': 'a', '?y': 'b'}, return_diff=True)
+        self.assertTrue(applicable)
+        self.assertEquals(0, diff.stateSize())
+
+        self.assertRaises(StateError, self.action.checkApplicable, self.state, {'?x': 'a'})
+        # the action itself is not grounded by checking
+        self.assertEquals(SymbolicState.createFromString('(type ?x ?y) (not (running ?x)) (type robot robot-category)'),
+                          self.action.preconditions)
+
+    def test_apply_to_state(self):
+        after = self.action.applyToState(self.state, {'?x': 'a', '?y': 'b'})
+        self.assertEquals(SymbolicState.createFromString('(type robot robot-category) (type c d) (running c) (running a)'), after)
+        # the original state is not altered
+        self.assertTrue(self.state.hasClause(Clause('type', ['a', 'b'])))
+        self.assertRaises(ActionError, self.action.applyToState, self.state, {'?x': 'c', '?y': 'd'})
+
+    def test_ground(self):
+        grounded = self.action.ground({'?x': 'a', '?y': 'b'})
+        self.assertEquals(('a', 'b'), grounded.binding)
+        self.assertTrue(grounded is self.action.ground({'?y': 'b', '?x': 'a'}))
+        self.assertFalse(grounded is self.action.ground({'?x': 'a', '?y': 'c'}))
+        # parameter independent preconditions come first
+        self.assertEquals([Clause('type', ['robot', 'robot-category']), Clause('running', ['a']), Clause('type', ['a', 'b'])],
+                          [check for check, absent, precondition in grounded.preconditions])
+        self.assertEquals([False, True, False], [absent for check, absent, precondition in grounded.preconditions])
+
+        self.action.applyToState(self.state, {'?x': 'a', '?y': 'b'})
+        self.assertEquals([Clause('running', ['a'])], grounded.add_list)
+        self.assertEquals([Clause('type', ['a', 'b'])], grounded.delete_list)
+
+    def test_foralls(self):
+        stop = Action.load_yaml(STOP)
+        start = Action.load_yaml(START)
+        s = SymbolicState.createFromString('(forall (?o) (type ?o b)) (running a) (running c)')
+        self.assertTrue(stop.checkApplicable(s, {'?y': 'b'}))
+        self.assertFalse(stop.checkApplicable(s, {'?y': 'd'}))
+        self.assertFalse(start.checkApplicable(s, {}))
+        # the forall covers the precondition (type a b) of the other action
+        self.assertTrue(self.action.checkApplicable(SymbolicState.createFromString(
+            '(forall (?o) (type ?o b)) (type robot robot-category)'), {'?x': 'a', '?y': 'b'}))
+
+        # deletes are found in the state, adds are kept as foralls
+        stopped = stop.applyToState(s, {'?y': 'b'})
+        self.assertEquals(SymbolicState.createFromString('(forall (?o) (type ?o b))'), stopped)
+        self.assertTrue(start.checkApplicable(stopped, {}))
+        started = start.applyToState(stopped, {})
+        self.assertTrue(started.holds(Clause('running', ['anything'])))
+
+        # or expanded over the objects given
+        self.assertEquals(SymbolicState.createFromString('(forall (?o) (type ?o b)) (running a) (running c)'),
+                          start.applyToState(stopped, {}, object_list=['a', 'c']))
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put(1, 'one')
+        cache.put(2, 'two')
+        self.assertEquals('one', cache.get(1))
+        cache.put(3, 'three')
+        # 2 was used least recently
+        self.assertEquals(None, cache.get(2))
+        self.assertEquals('one', cache.get(1))
+        self.assertEquals('three', cache.get(3))
+        self.assertEquals(2, len(cache))
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_action', TestAction)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import rospkg
+
+from strands_action_domain.discovery import ActionDiscovery
+
+MANIFEST = """<package>
+  <name>%s</name>
+  <version>0.0.0</version>
+  <description>test package</description>
+  <maintainer email="test@example.com">test</maintainer>
+  <license>BSD</license>
+  <export>%s</export>
+</package>
+"""
+
+ACTION = """
+ActionName:    %s
+ActionServer:  %s_server
+Preconditions: (running robot)
+"""
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.workspace, 'cache', 'actions')
+        self.make_package('with_action', 'wait')
+        self.make_package('without_action')
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def make_package(self, name, action=None):
+        path = os.path.join(self.workspace, 'src', name)
+        os.makedirs(path)
+        export = ''
+        if action is not None:
+            export = '<strands_action_domain action="${prefix}/%s.yaml"/>' % action
+            with open(os.path.join(path, action + '.yaml'), 'w') as f:
+                f.write(ACTION % (action, action))
+        with open(os.path.join(path, 'package.xml'), 'w') as f:
+            f.write(MANIFEST % (name, export))
+        return path
+
+    def discovery(self):
+        return ActionDiscovery(rospkg.RosPack(ros_paths=[self.workspace]), self.cache_file)
+
+    def touch(self, filename):
+        mtime = os.stat(filename).st_mtime + 10
+        os.utime(filename, (mtime, mtime))
+
+    def test_find(self):
+        discovery = self.discovery()
+        found = discovery.find()
+        self.assertEquals(['with_action'], [pkg for pkg, action_file, data in found])
+        self.assertEquals('wait_server', found[0][2]['ActionServer'])
+        self.assertEquals((2, 1), (discovery.manifests_parsed, discovery.actions_parsed))
+        self.assertTrue(os.path.exists(self.cache_file))
+
+        # a warm start parses nothing
+        discovery = self.discovery()
+        self.assertEquals(found, discovery.find())
+        self.assertEquals((0, 0), (discovery.manifests_parsed, discovery.actions_parsed))
+
+    def test_refresh(self):
+        self.discovery().find()
+        path = os.path.join(self.workspace, 'src', 'with_action')
+        with open(os.path.join(path, 'wait.yaml'), 'w') as f:
+            f.write(ACTION % ('wait', 'other'))
+        self.touch(os.path.join(path, 'wait.yaml'))
+        discovery = self.discovery()
+        self.assertEquals('other_server', discovery.find()[0][2]['ActionServer'])
+        self.assertEquals((0, 1), (discovery.manifests_parsed, discovery.actions_parsed))
+
+        # new packages are found when the packages are searched again, only
+        # the new manifest is parsed
+        self.make_package('new_action', 'stop')
+        self.assertEquals(1, len(discovery.find()))
+        self.assertEquals(2, len(discovery.find(rescan=True)))
+        self.assertEquals((1, 1), (discovery.manifests_parsed, discovery.actions_parsed))
+
+        # removed packages are dropped without a rescan
+        shutil.rmtree(path)
+        self.assertEquals(['new_action'], [pkg for pkg, action_file, data in self.discovery().find()])
+
+    def test_bad_cache(self):
+        self.discovery().find()
+        with open(self.cache_file, 'w') as f:
+            f.write('not a cache')
+        discovery = self.discovery()
+        self.assertEquals(1, len(discovery.find()))
+        self.assertEquals(2, discovery.manifests_parsed)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_discovery', TestDiscovery)
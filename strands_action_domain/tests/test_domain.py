@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from strands_action_domain import domain_file
+from strands_action_domain.action import Action
+from strands_action_domain.domain import DomainDefinition, ProblemDefinition
+from strands_action_domain.domain_file import DomainFileError
+from strands_action_domain.state import Clause, SymbolicState
+
+ACTION = """
+ActionName:    start
+ActionServer:  start_server
+ActionServerParameters:
+    robot:  ?x
+    attempts:  3
+    speed:  0.5
+    wait:  True
+    names:  [a, b]
+ParameterTypes:
+    x:  string
+    y:  string
+Preconditions: (type ?x ?y) (not (running ?x)) (type robot robot-category)
+Effects: (running ?x) (not (type ?x ?y))
+"""
+
+STOP = """
+ActionName:    stop
+ActionServer:  stop_server
+ParameterTypes:
+    y:  string
+Preconditions: (forall (?o) (type ?o ?y))
+Effects: (forall (?o) (not (running ?o)))
+"""
+
+
+class TestDomain(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'domain')
+        self.domain = DomainDefinition('test', u'a domain \xe9')
+        self.domain.setDomainSourceHeader('# header')
+        for a in [ACTION, STOP]:
+            self.domain.addExistingAction(Action.load_yaml(a))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_loaded(self, loaded):
+        self.assertEquals('test', loaded.domain_name)
+        self.assertEquals(u'a domain \xe9', loaded.commment)
+        self.assertEquals('# header', loaded.source_header)
+        self.assertEquals(self.domain.actions, loaded.actions)
+        for name in self.domain.actions:
+            action, other = self.domain.getAction(name), loaded.getAction(name)
+            self.assertEquals(action.action_server, other.action_server)
+            self.assertEquals(action.preconditions, other.preconditions)
+            self.assertEquals(action.effects, other.effects)
+            self.assertEquals(action.action_parameters, other.action_parameters)
+            self.assertEquals(action.parameter_types, other.parameter_types)
+            self.assertEquals(action.parameters, other.parameters)
+        start = loaded.getAction('start')
+        # symbols are shared with clauses made elsewhere
+        self.assertTrue(Clause('running', ['?x']).args[0] is start.add_list.state.keys()[0].args[0])
+        after = start.applyToState(SymbolicState.createFromString('(type robot robot-category) (type a b)'),
+                                   {'?x': 'a', '?y': 'b'})
+        self.assertEquals(SymbolicState.createFromString('(type robot robot-category) (running a)'), after)
+
+    def test_round_trip(self):
+        self.domain.saveToDisk(self.filename)
+        self.assertTrue(domain_file.isDomainFile(self.filename))
+        self.check_loaded(DomainDefinition.createFromFile(self.filename))
+        self.check_loaded(DomainDefinition.createFromFile(self.filename, use_mmap=True))
+
+    def test_pickle(self):
+        self.domain.saveToDisk(self.filename, use_pickle=True)
+        self.assertFalse(domain_file.isDomainFile(self.filename))
+        self.check_loaded(DomainDefinition.createFromFile(self.filename))
+
+    def test_bad_files(self):
+        self.domain.saveToDisk(self.filename)
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        self.assertRaises(DomainFileError, domain_file.readDomain, data[:len(data) - 3])
+        try:
+            domain_file.readDomain(data[:8] + '\xff\x00' + data[10:])
+            self.fail()
+        except DomainFileError as e:
+            self.assertEquals("VERSION", e.type)
+        try:
+            domain_file.readDomain('NOTADOMAINFILE')
+            self.fail()
+        except DomainFileError as e:
+            self.assertEquals("MAGIC", e.type)
+
+    def test_write_pddl(self):
+        effects = list(self.domain.getAction('start').effects)
+        stream = StringIO()
+        self.domain.writePDDL(stream)
+        self.assertEquals(self.domain.generatePDDL(), stream.getvalue())
+        self.assertTrue('            ( not (type ?x ?y))\n' in stream.getvalue())
+        stream = StringIO()
+        self.domain.writeSHOP(stream)
+        self.assertEquals(self.domain.generateSHOP(), stream.getvalue())
+        self.assertTrue('(defdomain test\n' in stream.getvalue())
+        # writing leaves the effects as they were
+        self.assertEquals(effects, list(self.domain.getAction('start').effects))
+
+    def test_problem_pddl(self):
+        problem = ProblemDefinition('p', self.domain,
+                                    SymbolicState.createFromString('(type b robot-category) (running a)'))
+        problem.setGoal(SymbolicState.createFromString('(running b)'))
+        problem.addExcludedGoalState(SymbolicState.createFromString('(running a)'))
+        stream = StringIO()
+        problem.writePDDL(stream)
+        self.assertEquals(problem.generatePDDL(), stream.getvalue())
+        self.assertEquals('(define (problem p) (:domain test)\n'
+                          '  (:objects a b robot-category  )\n'
+                          '  (:init\n'
+                          '    (type b robot-category)\n'
+                          '    (running a)\n'
+                          '  )\n'
+                          '  (:goal (and\n'
+                          '    (running b)\n'
+                          '    (not (and\n'
+                          '      (running a)\n'
+                          '    ))\n'
+                          '    )\n'
+                          '  )\n'
+                          ')', stream.getvalue())
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_domain', TestDomain)
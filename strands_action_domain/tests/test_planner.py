@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import unittest
+
+from array import array
+
+from strands_action_domain.action import Action
+from strands_action_domain.grounding import ClauseCodec
+from strands_action_domain.planner import Planner, PlannerError, createTasks
+from strands_action_domain.predicates import Predicate, Predicates
+from strands_action_domain.state import Clause, SymbolicState
+
+MOVE = """
+ActionName:    move
+ActionServer:  topological_navigation
+ActionServerParameters:
+    target:  ?to
+ParameterTypes:
+    from:  string
+    to:  string
+Preconditions: (robot-in ?from) (connected ?from ?to)
+Effects: (robot-in ?to) (not (robot-in ?from))
+"""
+
+PICK = """
+ActionName:    pick
+ActionServer:  pick_server
+ActionServerParameters:
+    object:  ?o
+    attempts:  3
+ParameterTypes:
+    o:  string
+    w:  string
+Preconditions: (robot-in ?w) (object-in ?o ?w) (not (carrying ?o))
+Effects: (carrying ?o) (not (object-in ?o ?w))
+"""
+
+DROP = """
+ActionName:    drop
+ActionServer:  drop_server
+ParameterTypes:
+    o:  string
+    w:  string
+Preconditions: (robot-in ?w) (carrying ?o)
+Effects: (object-in ?o ?w) (not (carrying ?o))
+"""
+
+CORRIDOR = ('(robot-in w0) (object-in cup w0) (connected w0 w1) (connected w1 w0) '
+            '(connected w1 w2) (connected w2 w1) (connected w2 w3) (connected w3 w2)')
+
+
+def planning_state(text):
+    return SymbolicState.createFromString(text)
+
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        for name, arity in [('robot-in', 1), ('connected', 2), ('object-in', 2), ('carrying', 1)]:
+            Predicates.register(name, Predicate(arity, evaluatable=False)(lambda geometric_state, *c: True))
+        self.actions = [Action.load_yaml(a) for a in [MOVE, PICK, DROP]]
+
+    def check_plan(self, initial, goal, plan):
+        current = initial
+        for action, parameters in plan:
+            current = action.applyToState(current, parameters)
+        for c in goal:
+            self.assertTrue(c in current)
+
+    def test_plan(self):
+        for search in Planner.SEARCHES:
+            planner = Planner(self.actions, search=search)
+            initial = planning_state(CORRIDOR)
+            goal = planning_state('(object-in cup w3)')
+            plan = planner.plan(initial, goal)
+            self.check_plan(initial, goal, plan)
+            self.assertEquals(['pick', 'move', 'move', 'move', 'drop'], [a.name for a, p in plan])
+            self.assertEquals({'?o': 'cup', '?w': 'w0'}, plan[0][1])
+            # the initial state is not altered
+            self.assertTrue(Clause('robot-in', ['w0']) in initial)
+
+    def test_negated_goal(self):
+        planner = Planner(self.actions, search='astar')
+        plan = planner.plan(planning_state(CORRIDOR), planning_state('(not (robot-in w0)) (not (object-in cup w0))'))
+        self.assertEquals(['pick', 'move'], [a.name for a, p in plan])
+
+    def test_no_plan(self):
+        planner = Planner(self.actions)
+        self.assertEquals(None, planner.plan(planning_state(CORRIDOR), planning_state('(object-in cup w4)'),
+                                             objects=['cup', 'w0', 'w1', 'w2', 'w3', 'w4']))
+        self.assertEquals([], planner.plan(planning_state(CORRIDOR), planning_state('(robot-in w0)')))
+        self.assertRaises(PlannerError, Planner, self.actions, 'dfs')
+        self.assertRaises(PlannerError, planner.plan, planning_state(CORRIDOR), planning_state('(robot-in ?x)'))
+
+    def test_ground(self):
+        planner = Planner(self.actions)
+        operators = planner.ground(planning_state(CORRIDOR), ['cup', 'w0', 'w1', 'w2', 'w3'])
+        # six moves, and picking and dropping the cup anywhere the robot can go
+        self.assertEquals(6, len([op for op in operators if op.action.name == 'move']))
+        self.assertEquals(4, len([op for op in operators if op.action.name == 'drop']))
+        self.assertEquals(4, len([op for op in operators if op.action.name == 'pick']))
+
+    def test_parallel_ground(self):
+        objects = ['cup', 'w0', 'w1', 'w2', 'w3']
+        describe = lambda operators: sorted([(str(op), op.pre, op.absent, op.add, op.delete)
+                                             for op in operators])
+        expected = describe(Planner(self.actions).ground(planning_state(CORRIDOR), objects))
+        planner = Planner(self.actions, processes=2)
+        self.assertEquals(expected, describe(planner.ground(planning_state(CORRIDOR), objects)))
+        self.assertEquals(range(len(planner.operators)), [op.index for op in planner.operators])
+        plan = planner.plan(planning_state(CORRIDOR), planning_state('(object-in cup w3)'))
+        self.assertEquals(['pick', 'move', 'move', 'move', 'drop'], [a.name for a, p in plan])
+
+    def test_clause_codec(self):
+        clauses = [Clause('connected', ['w0', 'w1']), Clause('carrying', ['?o'], negated=True),
+                   Clause('robot-in', ['_ALL_'], forall=True)]
+        codec = ClauseCodec(['carrying', 'connected', 'robot-in', '?o', '_ALL_', 'w0', 'w1'])
+        out = array('I')
+        codec.encode(clauses, out)
+        codec.encode([], out)
+        decoded, i = codec.decode(out, 0)
+        self.assertEquals(clauses, decoded)
+        self.assertEquals([True, False], [c.negated for c in decoded[1:]])
+        self.assertEquals([False, True], [c.forall for c in decoded[1:]])
+        self.assertEquals(([], len(out)), codec.decode(out, i))
+
+    def test_prune(self):
+        planner = Planner(self.actions)
+        initial = planning_state(CORRIDOR + ' (type a b) (running a)')
+        goal = planning_state('(robot-in w3)')
+        plan = planner.plan(initial, goal, prune=True)
+        self.check_plan(initial, goal, plan)
+        self.assertEquals(['move', 'move', 'move'], [a.name for a, p in plan])
+        # only moving matters, over the robot position and connections
+        self.assertEquals((3, 1), planner.relevance.actions)
+        self.assertEquals((6, 6), planner.relevance.operators)
+        self.assertEquals((10, 7), planner.relevance.clauses)
+        self.assertTrue('actions: 3 -> 1 (66.7% pruned)' in str(planner.relevance))
+
+        # moves from rooms which can not be reached are not grounded, so
+        # their connections do not matter
+        goal = planning_state('(robot-in w0)')
+        initial = planning_state('(robot-in w1) (connected w1 w0) (connected w2 w1)')
+        self.assertEquals(['move'], [a.name for a, p in planner.plan(initial, goal, prune=True)])
+        self.assertEquals((1, 1), planner.relevance.operators)
+        self.assertEquals((3, 2), planner.relevance.clauses)
+
+    def test_create_tasks(self):
+        planner = Planner(self.actions)
+        tasks = createTasks(planner.plan(planning_state(CORRIDOR), planning_state('(carrying cup) (robot-in w1)')))
+        self.assertEquals(['pick_server', 'topological_navigation'], [t.action for t in tasks])
+        self.assertEquals(['3', 'cup'], [a.second for a in tasks[0].arguments])
+        self.assertEquals(['w1'], [a.second for a in tasks[1].arguments])
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_planner', TestPlanner)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import unittest
+
+from strands_action_domain.predicates import Predicate, Predicates, PredicateError
+from strands_action_domain.state import Clause
+
+
+class TestPredicates(unittest.TestCase):
+
+    def test_registry(self):
+        self.assertTrue(Predicates.doesPredicateExist('type'))
+        self.assertFalse(Predicates.doesPredicateExist('nothing'))
+        self.assertEquals(['c1', 'c2'], Predicates.getPredicates()['type'])
+        self.assertTrue('running' in Predicates.getPredicates(seperate=True)[0])
+        self.assertTrue('type' in Predicates.getPredicates(seperate=True)[1])
+        self.assertEquals(2, Predicates.getArity('type'))
+        self.assertTrue(Predicates.isEvaluatable('type'))
+        self.assertFalse(Predicates.isEvaluatable('running'))
+        self.assertRaises(AttributeError, Predicates.getPredicate, 'nothing')
+
+    def test_register(self):
+        def robot_at(geometric_state, c):
+            return True
+
+        Predicates.register('robot_at', Predicate(2, evaluatable=False)(robot_at))
+        self.assertTrue(Predicates.doesPredicateExist('robot-at'))
+        self.assertFalse(Predicates.doesPredicateExist('robot_at'))
+        # both naming forms find the same predicate
+        self.assertTrue(Predicates.getPredicate('robot-at') is Predicates.getPredicate('robot_at'))
+        self.assertTrue(Predicates.robot_at is Predicates.getPredicate('robot-at'))
+        self.assertEquals(['c1', 'c2'], Clause('robot-at', ['robot', 'WayPoint1']).constants)
+        self.assertRaises(PredicateError, Predicates.register, 'broken', robot_at)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_predicates', TestPredicates)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+PKG = 'strands_action_domain'
+
+import copy
+import pickle
+import unittest
+from StringIO import StringIO
+
+from strands_action_domain.state import Clause, ClauseError, DeltaState, SymbolicState, StateError
+
+
+class TestSymbolicState(unittest.TestCase):
+
+    def test_clause_identity(self):
+        a = Clause('type', ['mug1', 'mug-category'])
+        b = Clause('type', ['mug1', 'mug-category'])
+        self.assertEquals(a, b)
+        self.assertFalse(a != b)
+        self.assertEquals(hash(a), hash(b))
+        self.assertNotEqual(a, Clause('type', ['mug1', 'mug-category'], negated=True))
+        self.assertNotEqual(a, Clause('type', ['mug2', 'mug-category']))
+        self.assertEquals(('mug1', 'mug-category'), a.args)
+        self.assertEquals('mug1', a.getMember('c1'))
+        self.assertEquals('mug-category', a.getMember('c2'))
+        self.assertRaises(AttributeError, a.getMember, 'c3')
+        self.assertEquals('(type mug1 mug-category)', str(a))
+
+    def test_clause_immutable(self):
+        a = Clause('running', ['x'])
+        self.assertRaises(ClauseError, setattr, a, 'negated', True)
+        self.assertRaises(ClauseError, setattr, a, 'c1', 'y')
+        self.assertTrue(copy.deepcopy(a) is a)
+        self.assertEquals(a, pickle.loads(pickle.dumps(a)))
+        b = Clause.createCopy(a, negated=True)
+        self.assertFalse(a.negated)
+        self.assertTrue(b.negated)
+        self.assertEquals(a.args, b.args)
+
+    def test_parse(self):
+        s = SymbolicState.createFromString('(running a) (not (running b)) (forall (?o) (type ?o c-category)) (type ?x d)')
+        self.assertEquals(4, s.stateSize())
+        self.assertTrue(Clause('running', ['a']) in s)
+        self.assertTrue(s.hasClause(Clause('running', ['b'], negated=True)))
+        self.assertTrue(s.hasClause(Clause('type', ['_ALL_', 'c-category'], forall=True)))
+        self.assertEquals(2, len(s.getPredicateClauses('type')))
+        self.assertEquals(0, len(s.getPredicateClauses('nothing')))
+        self.assertRaises(StateError, SymbolicState.createFromString, '(running a) (running a)')
+        self.assertRaises(StateError, SymbolicState.createFromString, '(running a) rubbish')
+        self.assertRaises(StateError, SymbolicState.createFromString, '(running a')
+        self.assertRaises(StateError, SymbolicState.createFromString, '(type 1 2)')
+        self.assertRaises(ClauseError, SymbolicState.createFromString, '(nothing a)')
+        self.assertRaises(ClauseError, SymbolicState.createFromString, '(running a b)')
+
+    def test_parse_order(self):
+        # foralls come first, then negated clauses, then the rest
+        s = SymbolicState.createFromString('(type ?a b) (not (running ?a) (running b)) (forall (?T) (not (running ?T)))')
+        self.assertEquals('( forall (?ALL)( not (running ?ALL))) ( not (running ?a)) ( not (running b)) (type ?a b) ', repr(s))
+        self.assertEquals([False, True, False, True], [c.parameterised for c in s])
+
+    def test_parse_stream(self):
+        text = '(running a) (not\n (running b))\n(forall (?o)\n  (type ?o c))\n'
+        s = SymbolicState.createFromStream(StringIO(text))
+        self.assertEquals(SymbolicState.createFromString(text), s)
+        self.assertEquals(3, s.stateSize())
+        self.assertRaises(StateError, SymbolicState.createFromStream, StringIO('(running a)\n(running\n'))
+
+    def test_operators(self):
+        s = SymbolicState.createFromString('(running a) (running b) (running c)')
+        t = SymbolicState.createFromString('(running c) (running d)')
+        self.assertEquals(SymbolicState.createFromString('(running c)'), s ^ t)
+        self.assertEquals(SymbolicState.createFromString('(running a) (running b) (running c) (running d)'), s & t)
+        self.assertEquals(SymbolicState.createFromString('(running a) (running b)'), s - t)
+        self.assertEquals(SymbolicState.createFromString('(running c) (running b) (running a)'), s)
+        self.assertNotEqual(s, t)
+        self.assertEquals(SymbolicState.createFromString('(running c) (running b) (running a)').stateHash(), s.stateHash())
+        self.assertEquals(t.stateHash(), s.successor([Clause('running', ['d'])], [Clause('running', ['a']), Clause('running', ['b'])]).stateHash())
+
+        add, delete = s.transitionListsTo(t)
+        self.assertEquals(SymbolicState.createFromString('(running d)'), add)
+        self.assertEquals(SymbolicState.createFromString('(running a) (running b)'), delete)
+
+        s.removeClause(Clause('running', ['a']))
+        self.assertRaises(StateError, s.removeClause, Clause('running', ['a']))
+        self.assertRaises(StateError, s.addClause, Clause('running', ['b']))
+        self.assertEquals(2, len(s.getPredicateClauses('running')))
+
+    def test_query_clauses(self):
+        s = SymbolicState.createFromString('(type a x) (type b x) (type a y) (not (type c x)) (running a)')
+        self.assertEquals(set([Clause('type', ['a', 'x']), Clause('type', ['a', 'y'])]),
+                          set(s.queryClauses('type', ('a', None))))
+        self.assertEquals(3, len(s.queryClauses('type', (None, 'x'))))
+        self.assertEquals([Clause('type', ['c', 'x'], negated=True)], s.queryClauses('type', (None, 'x'), negated=True))
+        self.assertEquals([Clause('type', ['b', 'x'])], s.queryClauses('type', ('b', 'x')))
+        self.assertEquals(4, len(s.queryClauses('type')))
+        self.assertEquals([], s.queryClauses('type', ('d', None)))
+        self.assertEquals([], s.queryClauses('nothing', ('a',)))
+        self.assertRaises(StateError, s.queryClauses, 'type', ('a',))
+
+        # the indexes follow changes to the state
+        s.addClause(Clause('type', ['d', 'x']))
+        s.removeClause(Clause('type', ['a', 'x']))
+        self.assertEquals([Clause('type', ['a', 'y'])], s.queryClauses('type', ('a', None)))
+        self.assertEquals(set([Clause('type', ['b', 'x']), Clause('type', ['d', 'x'])]),
+                          set(s.queryClauses('type', (None, 'x'), negated=False)))
+        t = s.successor([Clause('type', ['e', 'x'])], [Clause('type', ['b', 'x'])])
+        self.assertEquals(2, len(t.queryClauses('type', (None, 'x'), negated=False)))
+        self.assertEquals(2, len(s.queryClauses('type', (None, 'x'), negated=False)))
+
+        self.assertEquals([Clause('type', ['a', 'y'])], s.findClauses(r'\(type a .*\)'))
+
+    def test_delta_state(self):
+        s = SymbolicState.createFromString('(running a) (running b) (type a x) (type b x)')
+        t = s.successor([Clause('running', ['c']), Clause('running', ['a'])], [Clause('running', ['b']), Clause('running', ['d'])])
+        self.assertTrue(isinstance(t, DeltaState))
+        self.assertEquals(SymbolicState.createFromString('(running a) (type a x) (type b x) (running c)'), t)
+        self.assertEquals('(running a) (type a x) (type b x) (running c) ', repr(t))
+        self.assertEquals(4, len(t))
+        self.assertFalse(Clause('running', ['b']) in t)
+        self.assertEquals(set([Clause('running', ['a']), Clause('running', ['c'])]), set(t.getPredicateClauses('running')))
+        self.assertEquals([Clause('running', ['c'])], t.queryClauses('running', ('c',)))
+        self.assertEquals(2, len(t.queryClauses('type', (None, 'x'))))
+
+        # successors of successors, back to the start
+        u = t.successor([Clause('running', ['b'])], [])
+        v = u.successor([], [Clause('running', ['c'])])
+        w = v.successor([Clause('running', ['e'])], [Clause('running', ['e'])])
+        self.assertEquals(s, v)
+        self.assertEquals(s.stateHash(), v.stateHash())
+        self.assertEquals(SymbolicState.createFromString('(running a) (running b) (running e) (type a x) (type b x)'), w)
+
+        # altering the first state or a successor leaves the others alone
+        s.removeClause(Clause('running', ['a']))
+        self.assertTrue(Clause('running', ['a']) in t)
+        t.addClause(Clause('running', ['f']))
+        self.assertTrue(t.base is None)
+        self.assertFalse(Clause('running', ['f']) in u)
+        self.assertEquals(5, len(t))
+        self.assertEquals(w, pickle.loads(pickle.dumps(w)))
+
+    def test_delta_alter_parent(self):
+        s = SymbolicState.createFromString('(running a) (running b)')
+        p = s.successor([Clause('running', ['c'])], [])
+        c = p.successor([Clause('running', ['d'])], [Clause('running', ['b'])])
+        # altering a state with successors compacts it, the successors are unaffected
+        p.addClause(Clause('running', ['e']))
+        self.assertTrue(p.base is None)
+        self.assertTrue(Clause('running', ['a']) in c)
+        self.assertTrue(Clause('running', ['c']) in c)
+        self.assertFalse(Clause('running', ['b']) in c)
+        self.assertFalse(Clause('running', ['e']) in c)
+        self.assertEquals(SymbolicState.createFromString('(running a) (running c) (running d)'), c)
+        self.assertEquals(set([Clause('running', ['a']), Clause('running', ['c']), Clause('running', ['d'])]),
+                          set(c.getPredicateClauses('running')))
+        self.assertEquals(SymbolicState.createFromString('(running a) (running b) (running c) (running e)'), p)
+        # and so are their successors, which are flattened
+        d = c.successor([Clause('running', ['f'])], [])
+        d = d.successor([], [Clause('running', ['a'])])
+        self.assertEquals(SymbolicState.createFromString('(running c) (running d) (running f)'), d)
+
+    def test_delta_compact(self):
+        s = SymbolicState([Clause('running', ['o%d' % i]) for i in xrange(100)])
+        t = s
+        for i in xrange(100, 200):
+            t = t.successor([Clause('running', ['o%d' % i])], [Clause('running', ['o%d' % (i - 100)])])
+            self.assertTrue(t.parent is None or t.depth <= DeltaState.max_depth)
+        # the changes outgrew the base, so the state was compacted on the way
+        self.assertTrue(t.base is None or t.base is not s._share())
+        self.assertEquals(SymbolicState([Clause('running', ['o%d' % i]) for i in xrange(100, 200)]), t)
+
+    def test_lazy_foralls(self):
+        s = SymbolicState.createFromString('(forall (?o) (type ?o c)) (not (running a)) (running b) (running c)')
+        self.assertTrue(s.holds(Clause('type', ['x', 'c'])))
+        self.assertFalse(s.holds(Clause('type', ['x', 'd'])))
+        self.assertFalse(s.hasClause(Clause('type', ['x', 'c'])))
+        self.assertTrue(s.holds(Clause('running', ['b'])))
+        self.assertEquals(set([Clause('running', ['b']), Clause('running', ['c'])]),
+                          set(s.forAllMatches(Clause('running', ['_ALL_'], forall=True))))
+        self.assertEquals([Clause('running', ['a'], negated=True)],
+                          list(s.forAllMatches(Clause('running', ['_ALL_'], negated=True, forall=True))))
+
+        expansions = s.iterForAlls(['x', 'y'])
+        self.assertEquals(Clause('type', ['x', 'c']), next(expansions))
+        self.assertEquals([Clause('type', ['y', 'c'])], list(expansions))
+
+        t = s.successor([Clause('type', ['_ALL_', 'd'], forall=True)], [Clause('type', ['_ALL_', 'c'], forall=True)])
+        self.assertTrue(t.holds(Clause('type', ['x', 'd'])))
+        self.assertFalse(t.holds(Clause('type', ['x', 'c'])))
+        self.assertTrue(s.holds(Clause('type', ['x', 'c'])))
+
+    def test_ground_parameters(self):
+        template = SymbolicState.createFromString('(type ?x ?y) (not (running ?x))')
+        s = template.copy()
+        s.groundParameters({'?x': 'a', '?y': 'b'})
+        self.assertEquals(SymbolicState.createFromString('(type a b) (not (running a))'), s)
+        # grounding a copy leaves the shared clauses of the original alone
+        self.assertTrue(template.hasClause(Clause('type', ['?x', '?y'])))
+        self.assertRaises(StateError, template.copy().groundParameters, {'?x': 'a'})
+
+    def test_expand_foralls(self):
+        s = SymbolicState.createFromString('(forall (?o) (not (running ?o))) (type a b)')
+        s.expandForAlls(['a', 'b'])
+        self.assertEquals(SymbolicState.createFromString('(type a b) (not (running a)) (not (running b))'), s)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_state', TestSymbolicState)
@@ -11,7 +11,8 @@ class FIFOTaskExecutor(AbstractTaskExecutor):
         # init node first, must be done before call to super init for service advertising to work
         rospy.init_node("task_executor", log_level=rospy.DEBUG)
         # init superclasses
-        super( FIFOTaskExecutor, self ).__init__()
+        super( FIFOTaskExecutor, self ).__init__(rospy.get_param('~duration_factor', 2.0), rospy.get_param('~trace_capacity', 10000),
+                                                 rospy.get_param('~trace_file', None))
         self.tasks = Queue()
         self.advertise_services()
 
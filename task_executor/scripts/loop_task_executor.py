@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+
+import rospy
+from task_executor.duration_model import DurationModel
+from task_executor.execution_schedule import ExecutionSchedule
+from task_executor.loop_executor import LoopTaskExecutor, ConcurrentTaskExecutor
+
+if __name__ == '__main__':
+    # init node first, must be done before construction for service advertising to work
+    rospy.init_node("task_executor", log_level=rospy.DEBUG)
+    # run tasks which need different resources at the same time
+    executor_class = ConcurrentTaskExecutor if rospy.get_param('~concurrent', False) else LoopTaskExecutor
+    executor = executor_class(duration_model=DurationModel.from_params(),
+                              duration_factor=rospy.get_param('~duration_factor', 2.0),
+                              trace_capacity=rospy.get_param('~trace_capacity', 10000),
+                              trace_file=rospy.get_param('~trace_file', None),
+                              execution_policy=rospy.get_param('~execution_policy', ExecutionSchedule.START_AFTER),
+                              max_advance=rospy.Duration.from_sec(rospy.get_param('~max_advance', 60 * 10)))
+    # durations recorded since the last periodic save
+    rospy.on_shutdown(executor.save_durations)
+    rospy.spin()
@@ -1,13 +1,20 @@
 #!/usr/bin/env python
 
+import os
+import rospkg
 import rospy
-from strands_executive_msgs.msg import Task
-from strands_executive_msgs.srv import AddTasks, AddTask, SetExecutionStatus, GetExecutionStatus
+from std_srvs.srv import Empty
+from strands_executive_msgs.msg import Task, TaskEvent
+from strands_executive_msgs.srv import AddTasks, AddTask, CancelTask, UpdateTask, SetExecutionStatus, GetExecutionStatus
 import ros_datacentre.util as dc_util
 import actionlib
+from actionlib_msgs.msg import GoalStatus
 from geometry_msgs.msg import Pose, Point, Quaternion
 from ros_datacentre.message_store import MessageStoreProxy
 from topological_navigation.msg import GotoNodeAction, GotoNodeGoal
+from threading import RLock
+from task_executor.watchdogs import Watchdogs
+from task_executor.tracing import Tracer
 
 class AbstractTaskExecutor(object):
 
@@ -28,21 +35,70 @@ class AbstractTaskExecutor(object):
         """ Called when the given task has completed execution """
         pass
 
+    def action_complete(self, task, goal_status, duration):
+        """ Called when the action of the given task has finished with goal_status, after running for duration """
+        pass
+
+    def task_failed(self, task):
+        """ Called when the given task has failed, for example because its action ran for too long. By default this is treated as completion. """
+        self.task_complete(task)
+
+    def task_cancelled(self, task):
+        """ Called when the given task was cancelled while it was executing. By default this is treated as completion. """
+        self.task_complete(task)
+
+    def cancel_task(self, task_id):
+        """ Called to remove the task with the given id from execution. Returns True if the task was cancelled. """
+        return False
+
+    def update_task(self, task):
+        """ Called with a changed version of a task which has already been added. Returns True if the task was updated. """
+        return False
 
-    def __init__(self):
+
+    def __init__(self, duration_factor=2.0, trace_capacity=10000, trace_file=None):
         self.task_counter = 1
-        self.msg_store = MessageStoreProxy() 
+        self._msg_store = None
         self.executing = False
         self.active_task = None
         self.active_task_id = Task.NO_TASK
         self.nav_client = None
-
+        self.action_client = None
+        # when the active task's action goal was sent
+        self.action_start_time = None
+        # true once cancel_active_task has been called for the active task
+        self.cancel_requested = False
+        # an action running for longer than its expected_duration multiplied by this is preempted. zero or less disables this
+        self.duration_factor = duration_factor
+        self._watchdogs = None
+        # held while the active task is changed by goal callbacks or watchdogs
+        self.active_lock = RLock()
+        # the most recent events in the execution of tasks, and where the dump_trace service writes them
+        self.tracer = Tracer(trace_capacity)
+        if trace_file is None:
+            trace_file = os.path.join(rospkg.get_ros_home(), 'task_trace.json')
+        self.trace_file = trace_file
         
 
+    @property
+    def watchdogs(self):
+        """ The Watchdogs which time out task actions, created on first use. """
+        if self._watchdogs is None:
+            self._watchdogs = Watchdogs()
+        return self._watchdogs
+
+    @property
+    def msg_store(self):
+        """ The message store used to look up task arguments, created on first use. """
+        if self._msg_store is None:
+            self._msg_store = MessageStoreProxy()
+        return self._msg_store
+
     def advertise_services(self):
         """
-        Adverstise ROS services. Only call at the end of constructor to avoid calls during construction.
+        Adverstise ROS services, and the topic task events are published on. Only call at the end of constructor to avoid calls during construction.
         """
+        self.advertise_events()
         # advertise ros services
         for attr in dir(self):
             if attr.endswith("_ros_srv"):
@@ -50,6 +106,11 @@ class AbstractTaskExecutor(object):
                 rospy.Service("/task_executor/" + attr[:-8], service.type, service)
 
 
+    def advertise_events(self):
+        """ Advertises the topic the tracer publishes task events on. Called by advertise_services. """
+        self.tracer.publisher = rospy.Publisher('/task_executor/events', TaskEvent, queue_size=100)
+
+
     def get_task_types(self, action_name):
         """ 
         Returns the type string related to the action string provided.
@@ -63,8 +124,10 @@ class AbstractTaskExecutor(object):
 
 
     def execute_task(self, task):
+        self.tracer.record(TaskEvent.DISPATCHED, task.task_id)
         self.active_task = task
         self.active_task_id = task.task_id               
+        self.cancel_requested = False
         if self.active_task.start_node_id != '':                    
             self.start_task_navigation()
         elif self.active_task.action != '':                    
@@ -94,7 +157,49 @@ class AbstractTaskExecutor(object):
         goal = goal_clz(*argument_list)         
 
         rospy.logdebug('Sending goal to %s' % self.active_task.action)
-        client.send_goal(goal, self.task_execution_complete_cb)
+        self.action_start_time = rospy.get_rostime()
+        self.tracer.record(TaskEvent.ACTION_STARTED, self.active_task_id, self.active_task.action)
+        client.send_goal(goal, self.if_active(self.task_execution_complete_cb))
+        self.action_client = client
+        self.watch_task(self.active_task)
+
+    def get_task_timeout(self, task):
+        """ Returns how long the task's action can run before it is preempted, or None if it can run for as long as it takes. """
+        if self.duration_factor <= 0 or task.expected_duration.is_zero():
+            return None
+        return task.expected_duration * self.duration_factor
+
+    def watch_task(self, task):
+        """ Starts a watchdog which preempts the task, and fails it, if its action is still running once its timeout has passed. """
+        timeout = self.get_task_timeout(task)
+        if timeout is not None:
+            self.watchdogs.start(task.task_id, rospy.get_rostime() + timeout, lambda: self.task_timed_out(task))
+
+    def task_timed_out(self, task):
+        with self.active_lock:
+            # the task may have completed just as the watchdog fired
+            if self.active_task is not task:
+                return
+            rospy.logwarn('Task %s ran for longer than %s seconds, preempting it' % (task.task_id, self.get_task_timeout(task).to_sec()))
+            if self.action_client is not None:
+                self.action_client.cancel_goal()
+            self.action_client = None
+            self.active_task = None
+            self.active_task_id = Task.NO_TASK
+            self.task_failed(task)
+
+    def if_active(self, callback):
+        """
+        Wraps an actionlib done callback for the active task so that it is ignored if it arrives once the task is no longer active,
+        as happens when a preempted goal finishes after its watchdog has failed the task.
+        """
+        task = self.active_task
+
+        def active_callback(goal_status, result):
+            with self.active_lock:
+                if self.active_task is task:
+                    callback(goal_status, result)
+        return active_callback
         
     def start_task_navigation(self):
         # handle delayed start up
@@ -104,23 +209,53 @@ class AbstractTaskExecutor(object):
             rospy.logdebug("Created action client")
 
         nav_goal = GotoNodeGoal(target = self.active_task.start_node_id)
-        self.nav_client.send_goal(nav_goal, self.navigation_complete_cb)
+        self.tracer.record(TaskEvent.NAVIGATION_STARTED, self.active_task_id, self.active_task.start_node_id)
+        self.nav_client.send_goal(nav_goal, self.if_active(self.navigation_complete_cb))
         rospy.logdebug("navigating to %s" % nav_goal)
 
+    def cancel_active_task(self):
+        """
+        Preempts the navigation or action goal of the active task. The completion callbacks then finish the task as cancelled.
+        """
+        if self.active_task is None:
+            return False
+        rospy.loginfo('Cancelling active task %s' % self.active_task_id)
+        self.cancel_requested = True
+        if self.nav_client is not None:
+            self.nav_client.cancel_goal()
+        if self.action_client is not None:
+            self.action_client.cancel_goal()
+        return True
+
     def navigation_complete_cb(self, goal_status, result):
-        # todo: check goal status to see if we really go there
-        # now do the action
         rospy.logdebug('Navigation to %s completed' % self.active_task.start_node_id)        
-        if self.active_task.action != '':                    
-            self.start_task_action()
+        self.tracer.record(TaskEvent.NAVIGATION_FINISHED, self.active_task_id, str(goal_status))
+        task = self.active_task
+        if goal_status == GoalStatus.SUCCEEDED and not self.cancel_requested:
+            # now do the action
+            if task.action != '':                    
+                self.start_task_action()
+                return
+            self.task_complete(task)
+        elif self.cancel_requested:
+            self.task_cancelled(task)
         else:
-            self.task_complete(self.active_task)
-            self.active_task = None
-            self.active_task_id = Task.NO_TASK
+            rospy.logwarn('Navigation to %s ended with status %s' % (task.start_node_id, goal_status))
+            self.task_failed(task)
+        self.active_task = None
+        self.active_task_id = Task.NO_TASK
 
 
     def task_execution_complete_cb(self, goal_status, result):
-        self.task_complete(self.active_task)
+        if self._watchdogs is not None:
+            self._watchdogs.stop(self.active_task_id)
+        self.tracer.record(TaskEvent.ACTION_FINISHED, self.active_task_id, str(goal_status))
+        self.action_complete(self.active_task, goal_status, rospy.get_rostime() - self.action_start_time)
+        self.action_client = None
+        if self.cancel_requested:
+            self.task_cancelled(self.active_task)
+        else:
+            self.task_complete(self.active_task)
         self.active_task = None
         self.active_task_id = Task.NO_TASK
 
@@ -152,6 +287,32 @@ class AbstractTaskExecutor(object):
     add_tasks_ros_srv.type=AddTasks
 
 
+    def cancel_task_ros_srv(self, req):
+        """
+        Cancels the task with the given id, whether it is waiting for execution or is executing.
+        """
+        return self.cancel_task(req.task_id)
+    cancel_task_ros_srv.type=CancelTask
+
+
+    def update_task_ros_srv(self, req):
+        """
+        Replaces a task which has previously been added with the given version. The task_id of the task must be set.
+        """
+        return self.update_task(req.task)
+    update_task_ros_srv.type=UpdateTask
+
+
+
+    def dump_trace_ros_srv(self, req):
+        """
+        Writes the recorded task events and stage latencies to the ~trace_file.
+        """
+        rospy.loginfo('Writing task trace to %s' % self.trace_file)
+        self.tracer.dump(self.trace_file)
+        return []
+    dump_trace_ros_srv.type = Empty
+
 
     def get_execution_status_ros_srv(self, req):
         return self.executing
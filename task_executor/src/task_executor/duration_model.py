@@ -0,0 +1,211 @@
+from threading import Lock, RLock
+import math
+import os
+import struct
+
+import rospkg
+import rospy
+
+
+class DurationSketch(object):
+    """
+    A streaming summary of durations, in seconds, which answers quantile queries to within a relative error of accuracy. Samples are counted in
+    buckets whose bounds grow geometrically, so its size grows with the log of the range of the durations rather than with the number of samples.
+
+    Args:
+        accuracy (float): The relative error of quantiles. Defaults to 2%.
+        min_secs (float): Shorter durations are counted in the bucket for this, so that every sample has one. Defaults to MIN_SECS.
+    """
+
+    MIN_SECS = 0.001
+
+    def __init__(self, accuracy=0.02, min_secs=MIN_SECS):
+        self.accuracy = accuracy
+        self.min_secs = min_secs
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # sample counts indexed by bucket, where bucket i holds durations in (gamma^(i-1), gamma^i]
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, secs):
+        """ Adds a duration in seconds. """
+        index = int(math.ceil(math.log(max(secs, self.min_secs)) / self.log_gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += secs
+        self.min = secs if self.min is None else min(self.min, secs)
+        self.max = secs if self.max is None else max(self.max, secs)
+
+    def quantile(self, q):
+        """ Returns the duration in seconds below which the fraction q of the samples fall, or None if there are none. """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        # the middle of the bucket by relative error
+        value = 2 * self.gamma ** index / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class DurationModel(object):
+    """
+    Learns how long task actions take from the durations recorded for each (action, start_node_id), to estimate expected_duration for tasks which
+    arrive without one. Estimates fall back to the durations recorded for the action at any node when too few have been recorded at the task's node.
+
+    Args:
+        filename (str): The file the model is kept in between runs. If None the model is only kept in memory.
+        quantile (float): The quantile of the recorded durations used as the estimate. Higher values make tasks less likely to overrun at the cost of
+            emptier schedules. Defaults to 0.8.
+        min_samples (int): How many durations must have been recorded before an estimate is made. Defaults to 3.
+        accuracy (float): The relative accuracy of the DurationSketch for each key. Defaults to 2%.
+    """
+
+    # identifies the file format, followed by its version
+    MAGIC = 'TEDURATN'
+    VERSION = 1
+
+    def __init__(self, filename=None, quantile=0.8, min_samples=3, accuracy=0.02):
+        self.filename = filename
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.accuracy = accuracy
+        # DurationSketch indexed by (action, start_node_id), with a start_node_id of '' for the action at any node
+        self.sketches = {}
+        # how many durations have been recorded since the model was last saved
+        self.unsaved = 0
+        # durations are recorded and estimated from ros callbacks while the model may be being saved from another thread
+        self.lock = RLock()
+        # held while the file is written, so saves from different threads do not share the temporary file
+        self.save_lock = Lock()
+        if filename is not None:
+            self.load()
+
+    @classmethod
+    def from_params(cls):
+        """ Creates a model configured from the ~duration_store, ~duration_quantile and ~duration_min_samples parameters. """
+        filename = rospy.get_param('~duration_store', os.path.join(rospkg.get_ros_home(), 'task_durations'))
+        if filename == '':
+            filename = None
+        return cls(filename, rospy.get_param('~duration_quantile', 0.8), rospy.get_param('~duration_min_samples', 3))
+
+    def _keys(self, task):
+        if task.start_node_id == '':
+            return [(task.action, '')]
+        return [(task.action, task.start_node_id), (task.action, '')]
+
+    def record(self, task, duration):
+        """ Records that the task's action took duration, a rospy.Duration. This is not saved until save is called. """
+        with self.lock:
+            for key in self._keys(task):
+                sketch = self.sketches.get(key)
+                if sketch is None:
+                    sketch = DurationSketch(self.accuracy)
+                    self.sketches[key] = sketch
+                sketch.add(duration.to_sec())
+            self.unsaved += 1
+
+    def estimate(self, task):
+        """ Returns the estimated duration of the task's action as a rospy.Duration, or None if too few durations have been recorded for it. """
+        with self.lock:
+            for key in self._keys(task):
+                sketch = self.sketches.get(key)
+                if sketch is not None and sketch.count >= self.min_samples:
+                    return rospy.Duration.from_sec(sketch.quantile(self.quantile))
+        return None
+
+    def needs_save(self):
+        """ Returns True if the model has a file and durations have been recorded since it was last saved. """
+        return self.filename is not None and self.unsaved > 0
+
+    def save(self):
+        """
+        Writes the model to its file, through a temporary file so that a reader never sees it half written. This blocks on file I/O, so should
+        not be called from threads which need to respond quickly.
+        """
+        if self.filename is None:
+            return
+        with self.save_lock:
+            with self.lock:
+                data = self.dumps()
+                self.unsaved = 0
+            directory = os.path.dirname(self.filename)
+            temporary = '%s.%d' % (self.filename, os.getpid())
+            try:
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(temporary, 'wb') as f:
+                    f.write(data)
+                os.rename(temporary, self.filename)
+            except (IOError, OSError), e:
+                rospy.logwarn('Could not write task durations to %s: %s' % (self.filename, e))
+
+    def load(self):
+        """ Reads the model from its file. A missing or unreadable file leaves the model empty. """
+        try:
+            with open(self.filename, 'rb') as f:
+                self.sketches = self.loads(f.read())
+        except IOError:
+            pass
+        except (ValueError, struct.error), e:
+            rospy.logwarn('Ignoring unreadable task durations in %s: %s' % (self.filename, e))
+
+    def dumps(self):
+        """
+        Returns the sketches packed as a string: the magic and version, the number of sketches, then for each its action and start node as
+        length prefixed strings, its accuracy, count, total, min and max, and its buckets as (index, count) pairs.
+        """
+        with self.lock:
+            parts = [self.MAGIC, struct.pack('<HI', self.VERSION, len(self.sketches))]
+            for (action, node), sketch in sorted(self.sketches.iteritems()):
+                for name in (action, node):
+                    if isinstance(name, unicode):
+                        name = name.encode('utf-8')
+                    parts.append(struct.pack('<H', len(name)))
+                    parts.append(name)
+                parts.append(struct.pack('<dQdddI', sketch.accuracy, sketch.count, sketch.total, sketch.min, sketch.max, len(sketch.buckets)))
+                for index in sorted(sketch.buckets):
+                    parts.append(struct.pack('<iI', index, sketch.buckets[index]))
+            return ''.join(parts)
+
+    @classmethod
+    def loads(cls, data):
+        """ Returns the sketches from a string made by dumps. Raises ValueError if it is not one. """
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError('not a task duration file')
+        offset = len(cls.MAGIC)
+        version, entries = struct.unpack_from('<HI', data, offset)
+        if version != cls.VERSION:
+            raise ValueError('unsupported version %s' % version)
+        offset += struct.calcsize('<HI')
+
+        sketches = {}
+        for n in xrange(entries):
+            names = []
+            for i in range(2):
+                length, = struct.unpack_from('<H', data, offset)
+                offset += 2
+                names.append(data[offset:offset + length])
+                offset += length
+            accuracy, count, total, smallest, largest, buckets = struct.unpack_from('<dQdddI', data, offset)
+            offset += struct.calcsize('<dQdddI')
+            sketch = DurationSketch(accuracy)
+            sketch.count, sketch.total, sketch.min, sketch.max = count, total, smallest, largest
+            for i in xrange(buckets):
+                index, samples = struct.unpack_from('<iI', data, offset)
+                offset += 8
+                sketch.buckets[index] = samples
+            sketches[tuple(names)] = sketch
+        return sketches
@@ -0,0 +1,437 @@
+"""
+A single threaded event loop for the executor, in the style of asyncio (which is not available in Python 2).
+
+Everything the executor does runs as a callback on the loop, so callbacks never race with each other. Other threads, such as
+actionlib and ros service threads, hand work to the loop with call_soon_threadsafe. Results which arrive later are Futures, and
+a generator can wait for a Future by yielding it when run with spawn, so a sequence of actions reads as one function:
+
+    def go_and_act(loop, nav_client, nav_goal, action_client, goal):
+        status, result = yield send_goal(loop, nav_client, nav_goal)
+        status, result = yield with_timeout(loop, send_goal(loop, action_client, goal), rospy.Duration(60))
+        raise Return(result)
+
+    spawn(loop, go_and_act(loop, ...))
+"""
+from collections import deque
+from itertools import count
+from threading import Condition, Event, Thread, current_thread
+import heapq
+
+import rospy
+
+
+class CancelledError(Exception):
+    """ Raised when waiting for a Future which has been cancelled. """
+
+
+class TimeoutError(Exception):
+    """ Raised when waiting for a Future from with_timeout which did not complete in time. """
+
+
+class Return(Exception):
+    """ Raised by a coroutine to finish with a result, as Python 2 generators cannot return values. """
+
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class Handle(object):
+    """ A callback scheduled on the loop, which can be cancelled until it has run. """
+
+    __slots__ = ('callback', 'args', 'cancelled')
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            self.callback(*self.args)
+        except Exception, e:
+            rospy.logerr('Exception in event loop callback %s: %s' % (self.callback, e))
+
+
+class EventLoop(object):
+    """
+    Runs callbacks one at a time, as soon as possible or once the ros time passes a deadline.
+
+    Args:
+        max_wait (float): While a deadline is pending, the longest wall clock time in seconds to wait before rechecking the ros time,
+            which bounds latency under simulated time. With nothing pending the loop sleeps until it is given work.
+    """
+
+    def __init__(self, max_wait=0.5):
+        self.max_wait = max_wait
+        self._ready = deque()
+        # heap of (deadline, sequence, handle)
+        self._timers = []
+        self._sequence = count()
+        # callbacks from other threads, moved to _ready by the loop
+        self._condition = Condition()
+        self._pending = deque()
+        self._running = False
+        self._thread = None
+
+    def time(self):
+        """ The current time of the loop's clock. """
+        return rospy.get_rostime()
+
+    def call_soon(self, callback, *args):
+        """ Schedules the callback to run on the next pass of the loop. Must be called from the loop. Returns a Handle. """
+        handle = Handle(callback, args)
+        self._ready.append(handle)
+        return handle
+
+    def call_soon_threadsafe(self, callback, *args):
+        """ As call_soon, but can be called from any thread, waking the loop if it is waiting. """
+        handle = Handle(callback, args)
+        with self._condition:
+            self._pending.append(handle)
+            self._condition.notify()
+        return handle
+
+    def call_at(self, when, callback, *args):
+        """ Schedules the callback to run once the loop's time reaches when, a rospy.Time. Must be called from the loop. """
+        handle = Handle(callback, args)
+        heapq.heappush(self._timers, (when, next(self._sequence), handle))
+        return handle
+
+    def call_later(self, delay, callback, *args):
+        """ Schedules the callback to run after delay, a rospy.Duration. Must be called from the loop. """
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def run_in_executor(self, function, *args):
+        """ Runs a blocking function, such as a service call, on its own thread. Returns a Future for its result. """
+        future = Future(self)
+
+        def run():
+            try:
+                result = function(*args)
+            except Exception, e:
+                self.call_soon_threadsafe(future._set_if_pending, None, e)
+            else:
+                self.call_soon_threadsafe(future._set_if_pending, result, None)
+
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def is_running(self):
+        """ True from when the loop is started until it stops. """
+        return self._running
+
+    def in_loop(self):
+        """ True if called from the loop's thread. """
+        return self._thread is current_thread()
+
+    def run_sync(self, function, *args):
+        """ Calls function on the loop and returns its result, blocking if called from another thread while the loop runs. """
+        if not self.is_running() or self.in_loop():
+            return function(*args)
+        future = Future(self)
+
+        def call():
+            try:
+                future.set_result(function(*args))
+            except Exception, e:
+                future.set_exception(e)
+
+        self.call_soon_threadsafe(call)
+        return future.result()
+
+    def run_once(self):
+        """ Runs the callbacks which are ready and the timers which are due. Returns the deadline of the next timer, or None. """
+        if len(self._pending) > 0:
+            with self._condition:
+                self._ready.extend(self._pending)
+                self._pending.clear()
+
+        if len(self._timers) > 0:
+            now = self.time()
+            while len(self._timers) > 0 and self._timers[0][0] <= now:
+                handle = heapq.heappop(self._timers)[2]
+                if not handle.cancelled:
+                    self._ready.append(handle)
+
+        # callbacks added while running these wait for the next pass
+        for n in xrange(len(self._ready)):
+            handle = self._ready.popleft()
+            if not handle.cancelled:
+                handle.run()
+
+        while len(self._timers) > 0 and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if len(self._timers) > 0 else None
+
+    def run_forever(self):
+        """ Runs the loop on this thread until stop is called or ros shuts down. """
+        self._thread = current_thread()
+        self._running = True
+        try:
+            while self._running and not rospy.is_shutdown():
+                deadline = self.run_once()
+                if self._running and len(self._ready) == 0:
+                    self._idle(deadline)
+        finally:
+            self._running = False
+
+    def start(self):
+        """ Runs the loop on a new daemon thread. """
+        thread = Thread(target=self.run_forever)
+        thread.daemon = True
+        self._running = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        """ Stops the loop after the current pass. Can be called from any thread. """
+        self.call_soon_threadsafe(self._stop)
+
+    def _stop(self):
+        self._running = False
+
+    def _idle(self, deadline):
+        """ Waits for work from another thread, or until the deadline passes. """
+        with self._condition:
+            if len(self._pending) > 0:
+                return
+            if deadline is None:
+                # bounded so that ros shutdown is noticed
+                self._condition.wait(60)
+            else:
+                remaining = (deadline - self.time()).to_sec()
+                if remaining > 0:
+                    self._condition.wait(min(remaining, self.max_wait))
+
+
+class Future(object):
+    """
+    The result of something which completes later. Callbacks added with add_done_callback are run on the loop once it completes.
+    Apart from result, which other threads can block on, its methods must be called from the loop.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._done = Event()
+        self._cancelled = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """ Cancels the future if it is not done. Returns True if it was cancelled. """
+        if self.done():
+            return False
+        self._cancelled = True
+        self._finish()
+        return True
+
+    def set_result(self, result):
+        if self.done():
+            raise RuntimeError('Future is already done')
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        if self.done():
+            raise RuntimeError('Future is already done')
+        self._exception = exception
+        self._finish()
+
+    def _set_if_pending(self, result, exception):
+        # results arriving after a cancel are dropped
+        if not self.done():
+            if exception is not None:
+                self.set_exception(exception)
+            else:
+                self.set_result(result)
+
+    def _finish(self):
+        self._done.set()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self.loop.call_soon(callback, self)
+
+    def add_done_callback(self, callback):
+        """ Calls callback with this future on the loop once it is done. """
+        if self.done():
+            self.loop.call_soon(callback, self)
+        else:
+            self._callbacks.append(callback)
+
+    def exception(self):
+        if self._cancelled:
+            raise CancelledError()
+        return self._exception
+
+    def result(self, timeout=None):
+        """ Returns the result, raising the exception if there was one. From another thread, blocks until it is done. """
+        if not self.done():
+            if self.loop.in_loop():
+                raise RuntimeError('Future is not done, yield it from a coroutine instead of blocking the loop')
+            if not self._done.wait(timeout):
+                raise TimeoutError()
+        if self._cancelled:
+            raise CancelledError()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class Coroutine(Future):
+    """ Runs a generator on the loop, resuming it with the result of each Future it yields. Completes when the generator does. """
+
+    def __init__(self, loop, generator):
+        super(Coroutine, self).__init__(loop)
+        self.generator = generator
+        self._waiting = None
+        # set when cancel is called while the generator is not waiting on a future, to cancel the next one it yields
+        self._cancel_requested = False
+        loop.call_soon(self._step, None, None)
+
+    def cancel(self):
+        """
+        Cancels the future the generator is waiting on, which raises CancelledError inside it. If it has not yet started, it runs up to its
+        first yield and the future it yields is cancelled, so that its exception handlers and finally blocks always run.
+        """
+        if self.done():
+            return False
+        if self._waiting is not None:
+            return self._waiting.cancel()
+        self._cancel_requested = True
+        return True
+
+    def _step(self, value, exception):
+        if self.done():
+            return
+        self._waiting = None
+        try:
+            if exception is not None:
+                yielded = self.generator.throw(exception)
+            else:
+                yielded = self.generator.send(value)
+        except StopIteration:
+            self.set_result(None)
+        except Return, r:
+            self.set_result(r.value)
+        except CancelledError:
+            super(Coroutine, self).cancel()
+        except Exception, e:
+            self.set_exception(e)
+        else:
+            if not isinstance(yielded, Future):
+                self.set_exception(TypeError('Coroutines must yield Futures, not %r' % (yielded,)))
+                self.generator.close()
+                return
+            self._waiting = yielded
+            yielded.add_done_callback(self._wakeup)
+            # a future which is already done cannot be cancelled, so the request waits for the next one
+            if self._cancel_requested and yielded.cancel():
+                self._cancel_requested = False
+
+    def _wakeup(self, future):
+        if future.cancelled():
+            self._step(None, CancelledError())
+        elif future._exception is not None:
+            self._step(None, future._exception)
+        else:
+            self._step(future._result, None)
+
+
+def spawn(loop, generator):
+    """ Runs a generator as a coroutine on the loop. Returns its Future. """
+    return Coroutine(loop, generator)
+
+
+def with_timeout(loop, future, timeout):
+    """ Returns a Future for the result of future, which fails with TimeoutError, cancelling future, if timeout passes first. """
+    outer = Future(loop)
+
+    def expired():
+        if not outer.done():
+            outer.set_exception(TimeoutError())
+            future.cancel()
+
+    handle = loop.call_later(timeout, expired)
+
+    def completed(inner):
+        handle.cancel()
+        if outer.done():
+            return
+        if inner.cancelled():
+            outer.cancel()
+        else:
+            outer._set_if_pending(inner._result, inner._exception)
+
+    future.add_done_callback(completed)
+    outer.add_done_callback(lambda f: f.cancelled() and future.cancel())
+    return outer
+
+
+def send_goal(loop, client, goal):
+    """
+    Sends a goal with an actionlib SimpleActionClient. Returns a Future for (goal status, result), set on the loop when the goal
+    finishes. Cancelling the future cancels the goal.
+    """
+    future = Future(loop)
+
+    def done_cb(goal_status, result):
+        # called from an actionlib thread
+        loop.call_soon_threadsafe(future._set_if_pending, (goal_status, result), None)
+
+    client.send_goal(goal, done_cb)
+
+    def cancelled(f):
+        if f.cancelled():
+            client.cancel_goal()
+
+    future.add_done_callback(cancelled)
+    return future
+
+
+class LoopTimer(object):
+    """
+    Stands in for DeadlineTimer in an ExecutionSchedule, calling callback on the loop once the deadline passes, rather than from a
+    thread of its own.
+    """
+
+    def __init__(self, loop, callback):
+        self.loop = loop
+        self.callback = callback
+        self.deadline = None
+        self.handle = None
+
+    def arm(self, deadline):
+        """ Sets the time at which the callback is triggered, cancelling any previous deadline. """
+        self.cancel()
+        self.deadline = deadline
+        self.handle = self.loop.call_at(deadline, self._fire)
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+        self.deadline = None
+        self.handle = None
+
+    def is_armed(self):
+        return self.deadline is not None
+
+    def shutdown(self):
+        self.cancel()
+
+    def _fire(self):
+        self.deadline = None
+        self.handle = None
+        self.callback()
@@ -1,72 +1,265 @@
 from strands_executive_msgs.msg import Task
-from threading import Event
-from copy import deepcopy
+from threading import Event, RLock, Condition, Thread
+from copy import copy, deepcopy
 from Queue import Queue, Empty
 from collections import deque
+from operator import attrgetter
+import heapq
 
 import rospy
 
-# def enum(*sequential, **named):
-#     """ 
-#     Pre-v3 emum support from http://stackoverflow.com/questions/36932/how-can-i-represent-an-enum-in-python
-#     """
-#     enums = dict(zip(sequential, range(len(sequential))), **named)
-#     return type('Enum', (), enums)
 
-# ExecutionStatus = enum('ZERO', 'ONE', 'TWO')
+
+class DeadlineTimer(object):
+    """
+    A single re-armable timer which calls callback once the ros time passes the armed deadline.
+    Arming replaces any previous deadline, so at most one expiry is ever pending. The callback is run from the timer's own thread.
+
+    Args:
+        callback (function): Called with no arguments when the deadline passes.
+        max_wait (float): The longest wall clock time in seconds to wait before rechecking the ros time, which bounds latency under simulated time.
+    """
+    def __init__(self, callback, max_wait=0.5):
+        super(DeadlineTimer, self).__init__()
+        self.callback = callback
+        self.max_wait = max_wait
+        self.deadline = None
+        self.running = True
+        self.condition = Condition()
+        self.thread = Thread(target=self._wait_for_deadlines)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def arm(self, deadline):
+        """ Sets the time at which the callback is triggered, cancelling any previous deadline. """
+        with self.condition:
+            self.deadline = deadline
+            self.condition.notify()
+
+    def cancel(self):
+        """ Cancels the pending deadline, if any. """
+        with self.condition:
+            self.deadline = None
+            self.condition.notify()
+
+    def is_armed(self):
+        return self.deadline is not None
+
+    def shutdown(self):
+        """ Stops the timer thread. The timer cannot be used afterwards. """
+        with self.condition:
+            self.running = False
+            self.deadline = None
+            self.condition.notify()
+        self.thread.join()
+
+    def _wait_for_deadlines(self):
+        while self.running and not rospy.is_shutdown():
+            with self.condition:
+                if not self.running:
+                    break
+
+                if self.deadline is None:
+                    self.condition.wait(self.max_wait)
+                    continue
+
+                remaining = (self.deadline - rospy.get_rostime()).to_sec()
+                if remaining > 0:
+                    self.condition.wait(min(remaining, self.max_wait))
+                    continue
+
+                self.deadline = None
+
+            self.callback()
+
 
 class ExecutionSchedule(object):
+    """
+    Manages the tasks waiting for execution and the order the scheduler has put them in.
+
+    Args:
+        policy (str): When the head of the schedule is dispatched. One of START_AFTER, EXECUTION_TIME or SLACK. Defaults to START_AFTER.
+        max_advance (rospy.Duration): For the SLACK policy, the furthest a task can be dispatched ahead of its scheduled execution_time. Defaults to 10 minutes.
+        timer_factory (function): Creates the dispatch timer when called with a callback. Defaults to DeadlineTimer.
+    """
+
+    # dispatch as soon as the task's start window is open, ignoring the scheduled time
+    START_AFTER = 'start_after'
+    # dispatch at the execution_time chosen by the scheduler
+    EXECUTION_TIME = 'execution_time'
+    # dispatch ahead of the execution_time by up to max_advance, but never before the start window opens
+    SLACK = 'slack'
+
+    POLICIES = [START_AFTER, EXECUTION_TIME, SLACK]
 
-    def __init__(self):
-    	self.current_task = None
-    	self.execution_change = Event()
-    	self.execution_queue = deque()
-    	self.tasks = []        
+    def __init__(self, policy=START_AFTER, max_advance=rospy.Duration(60 * 10), timer_factory=DeadlineTimer):
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown execution policy %s, should be one of %s' % (policy, self.POLICIES))
+        self.policy = policy
+        self.max_advance = max_advance
+        self.current_task = None
+        self.execution_change = Event()
+        self.execution_queue = deque()
+        # tasks which are available for scheduling, indexed by task id
+        self.tasks = {}
+        # tasks which have been updated since they were added, indexed by task id. These replace the versions in the execution queue, which
+        # may have been scheduled before the update
+        self.updated = {}
+        # heap of (latest start time, task id) used to find tasks which can no longer be completed in their window
+        self.deadlines = []
+        # true when the schedulable tasks have changed since they were last passed to the scheduler
+        self.dirty = False
+        # schedule is accessed by the scheduling and execution threads plus ros callbacks
+        self.lock = RLock()
+        # the one timer used to delay execution until the head of the queue can start
+        self.execution_timer = timer_factory(self.execution_delay_cb)
+
+    def _latest_start(self, task):
+        return task.end_before - task.expected_duration
+
+    def _index_task(self, task):
+        self.tasks[task.task_id] = task
+        heapq.heappush(self.deadlines, (self._latest_start(task), task.task_id))
 
     def add_new_tasks(self, tasks):
-    	""" Add new tasks to be scheduled. """
-    	self.tasks.extend(tasks)
+        """ Add new tasks to be scheduled. """
+        with self.lock:
+            for task in tasks:
+                self._index_task(task)
+            self.dirty = True
+
+    def cancel_task(self, task_id):
+        """
+        Removes the task with the given id from the schedule. Returns True if the task was waiting to be executed, False otherwise.
+        Stale entries in the execution queue and deadline heap are dropped when they reach the front.
+        """
+        with self.lock:
+            if self.tasks.pop(task_id, None) is None:
+                return False
+            self.updated.pop(task_id, None)
+            self.dirty = True
+            return True
+
+    def update_task(self, task):
+        """
+        Replaces the task which has the same id as the given task. Returns True if the task was waiting to be executed, False otherwise.
+        The task also replaces the version in the execution queue when that reaches the front, keeping its scheduled execution_time until the
+        schedule is recomputed.
+        """
+        with self.lock:
+            if task.task_id not in self.tasks:
+                return False
+            self._index_task(task)
+            self.updated[task.task_id] = task
+            self.dirty = True
+            return True
+
+    def _latest(self, queued):
+        """ Returns the latest version of a task from the execution queue, with the execution_time it was scheduled for. """
+        updated = self.updated.get(queued.task_id)
+        if updated is None or updated is queued:
+            return queued
+        latest = copy(updated)
+        latest.execution_time = queued.execution_time
+        return latest
+
+    def expire_tasks(self, now):
+        """
+        Removes all tasks which can no longer be completed before their end_before time if started at the given time. Returns the list of removed tasks.
+        """
+        expired = []
+        with self.lock:
+            while len(self.deadlines) > 0 and self.deadlines[0][0] < now:
+                latest_start, task_id = heapq.heappop(self.deadlines)
+                task = self.tasks.get(task_id)
+                # ignore entries for cancelled tasks or ones which have been updated since this entry was pushed
+                if task is not None and self._latest_start(task) == latest_start:
+                    del self.tasks[task_id]
+                    self.updated.pop(task_id, None)
+                    expired.append(task)
+            if len(expired) > 0:
+                self.dirty = True
+        return expired
+
+    def next_expiry(self):
+        """ Returns the earliest time after which expire_tasks could remove a task, or None if there are no tasks. This may be early if tasks have been cancelled or updated. """
+        with self.lock:
+            if len(self.deadlines) == 0:
+                return None
+            return self.deadlines[0][0]
+
+    def is_dirty(self):
+        """ Returns True if the tasks have changed since the last call to get_schedulable_tasks. """
+        return self.dirty
 
     def get_schedulable_tasks(self):
-    	""" Get the tasks which are available to be scheduled. Does not include the task being executed. """
-    	return deepcopy(self.tasks)
+        """ Get the tasks which are available to be scheduled. Does not include the task being executed. """
+        with self.lock:
+            self.dirty = False
+            return deepcopy(sorted(self.tasks.itervalues(), key=attrgetter('task_id')))
+
+    def _drop_cancelled(self):
+        """ Removes tasks from the head of the execution queue which are no longer schedulable. """
+        while len(self.execution_queue) > 0 and self.execution_queue[0].task_id not in self.tasks:
+            self.execution_queue.popleft()
 
     def execute_next_task(self):
         """
-        Sets the head of the execution queue to the current task, removes this from schedulable tasks, and notifies the wait_for_execution_change method. 
+        Sets the head of the execution queue to the current task, removes this from schedulable tasks, and notifies the wait_for_execution_change method.
         """
-        if len(self.execution_queue) > 0:
-            self.current_task = self.execution_queue.popleft()
-            # remove current task from schedulable tasks
-            print len(self.tasks)
-            self.tasks = [t for t in self.tasks if t.task_id != self.current_task.task_id]            
-            print len(self.tasks)
-            self.execution_change.set()
-        else:
-            self.current_task = None
+        with self.lock:
+            self._drop_cancelled()
+            if len(self.execution_queue) > 0:
+                self.current_task = self._latest(self.execution_queue.popleft())
+                # remove current task from schedulable tasks
+                del self.tasks[self.current_task.task_id]
+                self.updated.pop(self.current_task.task_id, None)
+                self.execution_change.set()
+            else:
+                self.current_task = None
 
-    def execution_delay_cb(self, event):
+    def execution_delay_cb(self):
         rospy.logdebug('timer for execution delay fired')
-        self.next_in_schedule()
+        with self.lock:
+            # the timer may have fired just as a task was started by other means
+            if self.current_task is None:
+                self.next_in_schedule()
+
+    def get_dispatch_time(self, task):
+        """ Returns the earliest time at which the given task should be passed for execution under the execution policy. """
+        if self.policy == self.START_AFTER:
+            return task.start_after
+        elif self.policy == self.EXECUTION_TIME:
+            return max(task.start_after, task.execution_time)
+        else:
+            # the scheduler's ordering is kept, so starting early only moves later tasks earlier
+            return max(task.start_after, task.execution_time - self.max_advance)
 
     def next_in_schedule(self):
         """
         Checks whether the next action can be executed now (i.e. the current time is within its constraints). If not, delays execution suitably.
         """
-        if len(self.execution_queue) > 0:
-            now = rospy.get_rostime()
-            next_task = self.execution_queue[0]
-
-            # if the start window is open
-            if next_task.start_after <= now:
-                rospy.logdebug('start window is open')
-                self.execute_next_task()
-            else:     
-                exe_delay = next_task.start_after - now
-                rospy.logdebug('need to delay %s.%s for execution' % (exe_delay.secs, exe_delay.nsecs))
-                self.execution_delay_timer = rospy.Timer(exe_delay, self.execution_delay_cb)
-        else:
-            self.current_task = None
+        with self.lock:
+            self._drop_cancelled()
+            if len(self.execution_queue) > 0:
+                now = rospy.get_rostime()
+                next_task = self.execution_queue[0] = self._latest(self.execution_queue[0])
+                dispatch_time = self.get_dispatch_time(next_task)
+
+                # if the start window is open
+                if dispatch_time <= now:
+                    rospy.logdebug('start window is open')
+                    self.execution_timer.cancel()
+                    self.execute_next_task()
+                else:
+                    exe_delay = dispatch_time - now
+                    rospy.logdebug('need to delay %s.%s for execution' % (exe_delay.secs, exe_delay.nsecs))
+                    # nothing is executing while we wait, so a new schedule can replace the head
+                    self.current_task = None
+                    self.execution_timer.arm(dispatch_time)
+            else:
+                self.execution_timer.cancel()
+                self.current_task = None
 
 
     def task_complete(self, task):
@@ -76,32 +269,48 @@ class ExecutionSchedule(object):
         # no time info yet
         self.next_in_schedule()
 
+    def task_failed(self, task):
+        """
+        Called instead of task_complete when the task did not complete, for example after it was preempted for running too long. As the
+        execution times of the remaining tasks were planned around it finishing on time, the schedule is marked dirty to be recomputed.
+        """
+        with self.lock:
+            self.dirty = True
+            self.task_complete(task)
+
 
     def set_schedule(self, scheduled_tasks):
-    	"""
-    	Receive a list of tasks in order of execution, with their execution times set.
-    	Returns true if the schedule was 
-    	"""
+        """
+        Receive a list of tasks in order of execution, with their execution times set.
+        Returns true if the schedule was accepted, false if it does not match the tasks waiting for execution.
+        """
 
-    	# check that the tasks that were scheduled are the ones we're waiting on
+        with self.lock:
+            # check that the tasks that were scheduled are the ones we're waiting on
 
-    	if len(scheduled_tasks) != len(self.tasks):
-    		rospy.loginfo('Number of scheduled tasks mismatch')
-    		return False
+            if len(scheduled_tasks) != len(self.tasks):
+                rospy.loginfo('Number of scheduled tasks mismatch')
+                self.dirty = True
+                return False
 
-    	for scheduled in scheduled_tasks:
-    		if not any(t.task_id == scheduled.task_id for t in self.tasks):
-    			rospy.loginfo('Trying to scheduled a missed task')
-    			return False
+            for scheduled in scheduled_tasks:
+                if scheduled.task_id not in self.tasks:
+                    rospy.loginfo('Trying to scheduled a missed task')
+                    self.dirty = True
+                    return False
 
-    	# now clear out the execution queue so that the new schedule comes into effect after current execution completes
-    	self.execution_queue.clear()
-    	self.execution_queue.extend(scheduled_tasks)
-    	
-        # if nothing is executing, make sure something starts
-        if self.current_task == None:
-            self.next_in_schedule()            
+            # any pending dispatch was for the head of the old schedule
+            self.execution_timer.cancel()
 
+            # now clear out the execution queue so that the new schedule comes into effect after current execution completes
+            self.execution_queue.clear()
+            self.execution_queue.extend(scheduled_tasks)
+
+            # if nothing is executing, make sure something starts
+            if self.current_task == None:
+                self.next_in_schedule()
+
+            return True
 
 
     def get_current_task(self):
@@ -110,8 +319,8 @@ class ExecutionSchedule(object):
 
 
     def wait_for_execution_change(self, timeout):
-        """ 
-        Blocks until current_task changes value 
+        """
+        Blocks until current_task changes value
         """
         self.execution_change.wait(timeout)
 
@@ -125,3 +334,125 @@ class ExecutionSchedule(object):
             return False
 
 
+
+def task_resources(task):
+    """
+    Returns the set of resources the task needs exclusive use of while it executes, or None if it needs all of them, which is the case
+    when task.resources is empty. Tasks with a start_node_id always need the base.
+    """
+    if len(task.resources) == 0:
+        return None
+    resources = set(task.resources)
+    if task.start_node_id != '':
+        resources.add(Task.BASE_RESOURCE)
+    return resources
+
+
+def resources_conflict(first, second):
+    """ Returns True if two sets of resources, as returned by task_resources, cannot be held at once. """
+    return first is None or second is None or not first.isdisjoint(second)
+
+
+class ConcurrentExecutionSchedule(ExecutionSchedule):
+    """
+    An ExecutionSchedule which executes any number of tasks at once, as long as no two of them need the same resource (see task_resources).
+    Tasks are started in the order of the schedule, except that a task can start ahead of waiting tasks which it shares no resources with.
+    Rather than a single current task, the tasks which have been started are collected with take_started_tasks.
+
+    Args are as for ExecutionSchedule.
+    """
+
+    def __init__(self, policy=ExecutionSchedule.START_AFTER, max_advance=rospy.Duration(60 * 10), timer_factory=DeadlineTimer):
+        super(ConcurrentExecutionSchedule, self).__init__(policy, max_advance, timer_factory)
+        # the tasks being executed, and the resources they hold, indexed by task id
+        self.running_tasks = {}
+        # tasks started since the last call to take_started_tasks
+        self.started_tasks = []
+
+    def _held_resources(self):
+        """ Returns the union of the resources of the running tasks, or None if one of them needs all resources. """
+        held = set()
+        for task, resources in self.running_tasks.itervalues():
+            if resources is None:
+                return None
+            held.update(resources)
+        return held
+
+    def next_in_schedule(self):
+        """
+        Starts every task in the execution queue which can start now and needs none of the resources of the running tasks or of the tasks
+        waiting ahead of it. If others could start later, delays until the earliest of them can.
+        """
+        with self.lock:
+            now = rospy.get_rostime()
+            # resources which are in use, or which are needed by a task waiting ahead in the queue
+            blocked = self._held_resources()
+            next_dispatch = None
+            waiting = deque()
+            while len(self.execution_queue) > 0:
+                if blocked is None:
+                    # everything left has to wait
+                    waiting.extend(self.execution_queue)
+                    break
+                task = self.execution_queue.popleft()
+                if task.task_id not in self.tasks:
+                    # cancelled or expired
+                    continue
+                task = self._latest(task)
+                resources = task_resources(task)
+                if resources is None:
+                    # a task needing every resource can only start when nothing is running or waiting ahead of it
+                    can_start = len(blocked) == 0
+                else:
+                    can_start = not resources_conflict(blocked, resources)
+                if can_start:
+                    dispatch_time = self.get_dispatch_time(task)
+                    if dispatch_time <= now:
+                        del self.tasks[task.task_id]
+                        self.updated.pop(task.task_id, None)
+                        self.running_tasks[task.task_id] = (task, resources)
+                        self.started_tasks.append(task)
+                        if resources is None:
+                            blocked = None
+                        else:
+                            blocked.update(resources)
+                        continue
+                    if next_dispatch is None or dispatch_time < next_dispatch:
+                        next_dispatch = dispatch_time
+                waiting.append(task)
+                if resources is None:
+                    blocked = None
+                else:
+                    blocked.update(resources)
+            self.execution_queue = waiting
+
+            self.current_task = None
+            if next_dispatch is not None:
+                rospy.logdebug('delaying until %s.%s for execution' % (next_dispatch.secs, next_dispatch.nsecs))
+                self.execution_timer.arm(next_dispatch)
+            else:
+                self.execution_timer.cancel()
+            if len(self.started_tasks) > 0:
+                self.execution_change.set()
+
+    def execution_delay_cb(self):
+        rospy.logdebug('timer for execution delay fired')
+        self.next_in_schedule()
+
+    def task_complete(self, task):
+        assert task != None
+        with self.lock:
+            assert task.task_id in self.running_tasks
+            del self.running_tasks[task.task_id]
+            self.next_in_schedule()
+
+    def take_started_tasks(self):
+        """ Returns the tasks which have been started since the last call, in the order they were started. """
+        with self.lock:
+            started, self.started_tasks = self.started_tasks, []
+            return started
+
+    def get_running_tasks(self):
+        """ Returns the tasks which are being executed. """
+        with self.lock:
+            return [task for task, resources in self.running_tasks.itervalues()]
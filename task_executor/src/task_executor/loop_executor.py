@@ -0,0 +1,328 @@
+import rospy
+import actionlib
+import ros_datacentre.util as dc_util
+from actionlib_msgs.msg import GoalStatus
+from strands_executive_msgs.msg import Task, TaskEvent
+from topological_navigation.msg import GotoNodeAction, GotoNodeGoal
+from task_executor.scheduled_executor import ScheduledTaskExecutor
+from task_executor.execution_schedule import ExecutionSchedule, ConcurrentExecutionSchedule
+from task_executor.event_loop import EventLoop, LoopTimer, CancelledError, TimeoutError, Return, spawn, send_goal, with_timeout
+
+
+class LoopTaskExecutor(ScheduledTaskExecutor):
+    """
+    Executes tasks in the order produced by the scheduler, as ScheduledTaskExecutor does, but with everything run on a single
+    EventLoop rather than on scheduling, execution and timer threads plus actionlib callbacks. Service requests, goal completions
+    and timers are all handled on the loop, one at a time, so the schedule and the active task are never changed concurrently,
+    and the loop only wakes when there is something to do.
+
+    Blocking calls (the scheduler service, waiting for action servers and loading task arguments) are made on short lived threads
+    with EventLoop.run_in_executor so they do not hold up the loop. The ros node must be initialised before construction.
+
+    Args:
+        schedule_srv (function): Called with a list of tasks, returning a GetScheduleResponse. Defaults to a proxy for the get_schedule service.
+        loop (EventLoop): The loop to run on. Defaults to a new one, run on its own thread by start_execution.
+        server_timeout (rospy.Duration): How long to wait for an action server before failing the task. Defaults to 60 seconds.
+        duration_model (DurationModel): As for ScheduledTaskExecutor.
+        duration_factor, trace_capacity, trace_file: As for ScheduledTaskExecutor.
+        execution_policy (str): When scheduled tasks are dispatched, see ExecutionSchedule. Defaults to ExecutionSchedule.START_AFTER.
+        max_advance (rospy.Duration): As for ExecutionSchedule. Defaults to 10 minutes.
+    """
+
+    # the type of ExecutionSchedule to create
+    schedule_class = ExecutionSchedule
+    # how long after an action completes the duration model is saved, so that durations recorded close together are saved at once
+    duration_save_delay = rospy.Duration(60)
+
+    def __init__(self, schedule_srv=None, loop=None, server_timeout=rospy.Duration(60), duration_model=None, duration_factor=2.0,
+                 trace_capacity=10000, trace_file=None, execution_policy=ExecutionSchedule.START_AFTER, max_advance=rospy.Duration(60 * 10)):
+        if loop is None:
+            loop = EventLoop()
+        self.loop = loop
+        self.server_timeout = server_timeout
+        # the coroutine running the active task
+        self.active_execution = None
+        # the pending scheduler call, and the pending timer for expiring tasks
+        self.scheduling = None
+        self.expiry_handle = None
+        self.update_requested = False
+        self.loop_thread = None
+        # true while a save of the duration model is pending or in progress
+        self.saving_durations = False
+
+        execution_schedule = self.schedule_class(execution_policy, max_advance, timer_factory=self._create_timer)
+        super(LoopTaskExecutor, self).__init__(schedule_srv, execution_schedule, duration_model, duration_factor, trace_capacity, trace_file)
+
+    def _create_timer(self, callback):
+        def fired():
+            callback()
+            self._check_execution()
+        return LoopTimer(self.loop, fired)
+
+    def advertise_services(self):
+        """
+        Advertises the same services and task events topic as the other executors, with each request handled on the loop.
+        """
+        self.advertise_events()
+        for attr in dir(self):
+            if attr.endswith("_ros_srv"):
+                service = getattr(self, attr)
+                rospy.Service("/task_executor/" + attr[:-8], service.type,
+                              lambda req, service=service: self.loop.run_sync(service, req))
+
+    def start_execution(self):
+        """ Called when overall execution should (re)start """
+        if not self.running:
+            self.running = True
+            if not self.loop.is_running():
+                self.loop_thread = self.loop.start()
+            self.loop.call_soon_threadsafe(self._request_update)
+
+    def add_tasks(self, tasks):
+        """ Called with new tasks for the executor """
+        for task in tasks:
+            self.fill_times(task)
+            self.tracer.record(TaskEvent.ADDED, task.task_id)
+        self.queue_tasks(tasks)
+        self._request_update()
+
+    def cancel_task(self, task_id):
+        """ Called to remove the task with the given id from execution """
+        if self.active_task_id == task_id:
+            return self.cancel_active_task()
+        if self.execution_schedule.cancel_task(task_id):
+            self.tracer.record(TaskEvent.CANCELLED, task_id)
+            self._request_update()
+            return True
+        return False
+
+    def update_task(self, task):
+        """ Called with a changed version of a task which has already been added """
+        self.fill_times(task)
+        if self.execution_schedule.update_task(task):
+            self._request_update()
+            return True
+        return False
+
+    def cancel_active_task(self):
+        """
+        Preempts the navigation or action goal of the active task, which then finishes as cancelled.
+        """
+        if self.active_execution is None:
+            return False
+        rospy.loginfo('Cancelling active task %s' % self.active_task_id)
+        return self.active_execution.cancel()
+
+    def task_failed(self, task):
+        """ Called when the given task has failed. The remaining tasks are rescheduled straight away. """
+        super(LoopTaskExecutor, self).task_failed(task)
+        self._request_update()
+
+    def action_complete(self, task, goal_status, duration):
+        """ Records how long the task's action took, then saves the duration model off the loop after duration_save_delay. """
+        super(LoopTaskExecutor, self).action_complete(task, goal_status, duration)
+        self._request_durations_save()
+
+    def _request_durations_save(self):
+        if not self.saving_durations and self.duration_model.needs_save():
+            self.saving_durations = True
+            self.loop.call_later(self.duration_save_delay, self._save_durations)
+
+    def _save_durations(self):
+        self.loop.run_in_executor(self.save_durations).add_done_callback(self._durations_saved)
+
+    def _durations_saved(self, future):
+        self.saving_durations = False
+        # durations recorded while the file was being written
+        self._request_durations_save()
+
+    def _request_update(self):
+        """ Updates the schedule on the next pass of the loop, once however many times this is called before then. """
+        if not self.update_requested:
+            self.update_requested = True
+            self.loop.call_soon(self._update)
+
+    def _update(self):
+        self.update_requested = False
+        if self.scheduling is not None:
+            # rerun once the scheduler call in progress returns
+            return
+        expired = self.execution_schedule.expire_tasks(self.loop.time())
+        for task in expired:
+            rospy.loginfo('Task %s expired before it could be executed' % task.task_id)
+            self.tracer.record(TaskEvent.EXPIRED, task.task_id)
+
+        if self.execution_schedule.is_dirty():
+            tasks = self.execution_schedule.get_schedulable_tasks()
+            if len(tasks) > 0:
+                self.scheduling = self.loop.run_in_executor(self.call_scheduler, tasks)
+                self.scheduling.add_done_callback(lambda future: self._scheduled(future, tasks))
+                return
+            self.execution_schedule.set_schedule(tasks)
+            self._check_execution()
+        self._arm_expiry()
+
+    def _scheduled(self, future, tasks):
+        self.scheduling = None
+        try:
+            future.result()
+        except Exception, e:
+            rospy.logwarn('Scheduler call failed: %s' % e)
+            self.execution_schedule.dirty = True
+            self.loop.call_later(rospy.Duration(5), self._request_update)
+            return
+        # rejected if the tasks changed while the scheduler ran, which leaves the schedule dirty
+        self.execution_schedule.set_schedule(tasks)
+        self._check_execution()
+        if self.execution_schedule.is_dirty():
+            self._request_update()
+        else:
+            self._arm_expiry()
+
+    def _arm_expiry(self):
+        """ Sets a timer for when the next task could expire, so the schedule is updated without polling. """
+        if self.expiry_handle is not None:
+            self.expiry_handle.cancel()
+            self.expiry_handle = None
+        expiry = self.execution_schedule.next_expiry()
+        if expiry is not None:
+            # tasks expire once the time is strictly after their latest start
+            self.expiry_handle = self.loop.call_at(expiry + rospy.Duration(0, 1), self._request_update)
+
+    def _check_execution(self):
+        """ Starts the task at the head of the schedule if the schedule has changed its current task. """
+        if self.execution_schedule.wait_for_execution_change(0):
+            self.execute_current_task()
+
+    def execute_task(self, task):
+        self.tracer.record(TaskEvent.DISPATCHED, task.task_id)
+        self.active_task = task
+        self.active_task_id = task.task_id
+        self.active_execution = spawn(self.loop, self._execute(task))
+
+    def _execute(self, task):
+        """
+        Coroutine which navigates to the task's start node, then runs its action. The task fails if navigation does not succeed, and the action
+        is preempted, and the task failed, if it runs for longer than get_task_timeout allows.
+        """
+        finish = self.task_complete
+        try:
+            if task.start_node_id != '':
+                self.tracer.record(TaskEvent.NAVIGATION_STARTED, task.task_id, task.start_node_id)
+                status, result = yield self.navigate(task)
+                rospy.logdebug('Navigation to %s completed' % task.start_node_id)
+                self.tracer.record(TaskEvent.NAVIGATION_FINISHED, task.task_id, str(status))
+                if status != GoalStatus.SUCCEEDED:
+                    raise RuntimeError('navigation to %s ended with status %s' % (task.start_node_id, status))
+            if task.action != '':
+                action = self.run_action(task)
+                timeout = self.get_task_timeout(task)
+                if timeout is not None:
+                    # the timeout shares the loop's timers, cancelling the action when it passes
+                    action = with_timeout(self.loop, action, timeout)
+                started = self.loop.time()
+                self.tracer.record(TaskEvent.ACTION_STARTED, task.task_id, task.action)
+                status, result = yield action
+                self.tracer.record(TaskEvent.ACTION_FINISHED, task.task_id, str(status))
+                self.action_complete(task, status, self.loop.time() - started)
+            if task.start_node_id == '' and task.action == '':
+                rospy.logwarn('Provided task had no start_node_id or action %s' % task)
+        except CancelledError:
+            rospy.loginfo('Task %s was cancelled' % task.task_id)
+            finish = self.task_cancelled
+        except TimeoutError:
+            rospy.logwarn('Task %s timed out' % task.task_id)
+            finish = self.task_failed
+        except Exception, e:
+            rospy.logwarn('Task %s failed: %s' % (task.task_id, e))
+            finish = self.task_failed
+        finally:
+            self._execution_finished(task)
+        finish(task)
+        self._check_execution()
+
+    def _execution_finished(self, task):
+        self.active_execution = None
+        self.action_client = None
+        self.active_task = None
+        self.active_task_id = Task.NO_TASK
+
+    def navigate(self, task):
+        """ Returns a Future for (goal status, result) of navigating to the task's start node. """
+        if self.nav_client is None:
+            self.nav_client = actionlib.SimpleActionClient('topological_navigation', GotoNodeAction)
+        return spawn(self.loop, self._send_when_ready(self.nav_client, GotoNodeGoal(target=task.start_node_id)))
+
+    def run_action(self, task):
+        """ Returns a Future for (goal status, result) of running the task's action. """
+        return spawn(self.loop, self._run_action(task))
+
+    def _run_action(self, task):
+        client, goal = yield self.loop.run_in_executor(self._create_goal, task)
+        self.action_client = client
+        rospy.logdebug('Sending goal to %s' % task.action)
+        outcome = yield spawn(self.loop, self._send_when_ready(client, goal))
+        raise Return(outcome)
+
+    def _send_when_ready(self, client, goal):
+        ready = yield self.loop.run_in_executor(client.wait_for_server, self.server_timeout)
+        if not ready:
+            raise TimeoutError()
+        outcome = yield send_goal(self.loop, client, goal)
+        raise Return(outcome)
+
+    def _create_goal(self, task):
+        """ Looks up the action's types and loads the task's arguments, which block, so are run off the loop. """
+        (action_string, goal_string) = self.get_task_types(task.action)
+        action_clz = dc_util.load_class(dc_util.type_to_class_string(action_string))
+        goal_clz = dc_util.load_class(dc_util.type_to_class_string(goal_string))
+        client = actionlib.SimpleActionClient(task.action, action_clz)
+        return client, goal_clz(*self.get_arguments(task.arguments))
+
+
+class ConcurrentTaskExecutor(LoopTaskExecutor):
+    """
+    A LoopTaskExecutor which executes tasks that need different resources at the same time, for example uploading data or speaking
+    while the robot moves, using a ConcurrentExecutionSchedule to decide what can start. See the resources field of Task.
+
+    Args are as for LoopTaskExecutor.
+    """
+
+    schedule_class = ConcurrentExecutionSchedule
+
+    def __init__(self, schedule_srv=None, loop=None, server_timeout=rospy.Duration(60), duration_model=None, duration_factor=2.0,
+                 trace_capacity=10000, trace_file=None, execution_policy=ExecutionSchedule.START_AFTER, max_advance=rospy.Duration(60 * 10)):
+        # the coroutines running each executing task, indexed by task id
+        self.executions = {}
+        super(ConcurrentTaskExecutor, self).__init__(schedule_srv, loop, server_timeout, duration_model, duration_factor, trace_capacity, trace_file,
+                                                     execution_policy, max_advance)
+
+    def cancel_task(self, task_id):
+        """ Called to remove the task with the given id from execution """
+        execution = self.executions.get(task_id)
+        if execution is not None:
+            rospy.loginfo('Cancelling executing task %s' % task_id)
+            return execution.cancel()
+        return super(ConcurrentTaskExecutor, self).cancel_task(task_id)
+
+    def cancel_active_task(self):
+        """ Preempts every executing task. """
+        if len(self.executions) == 0:
+            return False
+        for task_id in self.executions.keys():
+            self.cancel_task(task_id)
+        return True
+
+    def _check_execution(self):
+        """ Starts the tasks which the schedule has started since the last check. """
+        if self.execution_schedule.wait_for_execution_change(0):
+            for task in self.execution_schedule.take_started_tasks():
+                rospy.loginfo('Next task to execute: %s' % task.task_id)
+                self.execute_task(task)
+
+    def execute_task(self, task):
+        self.tracer.record(TaskEvent.DISPATCHED, task.task_id)
+        self.executions[task.task_id] = spawn(self.loop, self._execute(task))
+
+    def _execution_finished(self, task):
+        del self.executions[task.task_id]
@@ -0,0 +1,280 @@
+import rospy
+from Queue import Queue, Empty
+from strands_executive_msgs.msg import Task, TaskEvent
+from strands_executive_msgs.srv import GetSchedule
+from task_executor.base_executor import AbstractTaskExecutor
+from threading import Thread
+from task_executor.execution_schedule import ExecutionSchedule
+from task_executor.duration_model import DurationModel
+from actionlib_msgs.msg import GoalStatus
+from operator import attrgetter
+
+class ScheduledTaskExecutor(AbstractTaskExecutor):
+    """
+    Executes tasks in the order produced by the scheduler. The ros node must be initialised before construction.
+
+    Args:
+        schedule_srv (function): Called with a list of tasks, returning a GetScheduleResponse. Defaults to a proxy for the get_schedule service.
+        execution_schedule (ExecutionSchedule): Manages the tasks waiting for execution. Defaults to one with the START_AFTER policy.
+        duration_model (DurationModel): Learns action durations, to fill in the expected_duration of tasks which arrive without one. It is saved
+            from the scheduling thread after durations are recorded. Defaults to one which is only kept in memory.
+        duration_factor (float): An action running for longer than its expected_duration multiplied by this is preempted, and its task failed. Zero or less disables this. Defaults to 2.
+        trace_capacity (int): How many task events to keep for the dump_trace service. Defaults to 10000.
+        trace_file (str): Where the dump_trace service writes the events. Defaults to task_trace.json under ROS_HOME.
+    """
+
+    def __init__(self, schedule_srv=None, execution_schedule=None, duration_model=None, duration_factor=2.0, trace_capacity=10000, trace_file=None):
+        # init superclasses
+        super( ScheduledTaskExecutor, self ).__init__(duration_factor, trace_capacity, trace_file)
+
+
+        # service for scheduler
+        if schedule_srv is None:
+            schedule_srv_name = 'get_schedule'
+            rospy.logdebug('Waiting for %s service' % schedule_srv_name)
+            rospy.wait_for_service(schedule_srv_name)
+            schedule_srv = rospy.ServiceProxy(schedule_srv_name, GetSchedule)
+        self.schedule_srv = schedule_srv
+
+        # defaults for setting the ends of tasks
+        self.default_duration = rospy.Duration.from_sec(60 * 60 * 4)
+
+        # durations recorded for completed actions
+        if duration_model is None:
+            duration_model = DurationModel()
+        self.duration_model = duration_model
+        
+        # storage for tasks which have been added but not considered 
+        self.unscheduled_tasks = Queue()
+       
+        # data structure that manages tasks
+        if execution_schedule is None:
+            execution_schedule = ExecutionSchedule()
+        self.execution_schedule = execution_schedule
+
+        self.scheduling_thread = Thread(target=self.schedule_tasks)    
+        self.execution_thread = Thread(target=self.execute_tasks)
+
+        self.running = False
+
+        self.advertise_services()
+
+    def start_execution(self):
+        """ Called when overall execution should  (re)start """
+        if not self.running:
+            self.scheduling_thread.start()    
+            self.execution_thread.start()
+            self.running = True
+
+
+    def get_default_end_time(self, start_time):
+        return start_time + self.default_duration
+
+
+    def fill_times(self, task):
+        if task.expected_duration.is_zero():
+            estimate = self.duration_model.estimate(task)
+            if estimate is not None:
+                rospy.logdebug('Estimated duration of task %s as %s seconds' % (task.task_id, estimate.to_sec()))
+                task.expected_duration = estimate
+
+        if task.start_after.is_zero():            
+            task.start_after = rospy.get_rostime()
+
+        if task.end_before.is_zero():
+            task.end_before = self.get_default_end_time(task.start_after)
+
+
+    def add_tasks(self, tasks):
+        """ Called with new tasks for the executor """
+        
+        for task in tasks:
+            self.fill_times(task)
+            self.tracer.record(TaskEvent.ADDED, task.task_id)
+
+        for task in tasks:
+            self.unscheduled_tasks.put(task)
+
+    def cancel_task(self, task_id):
+        """ Called to remove the task with the given id from execution """
+        if self.active_task_id == task_id:
+            return self.cancel_active_task()
+        # the schedule will be recomputed on the next pass of the scheduling thread
+        if self.execution_schedule.cancel_task(task_id):
+            self.tracer.record(TaskEvent.CANCELLED, task_id)
+            return True
+        return False
+
+    def update_task(self, task):
+        """ Called with a changed version of a task which has already been added """
+        self.fill_times(task)
+        return self.execution_schedule.update_task(task)
+
+    def task_complete(self, task):
+        """ Called when the given task has completed execution """
+        self.tracer.record(TaskEvent.COMPLETED, task.task_id)
+        # pass signal to schedule
+        self.execution_schedule.task_complete(task)
+
+    def action_complete(self, task, goal_status, duration):
+        """ Records how long the task's action took, if it succeeded. """
+        if goal_status == GoalStatus.SUCCEEDED:
+            self.duration_model.record(task, duration)
+
+    def save_durations(self):
+        """ Saves the duration model if durations have been recorded since it was last saved. This blocks on file I/O. """
+        if self.duration_model.needs_save():
+            self.duration_model.save()
+
+    def task_cancelled(self, task):
+        """ Called when the given task was cancelled while it was executing """
+        self.tracer.record(TaskEvent.CANCELLED, task.task_id)
+        self.execution_schedule.task_complete(task)
+
+    def task_failed(self, task):
+        """ Called when the given task has failed. The remaining tasks are rescheduled on the next pass of the scheduling thread. """
+        rospy.logwarn('Task %s failed' % task.task_id)
+        self.tracer.record(TaskEvent.FAILED, task.task_id)
+        self.execution_schedule.task_failed(task)
+
+
+    def call_scheduler(self, tasks):
+        """ 
+        
+        Calls scheduler. Reorders the list of tasks in execution order with their execution times set. 
+        
+        """
+        # scheduler seems to need time to start at zero
+        min_window = rospy.Time(rospy.get_rostime().secs * 2)
+        for task in tasks:
+            if task.start_after < min_window:
+                min_window = task.start_after
+
+        # turn this time into a duration (since epoch)
+        min_window = rospy.Duration(min_window.secs, min_window.nsecs)
+        
+
+        # subtrack min window from all win values
+        for task in tasks:
+            task.start_after = task.start_after - min_window
+            task.end_before = task.end_before - min_window
+
+
+        task_ids = [task.task_id for task in tasks]
+        self.tracer.record_all(TaskEvent.SCHEDULER_REQUEST, task_ids, '%s tasks' % len(tasks))
+        resp = self.schedule_srv(tasks)
+        self.tracer.record_all(TaskEvent.SCHEDULED, task_ids, '%s scheduled' % len(resp.task_order))
+
+        # add start times to a dictionary for fast lookup
+        task_times = {}
+        for (task_id, start_time) in zip(resp.task_order, resp.execution_times):
+            task_times[task_id] = start_time
+
+        # the scheduler returns nothing if the tasks cannot all be fitted into their windows
+        if len(task_times) != len(tasks):
+            rospy.logwarn('Scheduler could not schedule %s tasks, falling back to ordering by end_before' % len(tasks))
+
+        # set start times inside of tasks
+        for task in tasks:
+            task.start_after = task.start_after + min_window
+            task.end_before = task.end_before + min_window
+
+            if task.task_id in task_times:
+                # add min_window back on to starting times
+                task.execution_time = task_times[task.task_id] + min_window
+
+                assert task.execution_time >= task.start_after
+                assert task.execution_time + task.expected_duration <= task.end_before
+
+                rospy.logdebug('task %s will start at %s.%s' % (task.task_id, task.execution_time.secs, task.execution_time.nsecs))
+            else:
+                task.execution_time = task.start_after
+
+        if len(task_times) == len(tasks):
+            tasks.sort(key=attrgetter('execution_time'))
+        else:
+            tasks.sort(key=attrgetter('end_before'))
+        
+
+    def schedule_tasks(self):
+        loopSecs = 5
+        
+        while not rospy.is_shutdown():           
+            # print "scheduling thread %s" % rospy.is_shutdown()      
+            try:
+                unscheduled = []
+                # block until at least one task is available
+                unscheduled.append(self.unscheduled_tasks.get(True, loopSecs))
+                # now check for any remaining tasks in the queue
+                try:
+                    while True:
+                        unscheduled.append(self.unscheduled_tasks.get(False))
+                except Empty, e:
+                    pass
+                
+                rospy.logdebug('Got a further %s tasks to schedule' % len(unscheduled))
+
+                self.queue_tasks(unscheduled)
+
+            except Empty, e:
+                rospy.logdebug('No new tasks to schedule')
+
+            self.update_schedule()
+            # saved here rather than as actions complete so that goal callbacks are not held up
+            self.save_durations()
+
+        self.save_durations()
+
+
+    def queue_tasks(self, tasks):
+        """ Passes tasks which have been added to the execution schedule, to be included in the next call to the scheduler. """
+        for task in tasks:
+            self.tracer.record(TaskEvent.QUEUED, task.task_id)
+        self.execution_schedule.add_new_tasks(tasks)
+
+    def update_schedule(self):
+        """
+        Expires tasks which can no longer be executed and, if anything has changed since the last call, calls the scheduler and updates the execution schedule.
+        Returns the list of expired tasks.
+        """
+        # drop any tasks which can no longer fit in their windows
+        expired = self.execution_schedule.expire_tasks(rospy.get_rostime())
+        for task in expired:
+            rospy.loginfo('Task %s expired before it could be executed' % task.task_id)
+            self.tracer.record(TaskEvent.EXPIRED, task.task_id)
+
+        # additions, cancellations, updates and expiries all mark the schedule dirty
+        if self.execution_schedule.is_dirty():
+            tasks = self.execution_schedule.get_schedulable_tasks()
+
+            # reorder tasks and add execution information
+            if len(tasks) > 0:
+                self.call_scheduler(tasks)
+
+            # put scheduled tasks back into execution. this will trigger a change in execution if necessary
+            self.execution_schedule.set_schedule(tasks)
+
+        return expired
+
+
+    def execute_tasks(self):
+        wait_time = 1 # 1second
+        
+        while not rospy.is_shutdown():           
+
+            # print "executing thread %s" % rospy.is_shutdown()
+            if(self.execution_schedule.wait_for_execution_change(wait_time)):
+                self.execute_current_task()
+
+    def execute_current_task(self):
+        """ Starts execution of the task at the head of the execution schedule """
+        next_task = self.execution_schedule.get_current_task()
+        rospy.loginfo('Next task to execute: %s' % next_task)
+        if next_task:
+            self.execute_task(next_task)
+        else:
+            rospy.loginfo('Next task was None')
+
+    # def wait_for_exit(self):
+    #     self.scheduling_thread.join()
+    #     self.execution_thread.join()
@@ -0,0 +1,146 @@
+from collections import deque
+from threading import Lock
+import ctypes
+import ctypes.util
+import json
+import os
+import time
+
+import rospy
+from strands_executive_msgs.msg import Task, TaskEvent
+
+from task_executor.duration_model import DurationSketch
+
+
+# names of the TaskEvent event types, for dumps and summaries
+EVENT_NAMES = dict((getattr(TaskEvent, name), name.lower()) for name in
+                   ['ADDED', 'QUEUED', 'SCHEDULER_REQUEST', 'SCHEDULED', 'DISPATCHED', 'NAVIGATION_STARTED', 'NAVIGATION_FINISHED',
+                    'ACTION_STARTED', 'ACTION_FINISHED', 'COMPLETED', 'FAILED', 'EXPIRED', 'CANCELLED'])
+
+# events after which nothing more happens to a task
+FINAL_EVENTS = frozenset([TaskEvent.COMPLETED, TaskEvent.FAILED, TaskEvent.EXPIRED, TaskEvent.CANCELLED])
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _monotonic_clock():
+    """ Returns a function giving the seconds on the system's monotonic clock, falling back to the wall clock where there is none. """
+    try:
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or None, use_errno=True).clock_gettime
+    except AttributeError:
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+    # CLOCK_MONOTONIC on linux
+    clock_id = 1
+    spec = _timespec()
+
+    def monotonic():
+        if clock_gettime(clock_id, ctypes.byref(spec)) != 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        return spec.tv_sec + spec.tv_nsec * 1e-9
+    return monotonic
+
+monotonic = _monotonic_clock()
+
+
+def format_stage_latencies(latencies):
+    """ Returns stage latencies, as returned by Tracer.get_stage_latencies, as a table with the stages where the most time went first. """
+    lines = ['%-45s %7s %12s %10s %10s %10s %10s' % ('stage', 'count', 'total', 'mean', 'p50', 'p90', 'max')]
+    for stage in sorted(latencies, key=lambda s: -latencies[s]['total']):
+        stats = latencies[stage]
+        lines.append('%-45s %7d %12.3f %10.3f %10.3f %10.3f %10.3f' % (stage, stats['count'], stats['total'], stats['mean'], stats['p50'],
+                                                                       stats['p90'], stats['max']))
+    return '\n'.join(lines)
+
+
+class Tracer(object):
+    """
+    Records the events in the execution of each task, as TaskEvent types, into a ring buffer holding the most recent capacity of them. Each is
+    timestamped by clock and by the ros time, and the time between consecutive events for the same task is added to a histogram for that stage,
+    such as dispatched -> navigation_started. Events can also be published as TaskEvent messages by setting publisher.
+
+    Args:
+        capacity (int): How many events to keep. With zero, nothing is recorded.
+        clock (function): Returns the time of an event in seconds. Defaults to the monotonic clock.
+    """
+
+    def __init__(self, capacity=10000, clock=monotonic):
+        self.capacity = capacity
+        self.clock = clock
+        # a rospy.Publisher for TaskEvent, or None to not publish
+        self.publisher = None
+        # (clock time, ros time, task id, event, detail) tuples
+        self.events = deque(maxlen=max(capacity, 1))
+        # DurationSketch of the seconds between events indexed by (event, next event)
+        self.stages = {}
+        # (event, clock time) of the last event of each task which has not finished
+        self.last = {}
+        # events are recorded from ros callbacks as well as executor threads
+        self.lock = Lock()
+
+    def record(self, event, task_id=Task.NO_TASK, detail=''):
+        """ Records that event, a TaskEvent type, happened now to the task with task_id, or to the executor if there is no task_id. """
+        self.record_all(event, [task_id], detail)
+
+    def record_all(self, event, task_ids, detail=''):
+        """ Records that event happened now to each of the tasks with task_ids, such as the tasks passed to the scheduler, with one timestamp. """
+        if self.capacity <= 0:
+            return
+        now = self.clock()
+        stamp = rospy.get_rostime()
+        with self.lock:
+            for task_id in task_ids:
+                self.events.append((now, stamp, task_id, event, detail))
+                previous = self.last.get(task_id)
+                if previous is not None:
+                    stage = (previous[0], event)
+                    sketch = self.stages.get(stage)
+                    if sketch is None:
+                        # stages can be far shorter than the durations of actions
+                        sketch = DurationSketch(min_secs=1e-6)
+                        self.stages[stage] = sketch
+                    sketch.add(now - previous[1])
+                if event in FINAL_EVENTS:
+                    self.last.pop(task_id, None)
+                else:
+                    self.last[task_id] = (event, now)
+        if self.publisher is not None:
+            for task_id in task_ids:
+                self.publisher.publish(TaskEvent(task_id=task_id, event=event, time=stamp, monotonic=now, detail=detail))
+
+    def get_stage_latencies(self):
+        """
+        Returns a dictionary of statistics for each stage, indexed by its name, such as 'dispatched -> navigation_started'. Each holds the count,
+        total, mean, p50, p90, p99 and max seconds spent in the stage.
+        """
+        with self.lock:
+            latencies = {}
+            for (first, second), sketch in self.stages.iteritems():
+                latencies['%s -> %s' % (EVENT_NAMES[first], EVENT_NAMES[second])] = {
+                    'count': sketch.count,
+                    'total': sketch.total,
+                    'mean': sketch.mean(),
+                    'p50': sketch.quantile(0.5),
+                    'p90': sketch.quantile(0.9),
+                    'p99': sketch.quantile(0.99),
+                    'max': sketch.max,
+                }
+            return latencies
+
+    def format_stage_latencies(self):
+        """ Returns the stage latencies as a table, see format_stage_latencies. """
+        return format_stage_latencies(self.get_stage_latencies())
+
+    def get_events(self):
+        """ Returns the recorded events, oldest first, as (clock time, ros time, task id, event, detail) tuples. """
+        with self.lock:
+            return list(self.events)
+
+    def dump(self, filename):
+        """ Writes the recorded events and the stage latencies to filename as json. """
+        events = [{'monotonic': now, 'time': stamp.to_sec(), 'task_id': task_id, 'event': EVENT_NAMES[event], 'detail': detail}
+                  for now, stamp, task_id, event, detail in self.get_events()]
+        with open(filename, 'w') as f:
+            json.dump({'events': events, 'stages': self.get_stage_latencies()}, f, sort_keys=True)
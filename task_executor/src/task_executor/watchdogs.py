@@ -0,0 +1,78 @@
+from threading import RLock
+from itertools import count
+import heapq
+
+import rospy
+
+from task_executor.execution_schedule import DeadlineTimer
+
+
+class Watchdogs(object):
+    """
+    Deadlines for any number of tasks, which call back if a task is still running when its deadline passes. They all share a single timer,
+    armed for the earliest deadline, rather than needing a thread each.
+
+    Args:
+        timer_factory (function): Creates the timer when called with a callback. Defaults to DeadlineTimer.
+    """
+
+    def __init__(self, timer_factory=DeadlineTimer):
+        self.lock = RLock()
+        # heap of (deadline, sequence, task id). entries for stopped or restarted watchdogs are dropped when they reach the front
+        self.deadlines = []
+        self.sequence = count()
+        # (deadline, callback) for each watched task, indexed by task id
+        self.watched = {}
+        self.timer = timer_factory(self._expired)
+
+    def start(self, task_id, deadline, callback):
+        """ Calls callback with no arguments once the ros time passes deadline, unless stop is called for task_id first. Replaces any previous watchdog for the task. """
+        with self.lock:
+            self.watched[task_id] = (deadline, callback)
+            heapq.heappush(self.deadlines, (deadline, next(self.sequence), task_id))
+            self._arm()
+
+    def stop(self, task_id):
+        """ Stops the watchdog for the task. Returns True if there was one. """
+        with self.lock:
+            if self.watched.pop(task_id, None) is None:
+                return False
+            self._arm()
+            return True
+
+    def is_watched(self, task_id):
+        return task_id in self.watched
+
+    def shutdown(self):
+        self.timer.shutdown()
+
+    def _drop_stale(self):
+        while len(self.deadlines) > 0:
+            deadline, sequence, task_id = self.deadlines[0]
+            watched = self.watched.get(task_id)
+            if watched is not None and watched[0] == deadline:
+                break
+            heapq.heappop(self.deadlines)
+
+    def _arm(self):
+        self._drop_stale()
+        if len(self.deadlines) > 0:
+            earliest = self.deadlines[0][0]
+            if self.timer.deadline is None or self.timer.deadline != earliest:
+                self.timer.arm(earliest)
+        else:
+            self.timer.cancel()
+
+    def _expired(self):
+        expired = []
+        with self.lock:
+            now = rospy.get_rostime()
+            self._drop_stale()
+            while len(self.deadlines) > 0 and self.deadlines[0][0] <= now:
+                deadline, sequence, task_id = heapq.heappop(self.deadlines)
+                expired.append(self.watched.pop(task_id)[1])
+                self._drop_stale()
+            self._arm()
+        # called without the lock, so callbacks can start and stop watchdogs
+        for callback in expired:
+            callback()
@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+"""
+Headless benchmark for the scheduled task executor.
+
+Drives ScheduledTaskExecutor and ExecutionSchedule against a simulated ros
+clock, with in-process stand-ins for the navigation and action servers and
+for the get_schedule service. Time only moves when the simulation jumps to the
+next event, so a day of tasks replays in seconds and no roscore is needed.
+With --executor loop the same tasks are run through LoopTaskExecutor on a
+simulated EventLoop instead, and with --executor concurrent through
+ConcurrentTaskExecutor, which runs tasks that do not need the base, see
+--side-tasks, alongside the others. With --hang a fraction of the actions
+never finish, so are only ended by the executor's watchdogs. With --unknown
+a fraction of the tasks arrive without an expected_duration, which the
+executor estimates from the durations it has recorded unless --no-learn.
+With --trace the executor's trace of task events is written to a file and
+the time spent in each stage is printed, measured in simulated seconds.
+With --spare-time the robot is mostly idle and travel dominates, see
+SPARE_TIME, so the execution policies are compared when they have a choice.
+
+Usage:
+    executor_benchmark.py [--tasks N] [--policy start_after|execution_time|slack] [--executor threads|loop|concurrent] [--side-tasks F] [--hang F] [--duration-factor F] [--unknown F] [--no-learn] [--spare-time] [--seed S] [--output results.json] [--trace trace.json]
+"""
+from __future__ import division
+
+import argparse
+import heapq
+import json
+import resource
+import sys
+import time
+from operator import attrgetter
+from random import Random
+
+import rospy
+from actionlib_msgs.msg import GoalStatus
+from strands_executive_msgs.msg import Task, TaskEvent
+from strands_executive_msgs.srv import GetScheduleResponse
+from task_executor.event_loop import EventLoop, Future
+from task_executor.execution_schedule import ExecutionSchedule
+from task_executor.loop_executor import LoopTaskExecutor, ConcurrentTaskExecutor
+from task_executor.scheduled_executor import ScheduledTaskExecutor
+from task_executor.watchdogs import Watchdogs
+from task_executor.duration_model import DurationModel
+from task_executor.tracing import Tracer, format_stage_latencies
+
+EXECUTORS = ['threads', 'loop', 'concurrent']
+# resources of the generated tasks which do not need the base
+SIDE_RESOURCES = ['camera', 'speech', 'network']
+# run_benchmark arguments for a robot with spare time: short actions between long journeys, filling under a third of the day
+SPARE_TIME = {'travel_secs': 300, 'max_duration': 120, 'utilisation': 0.3}
+
+
+class SimulatedClock(object):
+    """ A discrete event clock which drives rospy's simulated time. """
+
+    def __init__(self, start):
+        rospy.rostime.set_rostime_initialized(True)
+        self.events = []
+        self.sequence = 0
+        self.set_time(start)
+
+    def set_time(self, now):
+        self.now = now
+        rospy.rostime._set_rostime(now)
+
+    def call_at(self, when, callback):
+        """ Calls the callback once the clock reaches when. Returns a handle which can be passed to cancel. """
+        self.sequence += 1
+        event = [when, self.sequence, callback]
+        heapq.heappush(self.events, event)
+        return event
+
+    def call_later(self, delay, callback):
+        return self.call_at(self.now + delay, callback)
+
+    def cancel(self, event):
+        event[2] = None
+
+    def step(self):
+        """ Advances to the next event and runs it. Returns False when there are no events left. """
+        while len(self.events) > 0:
+            when, sequence, callback = heapq.heappop(self.events)
+            if callback is not None:
+                if when > self.now:
+                    self.set_time(when)
+                callback()
+                return True
+        return False
+
+
+class SimulatedTimer(object):
+    """ Stands in for DeadlineTimer, firing from the simulated clock rather than a thread. """
+
+    def __init__(self, clock, callback):
+        self.clock = clock
+        self.callback = callback
+        self.deadline = None
+        self.event = None
+
+    def arm(self, deadline):
+        self.cancel()
+        self.deadline = deadline
+        self.event = self.clock.call_at(deadline, self._fire)
+
+    def cancel(self):
+        if self.event is not None:
+            self.clock.cancel(self.event)
+        self.deadline = None
+        self.event = None
+
+    def is_armed(self):
+        return self.deadline is not None
+
+    def shutdown(self):
+        self.cancel()
+
+    def _fire(self):
+        self.deadline = None
+        self.event = None
+        self.callback()
+
+
+class EarliestDeadlineScheduler(object):
+    """
+    Stands in for the get_schedule service. Orders tasks by end_before and packs them in that order, returning
+    an empty response, as the real scheduler does, if any task would finish outside its window.
+    """
+
+    def __init__(self, travel_time):
+        self.travel_time = travel_time
+        self.calls = 0
+        self.cpu_time = 0.0
+
+    def __call__(self, tasks):
+        started = time.clock()
+        self.calls += 1
+        resp = GetScheduleResponse()
+        now = rospy.Duration(0)
+        position = None
+        feasible = True
+        for task in sorted(tasks, key=attrgetter('end_before')):
+            execution_time = max(rospy.Time(now.secs, now.nsecs), task.start_after)
+            if position is not None:
+                execution_time = max(execution_time, rospy.Time(now.secs, now.nsecs) + self.travel_time)
+            if execution_time + task.expected_duration > task.end_before:
+                feasible = False
+                break
+            resp.task_order.append(task.task_id)
+            resp.execution_times.append(execution_time)
+            now = rospy.Duration(execution_time.secs, execution_time.nsecs) + task.expected_duration
+            position = task.start_node_id
+        if not feasible:
+            resp = GetScheduleResponse()
+        self.cpu_time += time.clock() - started
+        return resp
+
+
+def simulated_seconds():
+    """ Times trace events on the simulated clock rather than the monotonic one. """
+    return rospy.get_rostime().to_sec()
+
+
+class NoDurationModel(DurationModel):
+    """ A DurationModel which never makes an estimate, for comparison. """
+
+    def estimate(self, task):
+        return None
+
+
+def record_dispatch(executor, task):
+    """
+    Splits the time from a task's dispatch time until the executor is passed it into the wait for the previous task to finish, and the
+    executor's latency from the task and the robot both being ready.
+    """
+    dispatch_time = executor.execution_schedule.get_dispatch_time(task)
+    ready = max(dispatch_time, executor.free_since)
+    executor.queue_waits.append((ready - dispatch_time).to_sec())
+    executor.dispatch_latencies.append((rospy.get_rostime() - ready).to_sec())
+
+
+class SimulatedTaskExecutor(ScheduledTaskExecutor):
+    """
+    A ScheduledTaskExecutor whose navigation and actions complete on the simulated clock, and whose scheduling and execution
+    loops are run by the benchmark rather than by threads.
+    """
+
+    def __init__(self, clock, schedule_srv, policy, travel_time, duration_noise, random, hung, duration_factor, durations, duration_model):
+        self.clock = clock
+        self.travel_time = travel_time
+        self.duration_noise = duration_noise
+        self.random = random
+        # ids of the tasks whose actions never finish, and the durations of the others' actions before noise
+        self.hung = hung
+        self.durations = durations
+        self.position = None
+        # dispatch latencies and waits for the previous task in seconds, and completion and failure times by task id
+        self.dispatch_latencies = []
+        self.queue_waits = []
+        # when the last task finished, so the robot was free
+        self.free_since = rospy.Time(0)
+        self.completed = {}
+        self.failed = {}
+        self.dispatch_wall_time = 0.0
+        schedule = ExecutionSchedule(policy, timer_factory=lambda cb: SimulatedTimer(clock, cb))
+        super(SimulatedTaskExecutor, self).__init__(schedule_srv, schedule, duration_model, duration_factor)
+        self._watchdogs = Watchdogs(lambda cb: SimulatedTimer(clock, cb))
+        self.tracer = Tracer(clock=simulated_seconds)
+
+    def advertise_services(self):
+        # there is no ros master to advertise to
+        pass
+
+    def execute_task(self, task):
+        record_dispatch(self, task)
+        started = time.time()
+        super(SimulatedTaskExecutor, self).execute_task(task)
+        self.dispatch_wall_time += time.time() - started
+
+    def start_task_navigation(self):
+        target = self.active_task.start_node_id
+        delay = rospy.Duration(0) if target == self.position else self.travel_time
+
+        navigation_complete_cb = self.if_active(self.navigation_complete_cb)
+        self.tracer.record(TaskEvent.NAVIGATION_STARTED, self.active_task_id, target)
+
+        def arrived():
+            self.position = target
+            navigation_complete_cb(GoalStatus.SUCCEEDED, None)
+
+        self.clock.call_later(delay, arrived)
+
+    def start_task_action(self):
+        factor = self.random.uniform(1 - self.duration_noise, 1 + self.duration_noise)
+        if self.active_task.task_id not in self.hung:
+            task_execution_complete_cb = self.if_active(self.task_execution_complete_cb)
+            self.clock.call_later(self.durations[self.active_task.task_id] * factor,
+                                  lambda: task_execution_complete_cb(GoalStatus.SUCCEEDED, None))
+        self.action_start_time = rospy.get_rostime()
+        self.tracer.record(TaskEvent.ACTION_STARTED, self.active_task_id, self.active_task.action)
+        self.watch_task(self.active_task)
+
+    def task_complete(self, task):
+        self.completed[task.task_id] = self.free_since = rospy.get_rostime()
+        super(SimulatedTaskExecutor, self).task_complete(task)
+
+    def task_failed(self, task):
+        self.failed[task.task_id] = self.free_since = rospy.get_rostime()
+        super(SimulatedTaskExecutor, self).task_failed(task)
+
+
+class SimulatedEventLoop(EventLoop):
+    """ An EventLoop on simulated time, which jumps to the next deadline rather than waiting, and stops when it has nothing to do. """
+
+    def __init__(self, start):
+        super(SimulatedEventLoop, self).__init__()
+        rospy.rostime.set_rostime_initialized(True)
+        self.set_time(start)
+
+    def set_time(self, now):
+        self.now = now
+        rospy.rostime._set_rostime(now)
+
+    def time(self):
+        return self.now
+
+    def run_in_executor(self, function, *args):
+        # blocking calls are made at once, so runs are repeatable
+        future = Future(self)
+        try:
+            future.set_result(function(*args))
+        except Exception, e:
+            future.set_exception(e)
+        return future
+
+    def _idle(self, deadline):
+        if deadline is None:
+            self._stop()
+        elif deadline > self.now:
+            self.set_time(deadline)
+
+
+class SimulatedLoopExecutor(LoopTaskExecutor):
+    """ A LoopTaskExecutor whose navigation and actions complete on the simulated loop. """
+
+    def __init__(self, loop, schedule_srv, policy, travel_time, duration_noise, random, hung, duration_factor, durations, duration_model):
+        self.travel_time = travel_time
+        self.duration_noise = duration_noise
+        self.random = random
+        self.hung = hung
+        self.durations = durations
+        self.position = None
+        self.dispatch_latencies = []
+        self.queue_waits = []
+        self.free_since = rospy.Time(0)
+        self.completed = {}
+        self.failed = {}
+        self.dispatch_wall_time = 0.0
+        self.scheduling_cpu = 0.0
+        super(SimulatedLoopExecutor, self).__init__(schedule_srv, loop, duration_model=duration_model, duration_factor=duration_factor,
+                                                    execution_policy=policy)
+        self.tracer = Tracer(clock=simulated_seconds)
+
+    def advertise_services(self):
+        pass
+
+    def execute_task(self, task):
+        record_dispatch(self, task)
+        started = time.time()
+        super(SimulatedLoopExecutor, self).execute_task(task)
+        self.dispatch_wall_time += time.time() - started
+
+    def _update(self):
+        started = time.clock()
+        super(SimulatedLoopExecutor, self)._update()
+        self.scheduling_cpu += time.clock() - started
+
+    def _completes_after(self, delay, outcome):
+        future = Future(self.loop)
+        self.loop.call_later(delay, future.set_result, outcome)
+        return future
+
+    def navigate(self, task):
+        target = task.start_node_id
+        delay = rospy.Duration(0) if target == self.position else self.travel_time
+        self.position = target
+        return self._completes_after(delay, (GoalStatus.SUCCEEDED, None))
+
+    def run_action(self, task):
+        factor = self.random.uniform(1 - self.duration_noise, 1 + self.duration_noise)
+        if task.task_id in self.hung:
+            return Future(self.loop)
+        return self._completes_after(self.durations[task.task_id] * factor, (GoalStatus.SUCCEEDED, None))
+
+    def task_complete(self, task):
+        self.completed[task.task_id] = self.free_since = rospy.get_rostime()
+        super(SimulatedLoopExecutor, self).task_complete(task)
+
+    def task_failed(self, task):
+        self.failed[task.task_id] = self.free_since = rospy.get_rostime()
+        super(SimulatedLoopExecutor, self).task_failed(task)
+
+
+class SimulatedConcurrentExecutor(SimulatedLoopExecutor, ConcurrentTaskExecutor):
+    """ A SimulatedLoopExecutor which executes tasks on different resources at the same time. """
+
+
+def generate_tasks(count, start, random, travel_secs=60, utilisation=0.7, waypoints=20, max_duration=600, side_fraction=0.0, durations_by_node=False):
+    """
+    Creates tasks released in hourly batches, in the style of a daily routine which passes tasks on ahead of their windows.
+    Batches are spread out so that the work, including travel, occupies the given fraction of the robot's time.
+    A side_fraction of the tasks need one of SIDE_RESOURCES rather than the base, so have no start node. If durations_by_node, the
+    durations of tasks at each waypoint are within 20% of a typical duration for it, rather than independent.
+    Returns a list of (arrival time, task) tuples.
+    """
+    batch_interval = 60 * 60
+    mean_work = (30 + max_duration) / 2 + travel_secs
+    batches = max(1, int(round(count * mean_work / utilisation / batch_interval)))
+    typical = None
+    if durations_by_node:
+        typical = [random.randint(30, max_duration) for w in range(waypoints)]
+    tasks = []
+    for n in range(count):
+        arrival = start + rospy.Duration((n % batches) * batch_interval)
+        duration = rospy.Duration(random.randint(30, max_duration))
+        waypoint = None
+        if typical is not None:
+            waypoint = random.randint(1, waypoints)
+            duration = rospy.Duration.from_sec(typical[waypoint - 1] * random.uniform(0.8, 1.2))
+        start_after = arrival + rospy.Duration(random.randint(0, batch_interval))
+        window = rospy.Duration(random.randint(int(duration.to_sec() * 2), batch_interval * 4))
+        task = Task(task_id=n + 1,
+                    start_node_id='WayPoint%s' % (waypoint or random.randint(1, waypoints)),
+                    action='test_task',
+                    start_after=start_after,
+                    end_before=start_after + window,
+                    expected_duration=duration,
+                    resources=[Task.BASE_RESOURCE])
+        # only drawn when needed, so the other tasks are as they were without side tasks
+        if side_fraction > 0 and random.random() < side_fraction:
+            task.start_node_id = ''
+            task.resources = [random.choice(SIDE_RESOURCES)]
+        tasks.append((arrival, task))
+    return tasks
+
+
+def percentile(values, fraction):
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_benchmark(task_count=1000, policy=ExecutionSchedule.START_AFTER, seed=0, travel_secs=60, duration_noise=0.2, utilisation=0.7, loop_secs=5, executor='threads',
+                  side_fraction=0.0, hang_fraction=0.0, duration_factor=2.0, unknown_fraction=0.0, learn_durations=True, trace_file=None,
+                  max_duration=600):
+    """
+    Replays task_count generated tasks through a SimulatedTaskExecutor, or a SimulatedLoopExecutor or SimulatedConcurrentExecutor if
+    executor is 'loop' or 'concurrent', and returns a dictionary of results. If trace_file is given the executor's trace is dumped to it.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError('Unknown executor %s, should be one of %s' % (executor, EXECUTORS))
+    random = Random(seed)
+    start = rospy.Time(1000000)
+    travel_time = rospy.Duration(travel_secs)
+    scheduler = EarliestDeadlineScheduler(travel_time)
+    arrivals = generate_tasks(task_count, start, random, travel_secs, utilisation, max_duration=max_duration, side_fraction=side_fraction,
+                              durations_by_node=unknown_fraction > 0)
+    end_before = dict((task.task_id, task.end_before) for arrival, task in arrivals)
+    durations = dict((task.task_id, task.expected_duration) for arrival, task in arrivals)
+    hung = set()
+    if hang_fraction > 0:
+        hung = set(task.task_id for arrival, task in arrivals if random.random() < hang_fraction)
+    if unknown_fraction > 0:
+        for arrival, task in arrivals:
+            if random.random() < unknown_fraction:
+                task.expected_duration = rospy.Duration(0)
+    # kept in memory, so runs do not affect each other
+    duration_model = DurationModel() if learn_durations else NoDurationModel()
+
+    if executor != 'threads':
+        loop = SimulatedEventLoop(start)
+        executor_class = SimulatedLoopExecutor if executor == 'loop' else SimulatedConcurrentExecutor
+        executor = executor_class(loop, scheduler, policy, travel_time, duration_noise, random, hung, duration_factor, durations, duration_model)
+        expired = []
+        for arrival, task in arrivals:
+            loop.call_at(arrival, executor.add_tasks, [task])
+        # count expiries as they happen, and stop once every task is accounted for
+        expire_tasks = executor.execution_schedule.expire_tasks
+
+        def counting_expire_tasks(now):
+            removed = expire_tasks(now)
+            expired.extend(removed)
+            return removed
+
+        executor.execution_schedule.expire_tasks = counting_expire_tasks
+        for name in ['task_complete', 'task_failed']:
+            def counting(task, finished=getattr(executor, name)):
+                finished(task)
+                if len(expired) + len(executor.completed) + len(executor.failed) >= task_count:
+                    loop.stop()
+            setattr(executor, name, counting)
+        executor.running = True
+
+        wall_started = time.time()
+        cpu_started = time.clock()
+        loop.run_forever()
+        return _results(task_count, policy, start, end_before, executor, expired, scheduler, executor.scheduling_cpu,
+                        time.clock() - cpu_started, time.time() - wall_started, trace_file)
+
+    clock = SimulatedClock(start)
+    executor = SimulatedTaskExecutor(clock, scheduler, policy, travel_time, duration_noise, random, hung, duration_factor, durations, duration_model)
+    for arrival, task in arrivals:
+        clock.call_at(arrival, lambda task=task: executor.add_tasks([task]))
+    # stop the scheduling loop even if some task is never accounted for
+    horizon = max(end_before.values()) + rospy.Duration(loop_secs)
+
+    expired = []
+    scheduling_cpu = [0.0]
+
+    def scheduling_loop():
+        # mirrors ScheduledTaskExecutor.schedule_tasks, consuming everything queued since the last pass
+        started = time.clock()
+        unscheduled = []
+        while not executor.unscheduled_tasks.empty():
+            unscheduled.append(executor.unscheduled_tasks.get(False))
+        if len(unscheduled) > 0:
+            executor.queue_tasks(unscheduled)
+        expired.extend(executor.update_schedule())
+        scheduling_cpu[0] += time.clock() - started
+        if len(expired) + len(executor.completed) + len(executor.failed) < task_count and clock.now < horizon:
+            clock.call_later(rospy.Duration(loop_secs), scheduling_loop)
+
+    clock.call_at(start, scheduling_loop)
+
+    wall_started = time.time()
+    cpu_started = time.clock()
+    while clock.step():
+        # mirrors ScheduledTaskExecutor.execute_tasks
+        if executor.execution_schedule.wait_for_execution_change(0):
+            executor.execute_current_task()
+    wall_time = time.time() - wall_started
+    cpu_time = time.clock() - cpu_started
+    return _results(task_count, policy, start, end_before, executor, expired, scheduler, scheduling_cpu[0], cpu_time, wall_time, trace_file)
+
+
+def _results(task_count, policy, start, end_before, executor, expired, scheduler, scheduling_cpu, cpu_time, wall_time, trace_file):
+    if trace_file is not None:
+        executor.tracer.dump(trace_file)
+    completion_times = executor.completed.values()
+    late = [task_id for task_id, completed in executor.completed.items() if completed > end_before[task_id]]
+    makespan = (max(completion_times) - start).to_sec() if len(completion_times) > 0 else 0.0
+    missed = len(late) + len(expired) + len(executor.failed)
+
+    return {
+        'tasks': task_count,
+        'policy': policy,
+        'completed': len(executor.completed),
+        'late': len(late),
+        'expired': len(expired),
+        'failed': len(executor.failed),
+        'deadline_miss_rate': missed / task_count,
+        'makespan_secs': makespan,
+        'throughput_per_hour': len(executor.completed) / (makespan / 3600) if makespan > 0 else 0.0,
+        'dispatch_latency_mean_secs': sum(executor.dispatch_latencies) / max(1, len(executor.dispatch_latencies)),
+        'dispatch_latency_p95_secs': percentile(executor.dispatch_latencies, 0.95),
+        'dispatch_latency_max_secs': max(executor.dispatch_latencies) if len(executor.dispatch_latencies) > 0 else 0.0,
+        'queue_wait_mean_secs': sum(executor.queue_waits) / max(1, len(executor.queue_waits)),
+        'queue_wait_p95_secs': percentile(executor.queue_waits, 0.95),
+        'dispatch_wall_time_mean_secs': executor.dispatch_wall_time / max(1, len(executor.dispatch_latencies)),
+        'scheduler_calls': scheduler.calls,
+        'scheduler_cpu_secs': scheduler.cpu_time,
+        'scheduling_loop_cpu_secs': scheduling_cpu,
+        'total_cpu_secs': cpu_time,
+        'wall_time_secs': wall_time,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'stage_latencies': executor.tracer.get_stage_latencies(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay generated tasks through the scheduled executor on a simulated clock.')
+    parser.add_argument('--tasks', type=int, default=1000, help='number of tasks to generate')
+    parser.add_argument('--policy', default=ExecutionSchedule.START_AFTER, choices=ExecutionSchedule.POLICIES, help='execution policy to benchmark')
+    parser.add_argument('--executor', default='threads', choices=EXECUTORS, help='executor design to benchmark')
+    parser.add_argument('--side-tasks', type=float, default=0.0, help='fraction of tasks which do not need the base')
+    parser.add_argument('--hang', type=float, default=0.0, help='fraction of actions which never finish')
+    parser.add_argument('--duration-factor', type=float, default=2.0, help='multiple of expected duration after which actions are preempted, zero for never')
+    parser.add_argument('--unknown', type=float, default=0.0, help='fraction of tasks which arrive without an expected duration')
+    parser.add_argument('--no-learn', action='store_true', help='do not estimate missing expected durations')
+    parser.add_argument('--seed', type=int, default=0, help='seed for task generation and duration noise')
+    parser.add_argument('--travel', type=float, default=60, help='seconds to travel between waypoints')
+    parser.add_argument('--noise', type=float, default=0.2, help='fraction by which actual durations vary from expected')
+    parser.add_argument('--utilisation', type=float, default=0.7, help='fraction of the robot\'s time the generated work should fill')
+    parser.add_argument('--max-duration', type=int, default=600, help='longest expected duration of a generated action in seconds')
+    parser.add_argument('--spare-time', action='store_true', help='use the travel, utilisation and durations of SPARE_TIME instead')
+    parser.add_argument('--output', help='also write results as json to this file')
+    parser.add_argument('--trace', help='write the trace of task events to this file')
+    args = parser.parse_args(rospy.myargv(argv=sys.argv)[1:])
+    if args.spare_time:
+        args.travel, args.utilisation, args.max_duration = SPARE_TIME['travel_secs'], SPARE_TIME['utilisation'], SPARE_TIME['max_duration']
+
+    results = run_benchmark(args.tasks, args.policy, args.seed, args.travel, args.noise, args.utilisation, executor=args.executor,
+                            side_fraction=args.side_tasks, hang_fraction=args.hang, duration_factor=args.duration_factor,
+                            unknown_fraction=args.unknown, learn_durations=not args.no_learn, trace_file=args.trace,
+                            max_duration=args.max_duration)
+    for key in sorted(results):
+        if key != 'stage_latencies':
+            print '%30s: %s' % (key, results[key])
+    if args.trace:
+        print
+        print format_stage_latencies(results['stage_latencies'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import os
+import rospy
+import shutil
+import tempfile
+import unittest
+from random import Random
+
+from strands_executive_msgs.msg import Task
+from task_executor.duration_model import DurationSketch, DurationModel
+
+
+class TestDurationModel(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sketch_quantiles(self):
+        random = Random(0)
+        samples = sorted(random.expovariate(1 / 300.0) for n in range(10000))
+        sketch = DurationSketch(0.02)
+        for secs in samples:
+            sketch.add(secs)
+        for q in [0.1, 0.5, 0.8, 0.99]:
+            exact = samples[int(q * (len(samples) - 1))]
+            self.assertTrue(abs(sketch.quantile(q) - exact) <= 0.02 * exact, (q, sketch.quantile(q), exact))
+        self.assertEquals(samples[-1], sketch.quantile(1))
+        # far fewer buckets than samples
+        self.assertTrue(len(sketch.buckets) < 1000)
+
+    def test_estimate(self):
+        model = DurationModel(min_samples=2)
+        here = Task(action='clean', start_node_id='kitchen')
+        there = Task(action='clean', start_node_id='hall')
+        self.assertEquals(None, model.estimate(here))
+
+        model.record(here, rospy.Duration(100))
+        self.assertEquals(None, model.estimate(here))
+        model.record(here, rospy.Duration(100))
+        self.assertAlmostEquals(100, model.estimate(here).to_sec(), delta=2)
+        # the action at any node is used for nodes it has not been recorded at
+        self.assertAlmostEquals(100, model.estimate(there).to_sec(), delta=2)
+        self.assertEquals(None, model.estimate(Task(action='mop', start_node_id='kitchen')))
+
+    def test_store(self):
+        filename = os.path.join(self.directory, 'durations')
+        model = DurationModel(filename)
+        task = Task(action='clean', start_node_id='kitchen')
+        for secs in [60, 70, 80, 90]:
+            model.record(task, rospy.Duration(secs))
+        self.assertTrue(model.needs_save())
+        model.save()
+        self.assertFalse(model.needs_save())
+
+        loaded = DurationModel(filename)
+        self.assertEquals(sorted(model.sketches.keys()), sorted(loaded.sketches.keys()))
+        self.assertEquals(model.estimate(task), loaded.estimate(task))
+        sketch = loaded.sketches[('clean', 'kitchen')]
+        self.assertEquals((4, 60, 90), (sketch.count, sketch.min, sketch.max))
+
+        with open(filename, 'wb') as f:
+            f.write('not a duration file')
+        self.assertEquals({}, DurationModel(filename).sketches)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_duration_model', TestDurationModel)
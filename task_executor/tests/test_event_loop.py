@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import rospy
+import unittest
+from threading import Thread
+
+from task_executor.event_loop import EventLoop, Future, LoopTimer, CancelledError, TimeoutError, Return, spawn, \
+    with_timeout, send_goal
+
+
+class SimulatedTimeLoop(EventLoop):
+    """ Jumps straight to the next deadline, and stops when there is none. """
+
+    def __init__(self):
+        super(SimulatedTimeLoop, self).__init__()
+        self.now = rospy.Time(1000)
+
+    def time(self):
+        return self.now
+
+    def _idle(self, deadline):
+        if deadline is None:
+            self._stop()
+        elif deadline > self.now:
+            self.now = deadline
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.done_cb = None
+        self.cancelled = False
+
+    def send_goal(self, goal, done_cb):
+        self.done_cb = done_cb
+
+    def cancel_goal(self):
+        self.cancelled = True
+
+
+class TestEventLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = SimulatedTimeLoop()
+        self.calls = []
+
+    def record(self, value):
+        self.calls.append((value, self.loop.time().to_sec()))
+
+    def test_call_order(self):
+        self.loop.call_later(rospy.Duration(5), self.record, 'later')
+        self.loop.call_at(rospy.Time(1002), self.record, 'at')
+        self.loop.call_soon(self.record, 'soon')
+        self.loop.call_later(rospy.Duration(1), self.record, 'cancelled').cancel()
+        self.loop.run_forever()
+        self.assertEquals([('soon', 1000), ('at', 1002), ('later', 1005)], self.calls)
+
+    def test_call_soon_threadsafe(self):
+        loop = EventLoop()
+        self.assertFalse(loop.is_running())
+        thread = loop.start()
+        self.assertTrue(loop.is_running())
+        results = []
+        Thread(target=loop.call_soon_threadsafe, args=(results.append, 1)).start()
+        self.assertEquals(4, loop.run_sync(lambda: 4))
+        loop.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(loop.is_running())
+        self.assertEquals([1], results)
+
+    def test_coroutine(self):
+        def add(first, second):
+            a = yield first
+            b = yield second
+            raise Return(a + b)
+
+        first, second = Future(self.loop), Future(self.loop)
+        total = spawn(self.loop, add(first, second))
+        self.loop.call_later(rospy.Duration(1), first.set_result, 1)
+        self.loop.call_later(rospy.Duration(2), second.set_result, 2)
+        self.loop.run_forever()
+        self.assertEquals(3, total.result())
+
+    def test_exception(self):
+        def fail(future):
+            yield future
+
+        future = Future(self.loop)
+        failed = spawn(self.loop, fail(future))
+        future.set_exception(ValueError())
+        self.loop.run_forever()
+        self.assertRaises(ValueError, failed.result)
+
+    def test_cancel_goal(self):
+        client = FakeClient()
+
+        def run(client):
+            try:
+                yield send_goal(self.loop, client, None)
+            except CancelledError:
+                self.record('cancelled')
+                raise
+
+        running = spawn(self.loop, run(client))
+        self.loop.call_later(rospy.Duration(1), running.cancel)
+        self.loop.run_forever()
+        self.assertTrue(client.cancelled)
+        self.assertTrue(running.cancelled())
+        self.assertEquals([('cancelled', 1001)], self.calls)
+
+    def test_cancel_before_start(self):
+        def run(future):
+            try:
+                yield future
+            except CancelledError:
+                self.record('cancelled')
+                raise
+            finally:
+                self.record('finally')
+
+        future = Future(self.loop)
+        running = spawn(self.loop, run(future))
+        # before the generator has taken its first step
+        self.assertTrue(running.cancel())
+        self.loop.run_forever()
+        self.assertTrue(future.cancelled())
+        self.assertTrue(running.cancelled())
+        self.assertEquals([('cancelled', 1000), ('finally', 1000)], self.calls)
+
+    def test_goal_completes(self):
+        client = FakeClient()
+        goal = spawn(self.loop, (lambda: (yield send_goal(self.loop, client, None)))())
+        self.loop.run_once()
+        # as actionlib would, from another thread
+        client.done_cb(3, 'result')
+        self.loop.run_forever()
+        self.assertEquals(None, goal.result())
+        self.assertFalse(client.cancelled)
+
+    def test_with_timeout(self):
+        slow, fast = Future(self.loop), Future(self.loop)
+        slow_timeout = with_timeout(self.loop, slow, rospy.Duration(10))
+        fast_timeout = with_timeout(self.loop, fast, rospy.Duration(10))
+        self.loop.call_later(rospy.Duration(5), fast.set_result, 'fast')
+        self.loop.run_forever()
+        self.assertEquals(rospy.Time(1010), self.loop.time())
+        self.assertEquals('fast', fast_timeout.result())
+        self.assertRaises(TimeoutError, slow_timeout.result)
+        self.assertTrue(slow.cancelled())
+
+    def test_loop_timer(self):
+        timer = LoopTimer(self.loop, lambda: self.record('fired'))
+        timer.arm(rospy.Time(1010))
+        timer.arm(rospy.Time(1020))
+        self.assertTrue(timer.is_armed())
+        self.loop.run_forever()
+        self.assertFalse(timer.is_armed())
+        self.assertEquals([('fired', 1020)], self.calls)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_event_loop', TestEventLoop)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import rospy
+import unittest
+
+from strands_executive_msgs.msg import Task
+from task_executor.execution_schedule import ExecutionSchedule, ConcurrentExecutionSchedule, task_resources
+
+
+def create_task(task_id, start_after, end_before, duration):
+    return Task(task_id=task_id, start_node_id='waypoint_%s' % task_id,
+                start_after=rospy.Time(start_after), end_before=rospy.Time(end_before),
+                expected_duration=rospy.Duration(duration))
+
+
+class TestExecutionSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = ExecutionSchedule()
+        self.schedule.add_new_tasks([create_task(n, 0, 100 * n, 10) for n in range(1, 6)])
+
+    def tearDown(self):
+        self.schedule.execution_timer.shutdown()
+
+    def test_cancel_task(self):
+        self.assertTrue(self.schedule.is_dirty())
+        self.assertEquals(5, len(self.schedule.get_schedulable_tasks()))
+        self.assertFalse(self.schedule.is_dirty())
+
+        self.assertTrue(self.schedule.cancel_task(3))
+        self.assertFalse(self.schedule.cancel_task(3))
+        self.assertTrue(self.schedule.is_dirty())
+        self.assertEquals([1, 2, 4, 5], [t.task_id for t in self.schedule.get_schedulable_tasks()])
+
+    def test_update_task(self):
+        self.schedule.get_schedulable_tasks()
+        self.assertFalse(self.schedule.update_task(create_task(10, 0, 100, 10)))
+        self.assertFalse(self.schedule.is_dirty())
+
+        self.assertTrue(self.schedule.update_task(create_task(2, 0, 1000, 10)))
+        self.assertTrue(self.schedule.is_dirty())
+        updated = [t for t in self.schedule.get_schedulable_tasks() if t.task_id == 2][0]
+        self.assertEquals(rospy.Time(1000), updated.end_before)
+
+    def test_update_queued_task(self):
+        self.schedule.set_schedule(self.schedule.get_schedulable_tasks())
+        self.assertEquals(1, self.schedule.get_current_task().task_id)
+
+        # the updated version is the one executed, even before the schedule is recomputed
+        updated = create_task(2, 0, 1000, 20)
+        updated.action = 'updated_action'
+        self.assertTrue(self.schedule.update_task(updated))
+        self.schedule.task_complete(self.schedule.get_current_task())
+        current = self.schedule.get_current_task()
+        self.assertEquals(2, current.task_id)
+        self.assertEquals('updated_action', current.action)
+        self.assertEquals(rospy.Duration(20), current.expected_duration)
+
+        # as is the updated version of a task in a schedule computed before the update
+        stale = self.schedule.get_schedulable_tasks()
+        self.assertTrue(self.schedule.update_task(create_task(3, 0, 1000, 30)))
+        self.assertTrue(self.schedule.set_schedule(stale))
+        self.schedule.task_complete(current)
+        self.assertEquals(3, self.schedule.get_current_task().task_id)
+        self.assertEquals(rospy.Duration(30), self.schedule.get_current_task().expected_duration)
+        self.assertEquals({}, self.schedule.updated)
+
+    def test_expire_tasks(self):
+        self.schedule.get_schedulable_tasks()
+        self.assertEquals([], self.schedule.expire_tasks(rospy.Time(50)))
+        self.assertFalse(self.schedule.is_dirty())
+
+        # tasks 1 and 2 cannot fit 10 seconds of work before their deadlines
+        expired = self.schedule.expire_tasks(rospy.Time(195))
+        self.assertEquals([1, 2], [t.task_id for t in expired])
+        self.assertTrue(self.schedule.is_dirty())
+
+    def test_expire_updated_task(self):
+        # stale deadline entries from before an update must not expire the task
+        self.schedule.update_task(create_task(1, 0, 1000, 10))
+        self.assertEquals([], [t.task_id for t in self.schedule.expire_tasks(rospy.Time(150))])
+        self.schedule.cancel_task(2)
+        self.assertEquals([3], [t.task_id for t in self.schedule.expire_tasks(rospy.Time(295))])
+
+    def test_dispatch_policies(self):
+        task = create_task(1, 100, 1000, 10)
+        task.execution_time = rospy.Time(500)
+        for policy, dispatch_time in [(ExecutionSchedule.START_AFTER, 100), (ExecutionSchedule.EXECUTION_TIME, 500), (ExecutionSchedule.SLACK, 440)]:
+            schedule = ExecutionSchedule(policy, rospy.Duration(60))
+            self.assertEquals(rospy.Time(dispatch_time), schedule.get_dispatch_time(task))
+            if policy == ExecutionSchedule.SLACK:
+                # slack never dispatches before the window opens
+                task.execution_time = rospy.Time(120)
+                self.assertEquals(rospy.Time(100), schedule.get_dispatch_time(task))
+            schedule.execution_timer.shutdown()
+
+        self.assertRaises(ValueError, ExecutionSchedule, 'whenever')
+
+    def test_reschedule_replaces_delayed_dispatch(self):
+        schedule = ExecutionSchedule()
+        now = rospy.get_rostime().to_sec()
+        first = create_task(1, now + 0.2, now + 100, 10)
+        second = create_task(2, now + 0.4, now + 100, 10)
+        schedule.add_new_tasks([first, second])
+
+        schedule.set_schedule(schedule.get_schedulable_tasks())
+        self.assertTrue(schedule.execution_timer.is_armed())
+        self.assertEquals(None, schedule.get_current_task())
+
+        # the new schedule puts task 2 first, so task 1 must not be dispatched when its old deadline passes
+        schedule.set_schedule(list(reversed(schedule.get_schedulable_tasks())))
+        self.assertTrue(schedule.wait_for_execution_change(2))
+        self.assertEquals(2, schedule.get_current_task().task_id)
+        self.assertFalse(schedule.execution_timer.is_armed())
+        schedule.execution_timer.shutdown()
+
+    def test_task_resources(self):
+        task = create_task(1, 0, 100, 10)
+        self.assertEquals(None, task_resources(task))
+        task.resources = ['camera']
+        self.assertEquals(set(['camera', Task.BASE_RESOURCE]), task_resources(task))
+        task.start_node_id = ''
+        self.assertEquals(set(['camera']), task_resources(task))
+
+    def test_concurrent_dispatch(self):
+        schedule = ConcurrentExecutionSchedule()
+        now = rospy.get_rostime().to_sec()
+        tasks = [create_task(n, 0, now + 1000, 10) for n in range(1, 7)]
+        for task, resources in zip(tasks, [['base'], ['base'], ['camera'], ['camera'], [], ['speech']]):
+            task.resources = resources
+            if 'base' not in resources:
+                task.start_node_id = ''
+        # task 6 cannot start yet, and task 5 needs everything so waits behind it
+        tasks[5].start_after = rospy.Time(now + 100)
+        schedule.add_new_tasks(tasks)
+        order = dict((task_id, n) for n, task_id in enumerate([1, 2, 3, 4, 6, 5]))
+        schedule.set_schedule(sorted(schedule.get_schedulable_tasks(), key=lambda t: order[t.task_id]))
+
+        self.assertTrue(schedule.wait_for_execution_change(0))
+        self.assertEquals([1, 3], [t.task_id for t in schedule.take_started_tasks()])
+        self.assertTrue(schedule.execution_timer.is_armed())
+
+        schedule.task_complete(tasks[2])
+        self.assertEquals([4], [t.task_id for t in schedule.take_started_tasks()])
+        schedule.task_complete(tasks[0])
+        self.assertEquals([2], [t.task_id for t in schedule.take_started_tasks()])
+        schedule.task_complete(tasks[1])
+        schedule.task_complete(tasks[3])
+        self.assertEquals([], schedule.take_started_tasks())
+        self.assertEquals([], schedule.get_running_tasks())
+        schedule.execution_timer.shutdown()
+
+    def test_concurrent_exclusive_task(self):
+        schedule = ConcurrentExecutionSchedule()
+        now = rospy.get_rostime().to_sec()
+        tasks = [create_task(n, 0, now + 1000, 10) for n in range(1, 4)]
+        # task 2 needs every resource, so starts alone once task 1 is done, and task 3 waits behind it
+        tasks[0].resources = ['base']
+        tasks[2].resources = ['camera']
+        tasks[2].start_node_id = ''
+        schedule.add_new_tasks(tasks)
+        schedule.set_schedule(schedule.get_schedulable_tasks())
+        self.assertEquals([1], [t.task_id for t in schedule.take_started_tasks()])
+        schedule.task_complete(tasks[0])
+        self.assertEquals([2], [t.task_id for t in schedule.take_started_tasks()])
+        schedule.task_complete(tasks[1])
+        self.assertEquals([3], [t.task_id for t in schedule.take_started_tasks()])
+        schedule.execution_timer.shutdown()
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_execution_schedule', TestExecutionSchedule)
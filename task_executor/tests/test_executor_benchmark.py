@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import unittest
+
+from executor_benchmark import SPARE_TIME, run_benchmark
+from task_executor.execution_schedule import ExecutionSchedule
+
+
+class TestExecutorBenchmark(unittest.TestCase):
+
+    def test_all_tasks_accounted_for(self):
+        for policy in ExecutionSchedule.POLICIES:
+            results = run_benchmark(task_count=200, policy=policy, seed=1)
+            self.assertEquals(200, results['completed'] + results['expired'])
+            self.assertTrue(results['completed'] > 0)
+            self.assertTrue(results['scheduler_calls'] > 0)
+            self.assertTrue(0 <= results['deadline_miss_rate'] <= 1)
+
+    def test_spare_time(self):
+        saturated = run_benchmark(task_count=200, seed=1)
+        for policy in ExecutionSchedule.POLICIES:
+            results = run_benchmark(task_count=200, policy=policy, seed=1, **SPARE_TIME)
+            self.assertEquals(200, results['completed'] + results['expired'])
+            self.assertTrue(results['queue_wait_mean_secs'] < saturated['queue_wait_mean_secs'])
+
+    def test_loop_executor(self):
+        threads = run_benchmark(task_count=200, seed=2)
+        loop = run_benchmark(task_count=200, seed=2, executor='loop')
+        self.assertEquals(200, loop['completed'] + loop['expired'])
+        for key in ['completed', 'late', 'expired']:
+            self.assertEquals(threads[key], loop[key])
+
+    def test_concurrent_executor(self):
+        loop = run_benchmark(task_count=200, seed=2, utilisation=1.2, executor='loop', side_fraction=0.4)
+        concurrent = run_benchmark(task_count=200, seed=2, utilisation=1.2, executor='concurrent', side_fraction=0.4)
+        self.assertEquals(200, concurrent['completed'] + concurrent['expired'])
+        self.assertTrue(concurrent['completed'] > loop['completed'])
+
+    def test_watchdogs(self):
+        for executor in ['threads', 'loop']:
+            stalled = run_benchmark(task_count=100, seed=4, executor=executor, hang_fraction=0.05, duration_factor=0)
+            watched = run_benchmark(task_count=100, seed=4, executor=executor, hang_fraction=0.05)
+            self.assertEquals(0, stalled['failed'])
+            self.assertTrue(watched['failed'] > 0)
+            self.assertEquals(100, watched['completed'] + watched['expired'] + watched['failed'])
+            self.assertTrue(watched['completed'] > stalled['completed'])
+
+    def test_learned_durations(self):
+        learned = run_benchmark(task_count=300, seed=1, utilisation=1.1, executor='loop', unknown_fraction=0.5)
+        unknown = run_benchmark(task_count=300, seed=1, utilisation=1.1, executor='loop', unknown_fraction=0.5, learn_durations=False)
+        self.assertTrue(learned['late'] < unknown['late'])
+
+    def test_stage_latencies(self):
+        for executor in ['threads', 'loop']:
+            stages = run_benchmark(task_count=100, seed=5, executor=executor)['stage_latencies']
+            self.assertTrue(stages['action_started -> action_finished']['count'] > 0)
+            # the time from queueing to dispatch is split around the scheduler call
+            self.assertFalse('queued -> dispatched' in stages)
+            self.assertTrue(stages['queued -> scheduler_request']['count'] > 0)
+            self.assertTrue(stages['scheduled -> dispatched']['total'] > 0)
+            self.assertTrue(stages['scheduler_request -> scheduled']['count'] > 0)
+
+    def test_dispatch_latency(self):
+        for executor in ['threads', 'loop']:
+            results = run_benchmark(task_count=200, seed=2, utilisation=1.2, executor=executor)
+            # a saturated robot keeps tasks waiting, which is not counted against dispatch
+            self.assertTrue(results['queue_wait_mean_secs'] > 0)
+            self.assertTrue(0 <= results['dispatch_latency_mean_secs'] < results['queue_wait_mean_secs'])
+
+    def test_repeatable(self):
+        first = run_benchmark(task_count=100, seed=3)
+        second = run_benchmark(task_count=100, seed=3)
+        for key in ['completed', 'late', 'expired', 'makespan_secs']:
+            self.assertEquals(first[key], second[key])
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_executor_benchmark', TestExecutorBenchmark)
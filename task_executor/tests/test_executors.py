@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import os
+import rospy
+import shutil
+import tempfile
+import unittest
+
+from actionlib_msgs.msg import GoalStatus
+from strands_executive_msgs.msg import Task, TaskEvent
+from executor_benchmark import EarliestDeadlineScheduler, SimulatedEventLoop
+from task_executor.duration_model import DurationModel
+from task_executor.event_loop import Future
+from task_executor.loop_executor import LoopTaskExecutor, ConcurrentTaskExecutor
+from task_executor.scheduled_executor import ScheduledTaskExecutor
+
+
+def create_task(task_id, now):
+    return Task(task_id=task_id, start_node_id='WayPoint%s' % task_id, action='test_task', start_after=now,
+                end_before=now + rospy.Duration(1000), expected_duration=rospy.Duration(10))
+
+
+def task_events(executor, task_id):
+    return [event for now, stamp, event_task_id, event, detail in executor.tracer.get_events() if event_task_id == task_id]
+
+
+class FakeActionClient(object):
+    """ Stands in for a SimpleActionClient, keeping the done callback of the last goal for the test to call. """
+
+    def __init__(self):
+        self.goals = []
+        self.done_cb = None
+        self.cancelled = False
+
+    def send_goal(self, goal, done_cb=None):
+        self.goals.append(goal)
+        self.done_cb = done_cb
+
+    def cancel_goal(self):
+        self.cancelled = True
+
+    def finish(self, status):
+        self.done_cb(status, None)
+
+
+class RecordingPublisher(object):
+    """ Stands in for rospy.Publisher, keeping the topic and the published messages. """
+
+    def __init__(self, topic, message_class, queue_size=None):
+        self.topic = topic
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message)
+
+
+class ThreadedExecutor(ScheduledTaskExecutor):
+    """ A ScheduledTaskExecutor whose navigation and actions are FakeActionClients, with no scheduling or execution threads running. """
+
+    def __init__(self):
+        super(ThreadedExecutor, self).__init__(lambda tasks: None, duration_model=DurationModel())
+        self.nav_client = FakeActionClient()
+        self.action = FakeActionClient()
+
+    def advertise_services(self):
+        pass
+
+    def start_task_action(self):
+        self.action_start_time = rospy.get_rostime()
+        self.action_client = self.action
+        self.action.send_goal(self.active_task.action, self.if_active(self.task_execution_complete_cb))
+
+    def dispatch(self, task):
+        self.execution_schedule.add_new_tasks([task])
+        self.execution_schedule.set_schedule(self.execution_schedule.get_schedulable_tasks())
+        self.execute_current_task()
+
+
+class TestThreadedExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadedExecutor()
+        self.executor.dispatch(create_task(1, rospy.get_rostime()))
+
+    def tearDown(self):
+        self.executor.execution_schedule.execution_timer.shutdown()
+
+    def assertFinished(self, event):
+        self.assertEquals(None, self.executor.active_task)
+        self.assertEquals(None, self.executor.execution_schedule.get_current_task())
+        events = task_events(self.executor, 1)
+        self.assertEquals(event, events[-1])
+        self.assertFalse(TaskEvent.COMPLETED in events[:-1])
+
+    def test_cancel_navigation(self):
+        self.assertTrue(self.executor.cancel_task(1))
+        self.assertTrue(self.executor.nav_client.cancelled)
+        self.executor.nav_client.finish(GoalStatus.PREEMPTED)
+        # the action of a cancelled task is never started
+        self.assertEquals([], self.executor.action.goals)
+        self.assertFinished(TaskEvent.CANCELLED)
+
+    def test_navigation_failed(self):
+        self.executor.nav_client.finish(GoalStatus.ABORTED)
+        self.assertEquals([], self.executor.action.goals)
+        self.assertFinished(TaskEvent.FAILED)
+
+    def test_cancel_action(self):
+        self.executor.nav_client.finish(GoalStatus.SUCCEEDED)
+        self.assertEquals(['test_task'], self.executor.action.goals)
+        self.assertTrue(self.executor.cancel_task(1))
+        self.assertTrue(self.executor.action.cancelled)
+        self.executor.action.finish(GoalStatus.PREEMPTED)
+        self.assertFinished(TaskEvent.CANCELLED)
+
+
+class TestLoopExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = SimulatedEventLoop(rospy.Time(1000000))
+        self.executor = LoopTaskExecutor(EarliestDeadlineScheduler(rospy.Duration(60)), self.loop, duration_model=DurationModel())
+        self.executor.running = True
+        self.actions = []
+        # navigation never finishes, and the action is only noted
+        self.executor.navigate = lambda task: Future(self.loop)
+        self.executor.run_action = self.actions.append
+
+    def test_cancel_navigation(self):
+        self.loop.call_soon(self.executor.add_tasks, [create_task(1, self.loop.time())])
+        self.loop.call_later(rospy.Duration(10), self.executor.cancel_task, 1)
+        self.loop.run_forever()
+        self.assertEquals([], self.actions)
+        self.assertEquals(None, self.executor.active_task)
+        events = task_events(self.executor, 1)
+        self.assertEquals(TaskEvent.CANCELLED, events[-1])
+        self.assertFalse(TaskEvent.COMPLETED in events)
+
+    def test_cancel_on_dispatch(self):
+        for executor_class in [LoopTaskExecutor, ConcurrentTaskExecutor]:
+            loop = SimulatedEventLoop(rospy.Time(1000000))
+            executor = executor_class(EarliestDeadlineScheduler(rospy.Duration(60)), loop, duration_model=DurationModel())
+            executor.running = True
+            executor.navigate = lambda task, loop=loop: Future(loop)
+            execute_task = executor.execute_task
+
+            def execute_and_cancel(task):
+                # before the coroutine executing the task has run
+                execute_task(task)
+                self.assertTrue(executor.cancel_task(task.task_id))
+
+            executor.execute_task = execute_and_cancel
+            loop.call_soon(executor.add_tasks, [create_task(1, loop.time()), create_task(2, loop.time())])
+            loop.run_forever()
+            # both are finished, so the first did not stall the schedule
+            for task_id in [1, 2]:
+                self.assertEquals(TaskEvent.CANCELLED, task_events(executor, task_id)[-1])
+            self.assertEquals(None, executor.active_execution)
+            self.assertEquals({}, getattr(executor, 'executions', {}))
+
+    def test_publish_events(self):
+        publishers = []
+
+        def create_publisher(*args, **kwargs):
+            publishers.append(RecordingPublisher(*args, **kwargs))
+            return publishers[-1]
+
+        # advertise without a ros master
+        originals = rospy.Publisher, rospy.Service
+        rospy.Publisher, rospy.Service = create_publisher, lambda *args: None
+        try:
+            self.executor.advertise_services()
+        finally:
+            rospy.Publisher, rospy.Service = originals
+        self.assertEquals(['/task_executor/events'], [publisher.topic for publisher in publishers])
+
+        def navigate(task):
+            arrived = Future(self.loop)
+            self.loop.call_later(rospy.Duration(60), arrived.set_result, (GoalStatus.SUCCEEDED, None))
+            return arrived
+
+        self.executor.navigate = navigate
+        self.loop.call_soon(self.executor.add_tasks, [Task(task_id=1, start_node_id='WayPoint1', start_after=self.loop.time(),
+                                                           end_before=self.loop.time() + rospy.Duration(1000))])
+        self.loop.run_forever()
+        self.assertEquals([TaskEvent.ADDED, TaskEvent.QUEUED, TaskEvent.SCHEDULER_REQUEST, TaskEvent.SCHEDULED, TaskEvent.DISPATCHED,
+                           TaskEvent.NAVIGATION_STARTED, TaskEvent.NAVIGATION_FINISHED, TaskEvent.COMPLETED], [message.event for message in publishers[0].messages if message.task_id == 1])
+
+    def test_save_durations(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'durations')
+            self.executor.duration_model = DurationModel(filename)
+            task = create_task(1, self.loop.time())
+            saved = []
+            self.loop.call_soon(self.executor.action_complete, task, GoalStatus.SUCCEEDED, rospy.Duration(30))
+            self.loop.call_later(rospy.Duration(1), lambda: saved.append(os.path.exists(filename)))
+            self.loop.run_forever()
+            # saved once duration_save_delay has passed, not as the action completed
+            self.assertEquals([False], saved)
+            self.assertFalse(self.executor.duration_model.needs_save())
+            self.assertEquals(1, DurationModel(filename).sketches[('test_task', 'WayPoint1')].count)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_executors', TestThreadedExecutor)
+    rosunit.unitrun(PKG, 'test_executors', TestLoopExecutor)
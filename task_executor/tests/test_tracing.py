@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from strands_executive_msgs.msg import TaskEvent
+from task_executor.tracing import Tracer, monotonic
+
+
+class ManualClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingPublisher(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message)
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = ManualClock()
+        self.tracer = Tracer(100, self.clock)
+
+    def record(self, at, event, task_id=0, detail=''):
+        self.clock.now = at
+        self.tracer.record(event, task_id, detail)
+
+    def test_monotonic(self):
+        first = monotonic()
+        self.assertTrue(monotonic() >= first)
+
+    def test_stage_latencies(self):
+        self.record(0, TaskEvent.ADDED, 1)
+        self.record(1, TaskEvent.ADDED, 2)
+        # both tasks are passed to the scheduler together
+        self.clock.now = 2
+        self.tracer.record_all(TaskEvent.SCHEDULER_REQUEST, [1, 2], '2 tasks')
+        self.clock.now = 4
+        self.tracer.record_all(TaskEvent.SCHEDULED, [1, 2])
+        for task_id, offset in [(1, 5), (2, 100)]:
+            self.record(offset, TaskEvent.DISPATCHED, task_id)
+            self.record(offset + 5, TaskEvent.ACTION_STARTED, task_id)
+            self.record(offset + 35, TaskEvent.ACTION_FINISHED, task_id)
+            self.record(offset + 35, TaskEvent.COMPLETED, task_id)
+
+        latencies = self.tracer.get_stage_latencies()
+        self.assertEquals(set(['added -> scheduler_request', 'scheduler_request -> scheduled', 'scheduled -> dispatched',
+                               'dispatched -> action_started', 'action_started -> action_finished', 'action_finished -> completed']),
+                          set(latencies.keys()))
+        self.assertEquals((2, 3), (latencies['added -> scheduler_request']['count'], latencies['added -> scheduler_request']['total']))
+        self.assertAlmostEquals(96, latencies['scheduled -> dispatched']['max'])
+        stage = latencies['action_started -> action_finished']
+        self.assertEquals(2, stage['count'])
+        self.assertAlmostEquals(60, stage['total'])
+        self.assertAlmostEquals(30, stage['p50'], delta=1)
+        self.assertEquals(0, latencies['action_finished -> completed']['total'])
+        self.assertEquals(2, latencies['scheduler_request -> scheduled']['count'])
+        self.assertAlmostEquals(2, latencies['scheduler_request -> scheduled']['max'])
+        # finished tasks are forgotten
+        self.assertEquals({}, self.tracer.last)
+        self.assertTrue(self.tracer.format_stage_latencies().splitlines()[1].startswith('scheduled -> dispatched'))
+
+    def test_ring_buffer(self):
+        tracer = Tracer(3, self.clock)
+        for task_id in range(1, 6):
+            tracer.record(TaskEvent.ADDED, task_id)
+        self.assertEquals([3, 4, 5], [event[2] for event in tracer.get_events()])
+
+        disabled = Tracer(0, self.clock)
+        disabled.record(TaskEvent.ADDED, 1)
+        self.assertEquals([], disabled.get_events())
+
+    def test_publish_and_dump(self):
+        self.tracer.publisher = RecordingPublisher()
+        self.record(1, TaskEvent.ADDED, 7)
+        self.record(3, TaskEvent.EXPIRED, 7, 'late')
+        self.assertEquals([(7, TaskEvent.ADDED, 1), (7, TaskEvent.EXPIRED, 3)],
+                          [(m.task_id, m.event, m.monotonic) for m in self.tracer.publisher.messages])
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'trace.json')
+            self.tracer.dump(filename)
+            with open(filename) as f:
+                trace = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEquals(['added', 'expired'], [event['event'] for event in trace['events']])
+        self.assertEquals('late', trace['events'][1]['detail'])
+        self.assertEquals(1, trace['stages']['added -> expired']['count'])
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_tracing', TestTracing)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+PKG = 'task_executor'
+
+import rospy
+import unittest
+
+from task_executor.watchdogs import Watchdogs
+
+
+class ManualTimer(object):
+    """ A timer which only fires when the test says so. """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.deadline = None
+        self.armed = 0
+
+    def arm(self, deadline):
+        self.deadline = deadline
+        self.armed += 1
+
+    def cancel(self):
+        self.deadline = None
+
+    def fire(self, now):
+        rospy.rostime._set_rostime(now)
+        self.deadline = None
+        self.callback()
+
+
+class TestWatchdogs(unittest.TestCase):
+
+    def setUp(self):
+        rospy.rostime.set_rostime_initialized(True)
+        self.watchdogs = Watchdogs(ManualTimer)
+        self.timer = self.watchdogs.timer
+        self.expired = []
+
+    def watch(self, task_id, deadline):
+        self.watchdogs.start(task_id, rospy.Time(deadline), lambda: self.expired.append(task_id))
+
+    def test_single_timer(self):
+        self.watch(1, 30)
+        self.watch(2, 10)
+        self.watch(3, 20)
+        self.assertEquals(rospy.Time(10), self.timer.deadline)
+        # a later deadline does not rearm the timer
+        self.assertEquals(2, self.timer.armed)
+
+        self.timer.fire(rospy.Time(20))
+        self.assertEquals([2, 3], self.expired)
+        self.assertEquals(rospy.Time(30), self.timer.deadline)
+        self.assertFalse(self.watchdogs.is_watched(3))
+
+    def test_stop(self):
+        self.watch(1, 10)
+        self.watch(2, 20)
+        self.assertTrue(self.watchdogs.stop(1))
+        self.assertFalse(self.watchdogs.stop(1))
+        self.assertEquals(rospy.Time(20), self.timer.deadline)
+        self.assertTrue(self.watchdogs.stop(2))
+        self.assertEquals(None, self.timer.deadline)
+
+    def test_restart(self):
+        # restarting a watchdog replaces its deadline, and the old one is ignored
+        self.watch(1, 10)
+        self.watch(1, 40)
+        self.watch(2, 30)
+        self.assertEquals(rospy.Time(30), self.timer.deadline)
+        self.timer.fire(rospy.Time(35))
+        self.assertEquals([2], self.expired)
+        self.timer.fire(rospy.Time(40))
+        self.assertEquals([2, 1], self.expired)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, 'test_watchdogs', TestWatchdogs)